@@ -0,0 +1,391 @@
+"""
+API HTTP local para lanzar investigaciones sin Streamlit.
+
+Uso:
+    python api.py --host 127.0.0.1 --port 8765
+
+Endpoints:
+    POST /investigaciones                         → 202 {"id", "estado", "eventos"}
+    GET  /investigaciones/{id}                    → estado y secciones terminadas
+    GET  /investigaciones/{id}/eventos            → progreso por SSE
+    GET  /investigaciones/{id}/informe.{md,txt,docx}
+    DELETE /investigaciones/{id}                  → cancela el run (202)
+
+El cuerpo del POST es {"objetivo": str} con campos opcionales
+"dimensiones" (números 1-7), "resumen" (bool) y los ajustes "modelo",
+"temperatura", "max_tokens", "granular" y "enrutado". Los booleanos
+admiten true/false o "true"/"false"/"1"/"0", "modelo" uno de
+Config.MODELS, "temperatura" un número de 0 a 2 y "max_tokens" un entero
+de 1 a 65536; un valor no válido se responde con 422. La API key va en la cabecera X-Gemini-Key (por
+defecto, la de Config).
+
+Todos los runs son tareas de un único event loop (pipeline.ainvestigar),
+como mucho Config.API_MAX_JOBS a la vez; el resto espera en cola. Cada
+run tiene su checkpoint, así que uno interrumpido se puede reanudar desde
+la app con su id. Los eventos se guardan en memoria para que un cliente
+SSE que se conecta tarde (o reconecta con Last-Event-ID) los reciba todos.
+Cancelar aborta las llamadas en vuelo; las secciones ya terminadas quedan
+en un informe parcial descargable.
+Con DEEP_RESEARCH_BACKEND=simulado funciona sin API key ni red.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.routing import Route
+from cancelacion import TokenCancelacion
+from config import Ajustes, Config
+from checkpoint import Checkpoint
+from gemini_client import GeminiClient
+from pipeline import ainvestigar
+from trabajos import ACTIVOS, CANCELADO, COMPLETADO, EN_COLA, EN_CURSO, ERROR
+
+_FORMATOS = {"md": "markdown", "txt": "texto", "docx": "docx"}
+_TIPOS_MIME = {
+    "md": "text/markdown; charset=utf-8",
+    "txt": "text/plain; charset=utf-8",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+_BOOLEANOS = {"true": True, "false": False, "1": True, "0": False}
+
+
+def _booleano(valor) -> bool:
+    """JSON true/false o "true"/"false"/"1"/"0" (bool("false") sería True)."""
+    if isinstance(valor, bool):
+        return valor
+    if isinstance(valor, str) and valor.strip().lower() in _BOOLEANOS:
+        return _BOOLEANOS[valor.strip().lower()]
+    raise ValueError(valor)
+
+
+def _entero(valor) -> int:
+    """Entero JSON (no bool: isinstance(True, int) es cierto)."""
+    if isinstance(valor, bool) or not isinstance(valor, int):
+        raise TypeError(valor)
+    return valor
+
+
+def _modelo(valor) -> str:
+    if not isinstance(valor, str) or valor not in (*Config.MODELS, Config.MODEL):
+        raise ValueError(valor)
+    return valor
+
+
+def _temperatura(valor) -> float:
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        raise TypeError(valor)
+    if not (math.isfinite(valor) and 0 <= valor <= 2):
+        raise ValueError(valor)
+    return float(valor)
+
+
+def _max_tokens(valor) -> int:
+    if not 1 <= _entero(valor) <= 65536:
+        raise ValueError(valor)
+    return valor
+
+
+# Campos del POST que se pasan a Ajustes: conversión y lo que se espera
+_AJUSTES_PERMITIDOS = {
+    "modelo": (_modelo, f"uno de: {', '.join(Config.MODELS)}"),
+    "temperatura": (_temperatura, "un número entre 0 y 2"),
+    "max_tokens": (_max_tokens, "un entero entre 1 y 65536"),
+    "granular": (_booleano, "un booleano"),
+    "enrutado": (_booleano, "un booleano"),
+}
+
+
+class PeticionInvalida(Exception):
+    """Cuerpo del POST mal formado (400) o con un valor no válido (422)."""
+
+    def __init__(self, mensaje: str, estado: int = 400):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def _dimension(dim: dict) -> dict:
+    return {"num": dim["num"], "emoji": dim["emoji"], "nombre": dim["nombre"]}
+
+
+class TrabajoAPI:
+    """Un run lanzado por la API: su estado y el registro de sus eventos."""
+
+    def __init__(self, checkpoint: Checkpoint):
+        self.id = checkpoint.run_id
+        self.objetivo = checkpoint.datos["objetivo"]
+        self.estado = EN_COLA
+        self.error: str | None = None
+        self.rutas: dict | None = None
+        self.dims: list[dict] = []
+        self.secciones: dict[int, dict] = {}
+        self.resumen: str | None = None
+        self.eventos: list[dict] = []
+        self.cancelacion = TokenCancelacion()
+        self.terminado = asyncio.Event()
+        self._nuevo = asyncio.Condition()
+        self.creado = time.time()
+
+    async def publicar(self, tipo: str, **datos):
+        async with self._nuevo:
+            self.eventos.append({"id": len(self.eventos), "tipo": tipo, "datos": datos})
+            self._nuevo.notify_all()
+
+    async def suscribir(self, desde: int = 0):
+        """Eventos desde el número `desde`, en vivo hasta que el run termina."""
+        while True:
+            async with self._nuevo:
+                while desde >= len(self.eventos) and not self.terminado.is_set():
+                    try:
+                        await asyncio.wait_for(self._nuevo.wait(), Config.API_KEEPALIVE)
+                    except asyncio.TimeoutError:
+                        break
+                nuevos = self.eventos[desde:]
+            if not nuevos:
+                if self.terminado.is_set():
+                    return
+                yield None  # keep-alive
+            for evento in nuevos:
+                yield evento
+            desde += len(nuevos)
+
+    def resumen_estado(self) -> dict:
+        total = len(self.dims)
+        return {
+            "id": self.id,
+            "objetivo": self.objetivo,
+            "estado": self.estado,
+            "error": self.error,
+            "completadas": len(self.secciones),
+            "total": total,
+            "secciones": [self.secciones[n] for n in sorted(self.secciones)],
+            "resumen": self.resumen,
+            "informes": {
+                ext: f"/investigaciones/{self.id}/informe.{ext}" for ext in _FORMATOS
+            } if self.rutas else None,
+        }
+
+
+class GestorAPI:
+    """Trabajos de la API, ejecutados como tareas del event loop del servidor."""
+
+    def __init__(self):
+        self.trabajos: OrderedDict[str, TrabajoAPI] = OrderedDict()
+        self._limite: asyncio.Semaphore | None = None
+        self._tareas: set[asyncio.Task] = set()
+
+    async def crear(self, cuerpo: dict, api_key: str | None) -> TrabajoAPI:
+        objetivo = str(cuerpo.get("objetivo", "")).strip()
+        if len(objetivo) < 5:
+            raise PeticionInvalida("El objetivo es demasiado corto")
+        numeros = cuerpo.get("dimensiones") or list(range(1, 8))
+        if not isinstance(numeros, list) or not all(
+            isinstance(n, int) and not isinstance(n, bool) and 1 <= n <= 7 for n in numeros
+        ):
+            raise PeticionInvalida("'dimensiones' debe ser una lista de números 1-7", 422)
+        cambios = {}
+        for campo, (convertir, esperado) in _AJUSTES_PERMITIDOS.items():
+            if campo in cuerpo:
+                try:
+                    cambios[campo] = convertir(cuerpo[campo])
+                except (TypeError, ValueError):
+                    raise PeticionInvalida(f"'{campo}' debe ser {esperado}", 422) from None
+        try:
+            incluir_resumen = _booleano(cuerpo.get("resumen", True))
+        except ValueError:
+            raise PeticionInvalida("'resumen' debe ser un booleano", 422) from None
+        if api_key:
+            cambios["api_key"] = api_key
+        ajustes = Ajustes.desde_config(**cambios, streaming=False, arranque_rapido=False)
+        if errores := ajustes.validar():
+            raise PeticionInvalida("; ".join(errores))
+
+        checkpoint = await asyncio.to_thread(
+            Checkpoint.nuevo, objetivo, sorted({n - 1 for n in numeros}),
+            incluir_resumen, modelo=ajustes.modelo,
+        )
+        trabajo = TrabajoAPI(checkpoint)
+        self._podar()
+        self.trabajos[trabajo.id] = trabajo
+        tarea = asyncio.create_task(self._ejecutar(trabajo, checkpoint, ajustes))
+        self._tareas.add(tarea)
+        tarea.add_done_callback(self._tareas.discard)
+        return trabajo
+
+    def _podar(self):
+        """Olvida los trabajos terminados más antiguos (sus ficheros quedan en disco)."""
+        terminados = [t for t in self.trabajos.values() if t.terminado.is_set()]
+        for trabajo in terminados[:max(0, len(terminados) - Config.API_KEEP_JOBS + 1)]:
+            del self.trabajos[trabajo.id]
+
+    async def _ejecutar(self, trabajo: TrabajoAPI, checkpoint: Checkpoint,
+                        ajustes: Ajustes):
+        if self._limite is None:
+            self._limite = asyncio.Semaphore(max(1, Config.API_MAX_JOBS))
+        await trabajo.publicar("en_cola")
+        try:
+            async with self._limite:
+                trabajo.estado = EN_CURSO
+                client = GeminiClient(ajustes, cancelacion=trabajo.cancelacion)
+                async for tipo, idx, dato in ainvestigar(client, checkpoint):
+                    await self._traducir(trabajo, tipo, idx, dato)
+        except Exception as e:
+            trabajo.estado = ERROR
+            trabajo.error = f"{type(e).__name__}: {e}"
+            await trabajo.publicar("error", error=trabajo.error)
+        finally:
+            trabajo.terminado.set()
+            async with trabajo._nuevo:
+                trabajo._nuevo.notify_all()
+
+    async def _traducir(self, trabajo: TrabajoAPI, tipo: str, idx, dato):
+        """Evento del pipeline → estado del trabajo y evento SSE."""
+        if tipo == "mega_inicio":
+            await trabajo.publicar("mega_inicio")
+        elif tipo == "dimensiones":
+            trabajo.dims = dato
+            await trabajo.publicar("dimensiones", dimensiones=[_dimension(d) for d in dato])
+        elif tipo == "inicio":
+            await trabajo.publicar("inicio", **_dimension(trabajo.dims[idx]))
+        elif tipo in ("fin", "restaurada"):
+            contenido = dato["texto"] if tipo == "fin" else dato["contenido"]
+            seccion = trabajo.secciones[trabajo.dims[idx]["num"]] = {
+                **_dimension(trabajo.dims[idx]), "exito": True,
+                "texto": contenido, "fuentes": dato["fuentes"], "modelo": dato.get("modelo"),
+            }
+            await trabajo.publicar("seccion", **seccion)
+        elif tipo == "error":
+            seccion = trabajo.secciones[trabajo.dims[idx]["num"]] = {
+                **_dimension(trabajo.dims[idx]), "exito": False, "error": str(dato),
+            }
+            await trabajo.publicar("seccion", **seccion)
+        elif tipo == "resumen_inicio":
+            await trabajo.publicar("resumen_inicio")
+        elif tipo in ("resumen", "resumen_restaurado"):
+            trabajo.resumen = dato
+            await trabajo.publicar("resumen", texto=dato)
+        elif tipo == "resumen_error":
+            await trabajo.publicar("resumen", error=f"{type(dato).__name__}: {dato}")
+        elif tipo == "completado":
+            # Exportar (sobre todo el DOCX) es CPU: fuera del event loop
+            trabajo.rutas = await asyncio.to_thread(dato.guardar_todo)
+            trabajo.estado = COMPLETADO
+            await trabajo.publicar("completado", **trabajo.resumen_estado())
+        elif tipo == "cancelado":
+            # Lo ya terminado queda como informe parcial
+            if dato.secciones:
+                trabajo.rutas = await asyncio.to_thread(dato.guardar_todo)
+            trabajo.estado = CANCELADO
+            await trabajo.publicar("cancelado", **trabajo.resumen_estado())
+
+
+gestor = GestorAPI()
+
+
+# ── Endpoints ──
+def _error(estado: int, mensaje: str) -> JSONResponse:
+    return JSONResponse({"error": mensaje}, status_code=estado)
+
+
+def _trabajo(request: Request) -> TrabajoAPI | None:
+    return gestor.trabajos.get(request.path_params["id"])
+
+
+async def crear_investigacion(request: Request):
+    try:
+        cuerpo = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return _error(400, "El cuerpo debe ser JSON")
+    if not isinstance(cuerpo, dict):
+        return _error(400, "El cuerpo debe ser un objeto JSON")
+    try:
+        trabajo = await gestor.crear(cuerpo, request.headers.get("x-gemini-key"))
+    except PeticionInvalida as e:
+        return _error(e.estado, str(e))
+    return JSONResponse(
+        {"id": trabajo.id, "estado": trabajo.estado,
+         "eventos": f"/investigaciones/{trabajo.id}/eventos"},
+        status_code=202,
+    )
+
+
+async def ver_investigacion(request: Request):
+    if not (trabajo := _trabajo(request)):
+        return _error(404, "No existe esa investigación")
+    return JSONResponse(trabajo.resumen_estado())
+
+
+async def cancelar_investigacion(request: Request):
+    if not (trabajo := _trabajo(request)):
+        return _error(404, "No existe esa investigación")
+    if trabajo.estado not in ACTIVOS:
+        return _error(409, f"La investigación está {trabajo.estado}")
+    trabajo.cancelacion.cancelar("Cancelado desde la API")
+    return JSONResponse({"id": trabajo.id, "estado": "cancelando"}, status_code=202)
+
+
+async def eventos_investigacion(request: Request):
+    if not (trabajo := _trabajo(request)):
+        return _error(404, "No existe esa investigación")
+    ultimo = request.headers.get("last-event-id", "")
+    desde = int(ultimo) + 1 if ultimo.isdigit() else 0
+
+    async def emitir():
+        async for evento in trabajo.suscribir(desde):
+            if evento is None:
+                yield ": keep-alive\n\n"
+                continue
+            datos = json.dumps(evento["datos"], ensure_ascii=False)
+            yield f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {datos}\n\n"
+
+    return StreamingResponse(
+        emitir(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def informe_investigacion(request: Request):
+    if not (trabajo := _trabajo(request)):
+        return _error(404, "No existe esa investigación")
+    extension = request.path_params["formato"]
+    if extension not in _FORMATOS:
+        return _error(404, f"Formato no disponible (usa {', '.join(_FORMATOS)})")
+    if not trabajo.rutas:
+        return _error(409, f"La investigación está {trabajo.estado}")
+    ruta = trabajo.rutas[_FORMATOS[extension]]
+    nombre = os.path.basename(ruta)
+    # Los informes llevan el run_id en el nombre: nunca se sirve el de otro trabajo
+    if not nombre.endswith(f"_{trabajo.id}.{extension}") or not os.path.isfile(ruta):
+        return _error(404, "El informe de esta investigación no está disponible")
+    return FileResponse(ruta, media_type=_TIPOS_MIME[extension], filename=nombre)
+
+
+app = Starlette(routes=[
+    Route("/investigaciones", crear_investigacion, methods=["POST"]),
+    Route("/investigaciones/{id}", ver_investigacion),
+    Route("/investigaciones/{id}", cancelar_investigacion, methods=["DELETE"]),
+    Route("/investigaciones/{id}/eventos", eventos_investigacion),
+    Route("/investigaciones/{id}/informe.{formato}", informe_investigacion),
+])
+
+
+def main(argv: list[str] | None = None) -> int:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="API HTTP de Deep Research")
+    parser.add_argument("--host", default=Config.API_HOST)
+    parser.add_argument("--port", type=int, default=Config.API_PORT)
+    args = parser.parse_args(argv)
+    print(f"🔬 API en http://{args.host}:{args.port}")
+    uvicorn.run(app, host=args.host, port=args.port, workers=1)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,9 +1,13 @@
-import time
+import json
+import os
 import streamlit as st
-from config import Config
-from dimensions import generar_mega_prompt, crear_dimensiones
+from config import Ajustes, Config
+from checkpoint import Checkpoint
+from dimensions import crear_dimensiones
 from gemini_client import GeminiClient
-from report_builder import ReportBuilder
+from response_cache import obtener_cache
+from telemetria import iniciar_servidor_metricas
+from trabajos import ACTIVOS, COMPLETADO, obtener_cola
 
 # ═══════════════ CONFIGURACIÓN DE PÁGINA ═══════════════
 st.set_page_config(
@@ -12,8 +16,12 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded",
 )
+if Config.METRICS_PORT:
+    iniciar_servidor_metricas(Config.METRICS_PORT)
 
 # ═══════════════ SIDEBAR ═══════════════
+# Los controles no tocan Config (compartida por todas las sesiones del
+# proceso): forman los Ajustes con los que se lanza cada run
 with st.sidebar:
     st.title("🔬 Deep Research")
     st.caption(f"v{Config.VERSION} · Powered by Gemini")
@@ -24,32 +32,78 @@ with st.sidebar:
         type="password",
         help="Obtén tu key en aistudio.google.com",
     )
-    if api_key:
-        Config.API_KEY = api_key
     st.divider()
     with st.expander("⚙️ Configuración avanzada"):
-        Config.MODEL = st.selectbox(
-            "Modelo",
-            [
-                "gemini-3-flash-preview",
-                "gemini-2.0-flash",
-                "gemini-2.5-flash-preview-05-20",
-                "gemini-2.5-pro-preview-05-06",
-            ],
-            index=0,
-        )
-        Config.TEMPERATURE = st.slider("Temperatura", 0.0, 1.0, 0.3, 0.1)
-        Config.MAX_TOKENS = st.select_slider(
-            "Max tokens", [4096, 8192, 16384, 32768], value=8192
-        )
-        Config.DELAY_BETWEEN_CALLS = st.slider(
-            "Pausa entre llamadas (s)", 1, 10, 3
+        modelo = st.selectbox("Modelo", Config.MODELS, index=0)
+        enrutado = st.checkbox(
+            "Enrutado por etapa", value=Config.ROUTING,
+            help="El mega-prompt y las condensaciones van a un modelo más barato "
+                 "(Config.MODEL_ROUTES) mientras responda bien y a tiempo; si no, "
+                 "al modelo elegido arriba.",
         )
+        temperatura = st.slider("Temperatura", 0.0, 1.0, Config.TEMPERATURE, 0.1)
+        max_tokens = st.select_slider(
+            "Max tokens", [4096, 8192, 16384, 32768], value=Config.MAX_TOKENS
+        )
+        retraso_base = st.slider(
+            "Backoff base tras error (s)", 1, 10, Config.DELAY_BETWEEN_CALLS
+        )
+        rpm = st.number_input(
+            "Límite de peticiones/min", 1, 2000, Config.RPM_LIMIT,
+            help="Cuota compartida por todas las sesiones con la misma key y modelo.",
+        )
+        tpm = st.number_input(
+            "Límite de tokens/min", 1000, 10_000_000, Config.TPM_LIMIT, step=1000,
+        )
+        cache_respuestas = st.checkbox(
+            "Usar caché de respuestas", value=Config.CACHE_ENABLED,
+            help="Reutiliza respuestas idénticas ya pagadas (mismo prompt, modelo y "
+                 "parámetros), también de otros runs; las de Google Search solo "
+                 "del mismo día. Las secciones reutilizadas se marcan con 🗄️.",
+        )
+        if cache_respuestas:
+            cache_stats = obtener_cache().stats
+            st.caption(
+                f"🗄️ Caché: {cache_stats['entradas']} entradas · "
+                f"{cache_stats['bytes'] / 1e6:.1f} MB · "
+                f"{cache_stats['hits']} aciertos / {cache_stats['misses']} fallos"
+            )
+            if st.button("🧹 Vaciar caché", use_container_width=True):
+                obtener_cache().vaciar()
+        max_concurrencia = st.slider(
+            "Llamadas simultáneas", 1, 7, Config.MAX_CONCURRENCY,
+            help="1 = secuencial. Con más, las dimensiones se investigan en paralelo.",
+        )
+        arranque_rapido = st.checkbox(
+            "Arranque rápido", value=Config.FAST_START,
+            help="Las dimensiones empiezan con un prompt base mientras el mega-prompt optimizado se genera en paralelo.",
+        )
+        granular = st.checkbox(
+            "Modo granular", value=Config.GRANULAR,
+            help="Cada punto de cada dimensión se investiga en su propia llamada, "
+                 "en paralelo, y se fusionan en la sección: más profundidad y "
+                 "menos latencia por llamada, a cambio de más llamadas.",
+        )
+        hedge = st.checkbox(
+            "Hedging de peticiones lentas", value=Config.HEDGE_ENABLED,
+            help="Si Google Search tarda más que su percentil histórico, lanza en paralelo una petición de respaldo y usa la primera que responda.",
+        )
+        streaming = st.checkbox(
+            "Streaming", value=Config.STREAMING,
+            help="Muestra el texto de cada dimensión a medida que se genera.",
+        )
+    ajustes = Ajustes.desde_config(
+        api_key=api_key, modelo=modelo, enrutado=enrutado, temperatura=temperatura,
+        max_tokens=max_tokens, retraso_base=retraso_base, rpm=rpm, tpm=tpm,
+        cache_respuestas=cache_respuestas, max_concurrencia=max_concurrencia,
+        arranque_rapido=arranque_rapido, granular=granular, hedge=hedge,
+        streaming=streaming,
+    )
     st.divider()
     if st.button("🧪 Test de conexión", use_container_width=True):
         with st.spinner("Probando..."):
             try:
-                client = GeminiClient()
+                client = GeminiClient(ajustes)
                 resultado = client.test_conexion()
                 if resultado["base"]:
                     st.success(f"✅ Conexión OK\n\n{resultado['detalle']}")
@@ -88,155 +142,317 @@ for i, dim in enumerate(todas_dims):
 incluir_resumen = st.checkbox("📋 Incluir resumen ejecutivo", value=True)
 st.divider()
 
-# ═══════════════ EJECUTAR INVESTIGACIÓN ═══════════════
-if st.button(
-    "🚀 INICIAR INVESTIGACIÓN PROFUNDA",
-    type="primary",
-    use_container_width=True,
-    disabled=not objetivo or not seleccionadas,
-):
-    errores = Config.validate()
-    if errores:
-        for e in errores:
-            st.error(f"❌ {e}")
-        st.stop()
-    if len(objetivo.strip()) < 5:
-        st.error("❌ El objetivo es demasiado corto")
-        st.stop()
+with st.expander("🔁 Reanudar o reconectar con una investigación"):
+    en_marcha = obtener_cola().almacen.listar(ACTIVOS)
+    if en_marcha:
+        st.caption("En marcha ahora mismo (de cualquier sesión):")
+        for trabajo in en_marcha:
+            st.markdown(f"- `{trabajo['id']}` · {trabajo['objetivo'][:60]}")
+    run_id_reanudar = st.text_input(
+        "Run ID", placeholder="20260101_120000_ab12cd",
+        help="Si el run sigue en marcha te reconectas; si no, solo se vuelven "
+             "a ejecutar las dimensiones que faltan o fallaron.",
+    )
+    reanudar = st.button("🔁 Reanudar / reconectar", disabled=not run_id_reanudar.strip())
 
-    client = GeminiClient()
-    builder = ReportBuilder(objetivo)
 
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    tiempo_inicio = time.time()
+def mostrar_seccion(seccion: dict, span: dict | None):
+    """Pinta una sección del checkpoint en su tab, con su telemetría si la hay."""
+    if not seccion["exito"]:
+        st.error(f"❌ Error: {seccion['contenido']}")
+        return
+    st.markdown(seccion["contenido"])
+    if seccion["fuentes"]:
+        with st.expander("📚 Fuentes consultadas"):
+            for fuente in seccion["fuentes"]:
+                st.markdown(f"- {fuente}")
+    detalle = f"✅ {len(seccion['contenido']):,} caracteres"
+    if span:
+        detalle += (
+            f" · {span.get('modelo') or seccion.get('modelo') or '?'}"
+            f" · Método: {span.get('metodo')} · ⏱️ {span['duracion']:.1f}s"
+        )
+        if span.get("ttft") is not None:
+            detalle += f" · ⚡ primer token {span['ttft']:.1f}s"
+        detalle += (" · 🗄️ desde caché" if span.get("cache") else "") + (
+            f" · 🏁 hedge: ganó la {span['hedge']}" if span.get("hedge") else ""
+        )
+    else:
+        detalle += " · ♻️ recuperada del checkpoint"
+    st.success(detalle)
 
-    # Generar mega-prompt primero
-    progress_bar.progress(0.05)
-    status_text.markdown("⏳ Generando **mega-prompt optimizado**...")
+
+def leer_spans(ruta: str) -> list[dict]:
     try:
-        mega_base = generar_mega_prompt(client, objetivo)
-    except Exception as e:
-        st.error(f"❌ Error generando mega-prompt: {e}")
-        st.stop()
+        with open(ruta, encoding="utf-8") as f:
+            return [json.loads(linea) for linea in f if linea.strip()]
+    except FileNotFoundError:
+        return []
 
-    dimensiones = crear_dimensiones(mega_base)
-    dims_activas = [dimensiones[i] for i in seleccionadas]
-
-    # Tabs
-    tab_names = [f"{d['emoji']} {d['nombre'][:15]}" for d in dims_activas]
-    if incluir_resumen:
-        tab_names.append("📋 Resumen")
-    tabs = st.tabs(tab_names)
-
-    # Ejecutar dimensiones
-    total_steps = len(dims_activas) + (1 if incluir_resumen else 0)
-    for idx, dim in enumerate(dims_activas):
-        progreso = (idx + 1) / total_steps
-        progress_bar.progress(progreso)
-        status_text.markdown(
-            f"⏳ **[{idx + 1}/{len(dims_activas)}]** Investigando: {dim['emoji']} {dim['nombre']}..."
-        )
-        with tabs[idx]:
-            with st.spinner(f"Investigando {dim['nombre']}..."):
-                try:
-                    resultado = client.generar(dim["prompt"])
-                    st.markdown(resultado["texto"])
-                    if resultado["fuentes"]:
-                        with st.expander("📚 Fuentes consultadas"):
-                            for fuente in resultado["fuentes"]:
-                                st.markdown(f"- {fuente}")
-                    st.success(
-                        f"✅ {len(resultado['texto']):,} caracteres · Método: {resultado['metodo']}"
-                    )
-                    builder.agregar_seccion(dim, resultado["texto"], resultado["fuentes"], True)
-                except Exception as e:
-                    st.error(f"❌ Error: {e}")
-                    builder.agregar_seccion(dim, str(e), [], False)
-
-        if idx < len(dims_activas) - 1:
-            time.sleep(Config.DELAY_BETWEEN_CALLS)
-
-    # Resumen ejecutivo
-    if incluir_resumen:
-        progreso = len(dims_activas) / total_steps
-        progress_bar.progress(progreso)
-        status_text.markdown("⏳ Generando **resumen ejecutivo**...")
-        with tabs[-1]:
-            with st.spinner("Sintetizando hallazgos..."):
-                try:
-                    extractos = "\n\n".join(
-                        f"**{s['dimension']['nombre']}:**\n{s['contenido'][:1500]}..."
-                        for s in builder.secciones if s["exito"]
-                    )
-                    prompt_resumen = (
-                        f'Eres un consultor ejecutivo de élite.\n\n'
-                        f'OBJETIVO: "{objetivo}"\n\n'
-                        f'Extractos de 7 dimensiones:\n\n{extractos}\n\n'
-                        f'GENERA UN RESUMEN EJECUTIVO con:\n'
-                        f'1. CONCLUSIÓN PRINCIPAL\n'
-                        f'2. 10 INSIGHTS MÁS IMPORTANTES\n'
-                        f'3. PLAN DE ACCIÓN (5 pasos inmediatos)\n'
-                        f'4. DECISIÓN CRÍTICA\n'
-                        f'5. VENTAJA COMPETITIVA\n'
-                        f'6. MAYOR RIESGO + mitigación\n'
-                        f'7. OPORTUNIDAD DORADA\n'
-                        f'8. PREDICCIÓN a 12 meses\n\n'
-                        f'Sé directo y accionable.'
-                    )
-                    resp_resumen = client.generar(prompt_resumen)
-                    st.markdown(resp_resumen["texto"])
-                    builder.set_resumen(resp_resumen["texto"])
-                    st.success("✅ Resumen generado")
-                except Exception as e:
-                    st.error(f"⚠️ Error en resumen: {e}")
-
-    # Finalizar
-    progress_bar.progress(1.0)
-    duracion = time.time() - tiempo_inicio
-    stats = builder.stats
-    status_text.markdown(
-        f"✅ **¡COMPLETADO!** · {stats['exitosas']}/{stats['total']} secciones "
-        f"· {stats['caracteres']:,} caracteres "
-        f"· {duracion / 60:.1f} minutos"
+
+def leer_informes(trabajo: dict) -> dict | None:
+    """
+    Cada formato del informe del trabajo (una vez por run): los renders que
+    la cola aún tiene en memoria o, si no, los ficheros que guardó.
+    """
+    if not (rutas := trabajo["rutas"]):
+        return None
+    if renders := obtener_cola().informes(trabajo["id"]):
+        return renders
+    renders = {}
+    for formato, ruta in rutas.items():
+        with open(ruta, "rb") as f:
+            renders[formato] = f.read()
+    return renders
+
+
+# ═══════════════ ESTADO DE LA SESIÓN ═══════════════
+# Streamlit vuelve a ejecutar el script en cada interacción (una descarga,
+# un slider...). Lo de cada run vive en st.session_state["runs"][run_id]
+# para repintarlo sin leer de nuevo los informes del disco.
+def runs_sesion() -> dict[str, dict]:
+    return st.session_state.setdefault("runs", {})
+
+
+def nuevo_estado(trabajo: dict) -> dict:
+    """Estado de un trabajo terminado, cargado una vez de su checkpoint e informes."""
+    checkpoint = Checkpoint.cargar(trabajo["id"])
+    datos = checkpoint.datos
+    todas = crear_dimensiones("")
+    dims = [todas[i] for i in datos["seleccionadas"]]
+    traza = os.path.join(Config.TELEMETRY_DIR, f"{trabajo['id']}.jsonl")
+    spans = leer_spans(traza)
+    secciones = {
+        num: {**checkpoint.seccion(num), "contenido": checkpoint.contenido(num)}
+        for num in (d["num"] for d in dims) if checkpoint.seccion(num)
+    }
+    estado = {
+        "run_id": trabajo["id"],
+        "objetivo": datos["objetivo"],
+        "incluir_resumen": datos["incluir_resumen"],
+        "dims": dims,
+        "secciones": secciones,
+        "spans_dim": {
+            int(s["span"].split(":")[1]): s for s in spans
+            if s["span"].startswith("dimension:") and "error" not in s
+        },
+        "resumen": datos["resumen"],
+        # Completado o cancelado con secciones (informe parcial)
+        "renders": leer_informes(trabajo),
+        "spans": sorted(spans, key=lambda s: -s["duracion"]),
+        "traza": traza,
+        "estado": trabajo["estado"],
+        "mensaje": trabajo["error"] or trabajo["mensaje"],
+        "duracion": trabajo["actualizado"] - trabajo["creado"],
+        "exitosas": sum(1 for s in secciones.values() if s["exito"]),
+        "caracteres": sum(len(s["contenido"]) for s in secciones.values() if s["exito"]),
+        "celebrar": trabajo["estado"] == COMPLETADO,
+    }
+    runs = runs_sesion()
+    runs.pop(trabajo["id"], None)
+    runs[trabajo["id"]] = estado
+    # Los informes de runs antiguos no se quedan en memoria indefinidamente
+    while len(runs) > max(1, Config.SESSION_RUNS):
+        runs.pop(next(iter(runs)))
+    st.session_state["run_activo"] = trabajo["id"]
+    return estado
+
+
+@st.fragment(run_every=Config.POLL_SECONDS)
+def seguir_trabajo(run_id: str):
+    """
+    Progreso de un trabajo en segundo plano. Solo consulta la cola: cerrar
+    la pestaña no afecta al trabajo, y otra sesión puede reconectarse con
+    el Run ID. Al terminar se cargan los resultados y se pasa a mostrarlos.
+    """
+    cola = obtener_cola()
+    trabajo = cola.estado(run_id)
+    if trabajo is None:
+        st.session_state.pop("trabajo_activo", None)
+        st.error(f"❌ No existe el trabajo '{run_id}'")
+        return
+    if trabajo["estado"] not in ACTIVOS:
+        st.session_state.pop("trabajo_activo", None)
+        nuevo_estado(trabajo)
+        st.rerun()
+
+    st.info(
+        f"🆔 Run ID: `{run_id}` · se ejecuta en segundo plano: puedes cerrar "
+        f"la pestaña y reconectarte con este ID"
     )
-    st.balloons()
+    st.progress(trabajo["progreso"])
+    icono = "🕒" if trabajo["estado"] == "en_cola" else "⏳"
+    st.markdown(f"{icono} **{trabajo['objetivo']}** · {trabajo['mensaje'] or 'En cola'}")
+
+    checkpoint = Checkpoint.cargar(run_id)
+    datos = checkpoint.datos
+    secciones = datos["secciones"]
+    parciales = cola.parciales(run_id)
+    todas = crear_dimensiones("")
+    for i in datos["seleccionadas"]:
+        dim = todas[i]
+        seccion = secciones.get(str(dim["num"]))
+        if seccion and seccion["exito"]:
+            caracteres = seccion.get("caracteres") or len(seccion.get("contenido", ""))
+            st.markdown(f"✅ {dim['emoji']} {dim['nombre']} · {caracteres:,} caracteres")
+        elif seccion:
+            st.markdown(f"❌ {dim['emoji']} {dim['nombre']} · {checkpoint.contenido(dim['num'])[:120]}")
+        elif dim["num"] in parciales:
+            st.markdown(f"⏳ {dim['emoji']} {dim['nombre']} · {len(parciales[dim['num']]):,} caracteres...")
+        else:
+            st.markdown(f"🕒 {dim['emoji']} {dim['nombre']}")
+    if parciales and st.toggle("👁️ Ver texto en curso", key=f"ver_{run_id}"):
+        for num, texto in parciales.items():
+            st.markdown(f"**{todas[num - 1]['emoji']} {todas[num - 1]['nombre']}**")
+            st.markdown(texto + " ▌")
+
+    if st.button("⛔ Cancelar", key=f"cancelar_{run_id}"):
+        cola.cancelar(run_id)
+
+
+@st.fragment
+def mostrar_run():
+    """
+    Resultados de un run de la sesión, solo desde st.session_state. Como
+    fragmento, una descarga o cambiar de run repinta solo esta parte.
+    """
+    runs = runs_sesion()
+    run_id = st.session_state.get("run_activo")
+    if run_id not in runs:
+        return
+    if len(runs) > 1:
+        ids = list(runs)[::-1]
+        run_id = st.selectbox(
+            "🗂️ Runs de esta sesión", ids, index=ids.index(run_id),
+            format_func=lambda r: f"{runs[r]['objetivo'][:60]} · {r}",
+        )
+        st.session_state["run_activo"] = run_id
+    estado = runs[run_id]
+
+    st.info(f"🆔 Run ID: `{estado['run_id']}`")
+    nombres = [f"{d['emoji']} {d['nombre'][:15]}" for d in estado["dims"]]
+    if estado["incluir_resumen"]:
+        nombres.append("📋 Resumen")
+    tabs = st.tabs(nombres)
+    for i, dim in enumerate(estado["dims"]):
+        with tabs[i]:
+            if dim["num"] in estado["secciones"]:
+                mostrar_seccion(
+                    estado["secciones"][dim["num"]], estado["spans_dim"].get(dim["num"])
+                )
+            else:
+                st.warning(f"⏸️ Sin terminar: {dim['nombre']}")
+    if estado["incluir_resumen"]:
+        with tabs[-1]:
+            if estado["resumen"]:
+                st.markdown(estado["resumen"])
+                st.success("✅ Resumen generado")
+            else:
+                st.warning("⏸️ Sin resumen")
+
+    if estado["estado"] != COMPLETADO:
+        st.warning(
+            f"⚠️ La ejecución terminó como **{estado['estado']}** ({estado['mensaje']}). "
+            f"Reanúdala con el Run ID `{estado['run_id']}`."
+        )
+        if not estado["renders"]:
+            return
+    else:
+        st.success(
+            f"✅ **¡COMPLETADO!** · {estado['exitosas']}/{len(estado['dims'])} secciones "
+            f"· {estado['caracteres']:,} caracteres "
+            f"· {estado['duracion'] / 60:.1f} minutos"
+        )
+        if estado.pop("celebrar", False):
+            st.balloons()
 
     st.divider()
-    st.subheader("📥 Descargar informe")
-    rutas = builder.guardar_todo()
+    st.subheader(
+        "📥 Descargar informe" if estado["estado"] == COMPLETADO
+        else "📥 Descargar informe parcial"
+    )
+    renders = estado["renders"]
+    nombre = f"informe_{estado['objetivo'][:30]}"
     col_d1, col_d2, col_d3 = st.columns(3)
     with col_d1:
-        md_content = builder.exportar_markdown()
         st.download_button(
             "📄 Descargar Markdown",
-            data=md_content,
-            file_name=f"informe_{objetivo[:30]}.md",
+            data=renders["markdown"],
+            file_name=f"{nombre}.md",
             mime="text/markdown",
             use_container_width=True,
         )
     with col_d2:
-        txt_content = builder.exportar_texto_plano()
         st.download_button(
             "📝 Descargar TXT (para IA)",
-            data=txt_content,
-            file_name=f"informe_{objetivo[:30]}.txt",
+            data=renders["texto"],
+            file_name=f"{nombre}.txt",
             mime="text/plain",
             use_container_width=True,
         )
     with col_d3:
-        with open(rutas["docx"], "rb") as f:
-            st.download_button(
-                "📘 Descargar Word",
-                data=f.read(),
-                file_name=f"informe_{objetivo[:30]}.docx",
-                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                use_container_width=True,
-            )
+        st.download_button(
+            "📘 Descargar Word",
+            data=renders["docx"],
+            file_name=f"{nombre}.docx",
+            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            use_container_width=True,
+        )
+
+    with st.expander("📈 Telemetría de la ejecución"):
+        st.dataframe(estado["spans"], use_container_width=True)
+        st.caption(
+            f"Traza: `{estado['traza']}` · Métricas: `{Config.METRICS_PATH}`"
+        )
+
+
+# ═══════════════ EJECUTAR INVESTIGACIÓN ═══════════════
+# La investigación corre en la cola de trabajos del proceso (trabajos.py);
+# esta página solo la envía y consulta su progreso.
+iniciar = st.button(
+    "🚀 INICIAR INVESTIGACIÓN PROFUNDA",
+    type="primary",
+    use_container_width=True,
+    disabled=not objetivo or not seleccionadas,
+)
+if iniciar or reanudar:
+    errores = ajustes.validar()
+    if errores:
+        for e in errores:
+            st.error(f"❌ {e}")
+        st.stop()
+
+    if reanudar:
+        try:
+            checkpoint = Checkpoint.cargar(run_id_reanudar)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            st.stop()
+        trabajo = obtener_cola().estado(checkpoint.run_id)
+        if trabajo and trabajo["estado"] == COMPLETADO:
+            nuevo_estado(trabajo)  # ya terminado: solo se muestran sus resultados
+            checkpoint = None
+    else:
+        if len(objetivo.strip()) < 5:
+            st.error("❌ El objetivo es demasiado corto")
+            st.stop()
+        if previo := st.session_state.get("trabajo_activo"):
+            # Nuevo objetivo: el run anterior de la sesión deja de gastar cuota
+            obtener_cola().cancelar(previo)
+        checkpoint = Checkpoint.nuevo(
+            objetivo, seleccionadas, incluir_resumen, modelo=ajustes.modelo
+        )
+    if checkpoint:
+        st.session_state["trabajo_activo"] = obtener_cola().enviar(checkpoint, ajustes)
+
+if st.session_state.get("trabajo_activo"):
+    seguir_trabajo(st.session_state["trabajo_activo"])
+else:
+    mostrar_run()
 
 st.divider()
 st.caption(
     f"Deep Research Automator v{Config.VERSION} · "
-    f"Modelo: {Config.MODEL} · "
+    f"Modelo: {ajustes.modelo} · "
     f"Powered by Google Gemini"
 )
@@ -0,0 +1,187 @@
+"""
+Ejecución por lotes sin Streamlit.
+
+Uso:
+    python batch.py objetivos.jsonl --salida reports/lote --procesos 4 --concurrencia 8
+
+Cada línea del JSONL es {"objetivo": str} con campos opcionales
+"id", "dimensiones" (números 1-7) y "resumen" (bool). Por cada objetivo
+se escribe el informe en la carpeta de salida (con el run_id
+"batch_<id>" en el nombre, así que objetivos iguales no se pisan) y una
+línea de estado en <salida>/estado.jsonl. Los ids ya completados en ese fichero se saltan,
+así que relanzar el mismo comando reanuda el lote. Un objetivo con
+dimensiones fuera de 1-7 o con un id repetido en el lote no se ejecuta:
+queda con su error en estado.jsonl.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import chain
+from config import Config
+
+
+def leer_trabajos(ruta: str) -> list[dict]:
+    """
+    Objetivos del JSONL. Los que no se pueden ejecutar llevan "error":
+    dimensiones fuera de 1-7 o un id repetido en el lote (compartirían el
+    mismo checkpoint y se pisarían).
+    """
+    trabajos = []
+    lineas: dict[str, list[int]] = {}  # id → líneas donde aparece
+    with open(ruta, encoding="utf-8") as f:
+        for n, linea in enumerate(f, 1):
+            if not linea.strip():
+                continue
+            trabajo = json.loads(linea)
+            if not trabajo.get("objetivo", "").strip():
+                raise ValueError(f"Línea {n}: falta 'objetivo'")
+            trabajo.setdefault("id", f"job{n:05d}")
+            trabajo["id"] = str(trabajo["id"])
+            numeros = trabajo.get("dimensiones", list(range(1, 8)))
+            if not isinstance(numeros, list) or not numeros or not all(
+                isinstance(d, int) and not isinstance(d, bool) and 1 <= d <= 7
+                for d in numeros
+            ):
+                trabajo["error"] = (
+                    f"Línea {n}: 'dimensiones' debe ser una lista de números 1-7"
+                )
+            lineas.setdefault(trabajo["id"], []).append(n)
+            trabajos.append(trabajo)
+    for trabajo in trabajos:
+        if len(repetido := lineas[trabajo["id"]]) > 1:
+            trabajo.setdefault("error", (
+                f"Id '{trabajo['id']}' repetido en las líneas "
+                f"{', '.join(map(str, repetido))}"
+            ))
+    return trabajos
+
+
+def completados_previos(ruta_estado: str) -> set[str]:
+    if not os.path.exists(ruta_estado):
+        return set()
+    with open(ruta_estado, encoding="utf-8") as f:
+        return {
+            e["id"] for e in map(json.loads, filter(str.strip, f))
+            if e["estado"] == "ok"
+        }
+
+
+def _inicializar_proceso(ajustes: dict):
+    """Cada proceso recibe su parte de la cuota y de la concurrencia global."""
+    for nombre, valor in ajustes.items():
+        setattr(Config, nombre, valor)
+
+
+def procesar_trabajo(trabajo: dict) -> dict:
+    """Ejecuta un objetivo completo (en un proceso del pool)."""
+    from checkpoint import Checkpoint
+    from gemini_client import GeminiClient
+    from pipeline import investigar
+
+    inicio = time.time()
+    estado = {"id": trabajo["id"], "objetivo": trabajo["objetivo"]}
+    try:
+        run_id = f"batch_{trabajo['id']}"
+        if Checkpoint.existe(run_id):
+            checkpoint = Checkpoint.cargar(run_id)
+        else:
+            seleccionadas = sorted({n - 1 for n in trabajo.get("dimensiones", range(1, 8))})
+            checkpoint = Checkpoint.nuevo(
+                trabajo["objetivo"], seleccionadas,
+                trabajo.get("resumen", True), run_id=run_id,
+            )
+
+        for tipo, _, dato in investigar(GeminiClient(), checkpoint):
+            if tipo == "completado":
+                builder = dato
+
+        estado.update({
+            "estado": "ok",
+            "run_id": run_id,
+            "rutas": builder.guardar_todo(),
+            **builder.stats,
+        })
+    except Exception as e:
+        estado.update({"estado": "error", "error": f"{type(e).__name__}: {e}"})
+    estado["duracion"] = round(time.time() - inicio, 1)
+    return estado
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Deep Research por lotes")
+    parser.add_argument("entrada", help="JSONL con un objetivo por línea")
+    parser.add_argument("--salida", default=os.path.join(Config.REPORTS_DIR, "lote"))
+    parser.add_argument("--procesos", type=int, default=2,
+                        help="Objetivos procesados a la vez")
+    parser.add_argument("--concurrencia", type=int, default=Config.MAX_CONCURRENCY * 2,
+                        help="Llamadas simultáneas en total, repartidas entre procesos")
+    parser.add_argument("--rpm", type=int, default=Config.RPM_LIMIT,
+                        help="Cuota global de peticiones/min")
+    parser.add_argument("--tpm", type=int, default=Config.TPM_LIMIT,
+                        help="Cuota global de tokens/min")
+    args = parser.parse_args(argv)
+
+    errores = Config.validate()
+    if errores:
+        for e in errores:
+            print(f"❌ {e}")
+        return 1
+
+    os.makedirs(args.salida, exist_ok=True)
+    ruta_estado = os.path.join(args.salida, "estado.jsonl")
+    hechos = completados_previos(ruta_estado)
+    trabajos = [t for t in leer_trabajos(args.entrada) if t["id"] not in hechos]
+    if hechos:
+        print(f"↪️ {len(hechos)} objetivos ya completados, se omiten")
+    if not trabajos:
+        print("✅ Nada que hacer")
+        return 0
+
+    validos = [t for t in trabajos if "error" not in t]
+    rechazados = [
+        {"id": t["id"], "objetivo": t["objetivo"], "estado": "error",
+         "error": t["error"], "duracion": 0.0}
+        for t in trabajos if "error" in t
+    ]
+
+    # El limitador de cuota es por proceso: se reparte la cuota global
+    procesos = max(1, min(args.procesos, len(validos)))
+    ajustes = {
+        "REPORTS_DIR": args.salida,
+        "MAX_CONCURRENCY": max(1, args.concurrencia // procesos),
+        "RPM_LIMIT": max(1, args.rpm // procesos),
+        "TPM_LIMIT": max(1, args.tpm // procesos),
+        "STREAMING": False,
+        "INCREMENTAL_REPORTS": True,
+    }
+
+    print(f"🚀 {len(trabajos)} objetivos · {procesos} procesos · "
+          f"{ajustes['MAX_CONCURRENCY']} llamadas/proceso")
+    inicio = time.time()
+    ok = 0
+    with ProcessPoolExecutor(
+        max_workers=procesos,
+        initializer=_inicializar_proceso, initargs=(ajustes,),
+    ) as pool, open(ruta_estado, "a", encoding="utf-8") as f_estado:
+        futuros = [pool.submit(procesar_trabajo, t) for t in validos]
+        estados = chain(rechazados, (futuro.result() for futuro in as_completed(futuros)))
+        for n, estado in enumerate(estados, 1):
+            f_estado.write(json.dumps(estado, ensure_ascii=False) + "\n")
+            f_estado.flush()
+            ok += estado["estado"] == "ok"
+            icono = "✅" if estado["estado"] == "ok" else "❌"
+            print(f"{icono} [{n}/{len(trabajos)}] {estado['id']} "
+                  f"· {estado['duracion']}s · {estado.get('error', '')}")
+
+    horas = (time.time() - inicio) / 3600
+    print(f"🏁 {ok}/{len(trabajos)} completados en {horas * 60:.1f} min "
+          f"· {ok / horas:.1f} objetivos/hora")
+    return 0 if ok == len(trabajos) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
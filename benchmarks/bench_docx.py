@@ -0,0 +1,121 @@
+"""
+Benchmark de generación DOCX para informes grandes.
+
+    python -m benchmarks.bench_docx --tamanos 100000 300000 1000000
+
+Para cada tamaño genera 7 secciones de Markdown sintético (encabezados,
+negritas, listas, código y tablas) y mide tiempo y memoria pico de
+ReportBuilder.exportar_docx frente al volcado línea a línea anterior.
+tracemalloc solo ve la memoria de Python (no la de libxml2), así que al
+final se muestra también el RSS máximo del proceso.
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+from io import BytesIO
+from docx import Document
+from benchmarks.bench_pipeline import rss_maximo_mb
+from report_builder import ReportBuilder
+
+_PALABRAS = (
+    "mercado", "análisis", "estrategia", "riesgo", "dato", "tendencia",
+    "cliente", "coste", "margen", "regulación", "tecnología", "competencia",
+)
+
+
+def markdown_sintetico(caracteres: int, semilla: int = 0) -> str:
+    rng = random.Random(semilla)
+
+    def frase(n=12):
+        return " ".join(rng.choice(_PALABRAS) for _ in range(n))
+
+    bloques, total = [], 0
+    while total < caracteres:
+        bloque = "\n".join([
+            f"## {frase(4).capitalize()}",
+            f"El **{frase(2)}** muestra *{frase(3)}* con `{rng.choice(_PALABRAS)}` "
+            f"y [fuente](https://ejemplo.org/{rng.randint(1, 999)}). {frase()}.",
+            *(f"- **{frase(1)}**: {frase()}" for _ in range(4)),
+            *(f"{k}. {frase()} _{frase(2)}_" for k in range(1, 4)),
+            "| Métrica | Valor | Fuente |",
+            "|---|---|---|",
+            *(f"| {frase(2)} | {rng.randint(1, 100)}% | {frase(1)} |" for _ in range(3)),
+            "```",
+            f"{frase(3)} = {rng.random():.3f}",
+            "```",
+            "",
+        ])
+        bloques.append(bloque)
+        total += len(bloque)
+    return "\n".join(bloques)
+
+
+def docx_linea_a_linea(secciones: list[str]) -> bytes:
+    """Versión anterior: un párrafo por línea, sin formato en línea."""
+    doc = Document()
+    for contenido in secciones:
+        doc.add_heading("Sección", level=1)
+        for parrafo in contenido.split("\n"):
+            parrafo = parrafo.strip()
+            if not parrafo:
+                continue
+            if parrafo.startswith("### "):
+                doc.add_heading(parrafo[4:], level=3)
+            elif parrafo.startswith("## "):
+                doc.add_heading(parrafo[3:], level=2)
+            elif parrafo.startswith(("- ", "* ")):
+                doc.add_paragraph(parrafo[2:], style="List Bullet")
+            else:
+                doc.add_paragraph(parrafo)
+        doc.add_page_break()
+    buffer = BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def medir(funcion, *args, repeticiones: int = 3) -> tuple[float, float, int]:
+    """Mejor tiempo sin tracemalloc (lo ralentiza mucho) y pico en una pasada aparte."""
+    duracion = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion(*args)
+        duracion = min(duracion, time.perf_counter() - inicio)
+    tracemalloc.start()
+    funcion(*args)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duracion, pico / 1e6, len(resultado)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Benchmark de exportación DOCX")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[100_000, 300_000])
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'caracteres':>11} {'versión':<15} {'tiempo':>8} {'pico MB':>8} {'DOCX KB':>8}")
+    for tamano in args.tamanos:
+        secciones = [markdown_sintetico(tamano // 7, semilla=n) for n in range(7)]
+        builder = ReportBuilder("Benchmark DOCX")
+        for n, contenido in enumerate(secciones, 1):
+            builder.agregar_seccion(
+                {"num": n, "emoji": "📊", "nombre": f"Dimensión {n}"},
+                contenido, [], True,
+            )
+
+        for nombre, funcion, argumentos in (
+            ("línea a línea", docx_linea_a_linea, (secciones,)),
+            ("conversor", builder.exportar_docx, ()),
+        ):
+            duracion, pico, tamano_docx = medir(
+                funcion, *argumentos, repeticiones=args.repeticiones
+            )
+            print(f"{tamano:>11,} {nombre:<15} {duracion:>7.2f}s {pico:>8.1f} "
+                  f"{tamano_docx / 1024:>8.0f}")
+    print(f"rss máx. del proceso={rss_maximo_mb():.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
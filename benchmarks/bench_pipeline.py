@@ -0,0 +1,175 @@
+"""
+Benchmark del pipeline completo contra el backend simulado (sin cuota).
+
+    python -m benchmarks.bench_pipeline --runs 10 --concurrencia 7 --escala 0.01
+
+Cada run recorre generar_mega_prompt → crear_dimensiones → 7 dimensiones
+→ resumen → ReportBuilder.guardar_todo y se mide de extremo a extremo.
+Las latencias simuladas se escalan con --escala (0.01 = 100x más rápido).
+Solo las esperas se deshacen de esa escala: el tiempo de CPU del pipeline
+y la exportación del informe son trabajo real, no se escalan y se
+reportan aparte como sobrecarga, así que el resultado no depende de
+--escala (--tracemalloc añade bastante CPU real). Con --prefill la latencia crece con
+los tokens de entrada no cacheados; --sin-contexto desactiva el contexto
+compartido para comparar tokens de entrada y latencia con y sin él.
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from config import Config
+from fake_backend import ModeloSimulado, PerfilSimulacion
+
+
+def percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[round(p * (len(ordenados) - 1))]
+
+
+def configurar(args, directorio: str):
+    Config.BACKEND = "simulado"
+    Config.CACHE_ENABLED = args.cache
+    Config.MAX_CONCURRENCY = args.concurrencia
+    Config.STREAMING = args.stream
+    Config.FAST_START = args.fast_start
+    Config.GRANULAR = args.granular
+    Config.CONTEXT_CACHE = not args.sin_contexto
+    Config.CONTEXT_CACHE_MIN_TOKENS = args.min_tokens_contexto
+    Config.INCREMENTAL_REPORTS = args.incremental
+    Config.RPM_LIMIT = args.rpm
+    Config.TPM_LIMIT = 100_000_000
+    # Las esperas de reintento también van a escala
+    Config.DELAY_BETWEEN_CALLS = 3 * args.escala
+    Config.MAX_RETRY_DELAY = 120 * args.escala
+    Config.HEDGE_DEFAULT_DELAY = 90 * args.escala
+    Config.BREAKER_COOLDOWN = 60 * args.escala
+    Config.REPORTS_DIR = f"{directorio}/reports"
+    Config.RUNS_DIR = f"{directorio}/runs"
+    Config.TELEMETRY_DIR = f"{directorio}/telemetry"
+    Config.METRICS_PATH = f"{directorio}/telemetry/metrics.prom"
+    Config.CACHE_PATH = f"{directorio}/cache.sqlite3"
+
+
+def ejecutar_run(modelo: ModeloSimulado, objetivo: str, escala: float) -> tuple[float, float, dict]:
+    """
+    (duración simulada, sobrecarga real, stats) de un run. La duración
+    simulada son las esperas del pipeline deshechas de `escala` más la
+    sobrecarga real sin escalar: la CPU del proceso durante el pipeline
+    (aproximación: se descuenta de la pared como si no solapara con las
+    esperas) y la exportación del informe.
+    """
+    from checkpoint import Checkpoint
+    from gemini_client import GeminiClient
+    from pipeline import investigar
+
+    inicio, cpu = time.perf_counter(), time.process_time()
+    checkpoint = Checkpoint.nuevo(objetivo, list(range(7)), True)
+    builder = None
+    for tipo, _, dato in investigar(
+        GeminiClient(backend=modelo), checkpoint, stream=Config.STREAMING
+    ):
+        if tipo == "completado":
+            builder = dato
+    pared = time.perf_counter() - inicio
+    cpu = min(time.process_time() - cpu, pared)
+    inicio = time.perf_counter()
+    builder.guardar_todo()
+    exportacion = time.perf_counter() - inicio
+    sobrecarga = cpu + exportacion
+    return (pared - cpu) / escala + sobrecarga, sobrecarga, builder.stats
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline (backend simulado)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--concurrencia", type=int, default=Config.MAX_CONCURRENCY)
+    parser.add_argument("--escala", type=float, default=0.01)
+    parser.add_argument("--latencia", type=float, default=20.0, help="Mediana (s) por llamada")
+    parser.add_argument("--sigma", type=float, default=0.5)
+    parser.add_argument("--errores", type=float, default=0.0, help="Tasa de 503")
+    parser.add_argument("--rafagas-429", type=float, default=0.0, help="Prob. de iniciar ráfaga")
+    parser.add_argument("--caracteres", type=int, default=6000)
+    parser.add_argument("--rpm", type=int, default=10_000)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--fast-start", action="store_true")
+    parser.add_argument("--granular", action="store_true",
+                        help="Una llamada por punto del checklist de cada dimensión")
+    parser.add_argument("--cache", action="store_true")
+    parser.add_argument("--sin-contexto", action="store_true",
+                        help="Sin contexto compartido cacheado (prompt completo por dimensión)")
+    parser.add_argument("--min-tokens-contexto", type=int, default=0,
+                        help="El mega-prompt simulado es corto; 0 cachea siempre")
+    parser.add_argument("--decodificacion", type=float, default=0.0,
+                        help="Segundos por cada 1000 tokens generados")
+    parser.add_argument("--prefill", type=float, default=0.0,
+                        help="Segundos por cada 1000 tokens de entrada no cacheados")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Informe volcado a disco sección a sección")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="Medir el pico de memoria Python (encarece la CPU unas 4x)")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    perfil = PerfilSimulacion(
+        latencia=("lognormal", args.latencia, args.sigma),
+        tasa_error=args.errores,
+        prob_rafaga_429=args.rafagas_429,
+        caracteres_salida=(args.caracteres, args.caracteres // 3),
+        prefill_por_1k=args.prefill,
+        decodificacion_por_1k=args.decodificacion,
+        escala_tiempo=args.escala,
+        semilla=args.semilla,
+    )
+    modelo = ModeloSimulado("simulado", perfil)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        configurar(args, directorio)
+        if args.tracemalloc:
+            tracemalloc.start()
+        duraciones, sobrecargas = [], []
+        for n in range(args.runs):
+            # Objetivo distinto por run para no reutilizar el mega-prompt memorizado
+            duracion, sobrecarga, stats = ejecutar_run(
+                modelo, f"Objetivo de benchmark número {n}", args.escala
+            )
+            duraciones.append(duracion)
+            sobrecargas.append(sobrecarga)
+            print(f"  run {n + 1}/{args.runs}: {duracion:7.1f}s simulados "
+                  f"(sobrecarga real {sobrecarga:.2f}s) "
+                  f"· {stats['exitosas']}/{stats['total']} secciones")
+        total = sum(duraciones)
+        pico = tracemalloc.get_traced_memory()[1] if args.tracemalloc else float("nan")
+        tracemalloc.stop()
+
+    print()
+    print(f"runs={args.runs} concurrencia={args.concurrencia} stream={args.stream} "
+          f"fast_start={args.fast_start} granular={args.granular} "
+          f"contexto={not args.sin_contexto} "
+          f"errores={args.errores} rafagas_429={args.rafagas_429}")
+    print(f"extremo a extremo  p50={percentil(duraciones, 0.5):.1f}s  "
+          f"p95={percentil(duraciones, 0.95):.1f}s  media={statistics.mean(duraciones):.1f}s")
+    print(f"sobrecarga real (CPU + exportación, sin escalar)  "
+          f"p50={percentil(sobrecargas, 0.5):.2f}s  media={statistics.mean(sobrecargas):.2f}s")
+    print(f"llamadas={modelo.llamadas} (errores simulados={modelo.errores})  "
+          f"llamadas/s={modelo.llamadas / total:.3f}")
+    print(f"tokens de entrada={modelo.tokens_entrada:,} (desde caché={modelo.tokens_cache:,}, "
+          f"facturados completos={modelo.tokens_entrada - modelo.tokens_cache:,})")
+    print(f"memoria pico (tracemalloc)={pico / 1e6:.1f} MB  "
+          f"rss máx. del proceso={rss_maximo_mb():.1f} MB")
+
+
+def rss_maximo_mb() -> float:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float("nan")
+    # Linux lo da en KiB, macOS en bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1e6 if sys.platform == "darwin" else rss / 1e3
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Cancelación cooperativa de runs.
+
+Un `TokenCancelacion` se crea por run y viaja en el cliente
+(`GeminiClient(..., cancelacion=token)`): lo comparten todas sus vistas,
+el bucle de reintentos, el limitador de cuota y el planificador de
+dimensiones. Al cancelarlo, las esperas (backoff, cuota, entre
+estrategias) se interrumpen al momento y las peticiones en vuelo se
+abandonan; el pipeline emite ("cancelado", None, builder) con las
+secciones que ya habían terminado.
+
+`Cancelado` hereda de BaseException, como asyncio.CancelledError, para
+que los `except Exception` de reintentos y fallbacks no la confundan con
+un fallo de la API que haya que reintentar.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+# Peticiones síncronas cancelables: se ejecutan aquí para que quien espera
+# pueda dejar de hacerlo (el hilo termina solo y su resultado se descarta)
+_pool_llamadas = ThreadPoolExecutor(max_workers=64, thread_name_prefix="llamada")
+
+
+class Cancelado(BaseException):
+    """El run se canceló."""
+
+
+class TokenCancelacion:
+    """Señal de cancelación de un run, segura entre hilos y event loops."""
+
+    def __init__(self):
+        self.motivo = ""
+        self._evento = threading.Event()
+        self._avisos: dict[int, object] = {}
+        self._siguiente = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cancelado(self) -> bool:
+        return self._evento.is_set()
+
+    def cancelar(self, motivo: str = "Cancelado"):
+        """Cancela el run (idempotente) y despierta a todo lo que espera."""
+        with self._lock:
+            if self._evento.is_set():
+                return
+            self.motivo = motivo
+            self._evento.set()
+            avisos = list(self._avisos.values())
+            self._avisos.clear()
+        for aviso in avisos:
+            aviso()
+
+    def al_cancelar(self, aviso):
+        """
+        Llama a `aviso()` al cancelar (ya mismo si lo está). Devuelve la
+        función que lo da de baja.
+        """
+        with self._lock:
+            if not self._evento.is_set():
+                clave = self._siguiente
+                self._siguiente += 1
+                self._avisos[clave] = aviso
+                return lambda: self._avisos.pop(clave, None)
+        aviso()
+        return lambda: None
+
+    def comprobar(self):
+        """Lanza `Cancelado` si el run está cancelado."""
+        if self._evento.is_set():
+            raise Cancelado(self.motivo)
+
+    # ── Esperas ──
+    def esperar(self, segundos: float):
+        """`time.sleep` que se corta al cancelar."""
+        self._evento.wait(max(0.0, segundos))
+        self.comprobar()
+
+    async def aesperar(self, segundos: float):
+        """`asyncio.sleep` que se corta al cancelar."""
+        self.comprobar()
+        loop = asyncio.get_running_loop()
+        aviso = loop.create_future()
+        quitar = self.al_cancelar(lambda: loop.call_soon_threadsafe(_resolver, aviso))
+        try:
+            await asyncio.wait({aviso}, timeout=max(0.0, segundos))
+        finally:
+            quitar()
+            aviso.cancel()
+        self.comprobar()
+
+    # ── Peticiones en vuelo ──
+    def ejecutar(self, funcion, *args, **kwargs):
+        """
+        `funcion(*args, **kwargs)` en un hilo aparte; al cancelar se deja
+        de esperar y se lanza `Cancelado` sin esperar a que termine.
+        """
+        self.comprobar()
+        futuro = _pool_llamadas.submit(funcion, *args, **kwargs)
+        aviso = Future()
+        quitar = self.al_cancelar(lambda: aviso.set_result(None))
+        try:
+            wait((futuro, aviso), return_when=FIRST_COMPLETED)
+        finally:
+            quitar()
+        if not futuro.done():
+            futuro.cancel()
+            raise Cancelado(self.motivo)
+        return futuro.result()
+
+    async def acorrer(self, corutina):
+        """Espera `corutina`; al cancelar la cancela de verdad y lanza `Cancelado`."""
+        tarea = asyncio.ensure_future(corutina)
+        loop = asyncio.get_running_loop()
+        aviso = loop.create_future()
+        quitar = self.al_cancelar(lambda: loop.call_soon_threadsafe(_resolver, aviso))
+        try:
+            await asyncio.wait({tarea, aviso}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            tarea.cancel()
+            raise
+        finally:
+            quitar()
+            aviso.cancel()
+        if not tarea.done():
+            tarea.cancel()
+            raise Cancelado(self.motivo)
+        return tarea.result()
+
+
+def _resolver(aviso: asyncio.Future):
+    if not aviso.done():
+        aviso.set_result(None)
+
+
+class _SinCancelacion(TokenCancelacion):
+    """Token que nunca se cancela: las llamadas van directas, sin hilos extra."""
+
+    def cancelar(self, motivo: str = "Cancelado"):
+        raise RuntimeError("SIN_CANCELACION no se puede cancelar")
+
+    def al_cancelar(self, aviso):
+        return lambda: None
+
+    def esperar(self, segundos: float):
+        time.sleep(max(0.0, segundos))
+
+    async def aesperar(self, segundos: float):
+        await asyncio.sleep(max(0.0, segundos))
+
+    def ejecutar(self, funcion, *args, **kwargs):
+        return funcion(*args, **kwargs)
+
+    async def acorrer(self, corutina):
+        return await corutina
+
+
+# Por defecto en los clientes creados sin token
+SIN_CANCELACION = _SinCancelacion()
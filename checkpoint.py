@@ -0,0 +1,220 @@
+"""Checkpoints durables por ejecución para poder reanudar investigaciones."""
+
+import json
+import os
+import re
+import threading
+import uuid
+from datetime import datetime
+from config import Config
+
+# El run_id es parte de rutas en RUNS_DIR: ni separadores ni ".."
+_RUN_ID_VALIDO = re.compile(r"[A-Za-z0-9_-]+")
+
+
+class Checkpoint:
+    """
+    Estado de una ejecución en runs/<run_id>.json. Cada cambio se escribe
+    de forma atómica (fichero temporal + rename), así que un corte a mitad
+    nunca deja un checkpoint corrupto.
+
+    El texto de las secciones no va en el JSON: se añade a
+    runs/<run_id>.secciones (una línea de metadatos y el texto detrás), así
+    que guardar una sección escribe solo esa sección y en memoria quedan
+    sus metadatos y su posición. `contenido(num)` lo lee cuando hace falta.
+    Un registro a medias por un corte se ignora al cargar y se recorta al
+    escribir el siguiente.
+    """
+
+    def __init__(self, datos: dict):
+        self.datos = datos
+        self._lock = threading.Lock()
+        # Fin del último registro completo de runs/<run_id>.secciones
+        self._fin_secciones = None
+
+    @property
+    def run_id(self) -> str:
+        return self.datos["run_id"]
+
+    @staticmethod
+    def validar_run_id(run_id: str) -> str:
+        """El run_id sin espacios alrededor; ValueError si no es [A-Za-z0-9_-]+."""
+        run_id = run_id.strip()
+        if not _RUN_ID_VALIDO.fullmatch(run_id):
+            raise ValueError(
+                f"Run ID no válido: '{run_id}' (solo letras, números, '_' y '-')"
+            )
+        return run_id
+
+    @classmethod
+    def _ruta(cls, run_id: str) -> str:
+        return os.path.join(Config.RUNS_DIR, f"{cls.validar_run_id(run_id)}.json")
+
+    @classmethod
+    def _ruta_secciones(cls, run_id: str) -> str:
+        return os.path.join(Config.RUNS_DIR, f"{cls.validar_run_id(run_id)}.secciones")
+
+    @classmethod
+    def nuevo(cls, objetivo: str, seleccionadas: list[int],
+              incluir_resumen: bool, run_id: str | None = None,
+              modelo: str | None = None) -> "Checkpoint":
+        ahora = datetime.now()
+        run_id = cls.validar_run_id(
+            run_id or f"{ahora.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        )
+        checkpoint = cls({
+            "run_id": run_id,
+            "objetivo": objetivo,
+            "seleccionadas": seleccionadas,
+            "incluir_resumen": incluir_resumen,
+            "timestamp": ahora.isoformat(),
+            "modelo": modelo or Config.MODEL,
+            "mega_prompt": None,
+            "secciones": {},
+            "notas": {},
+            "resumen": None,
+            "estado": "en_curso",
+        })
+        if os.path.exists(ruta := cls._ruta_secciones(run_id)):
+            os.remove(ruta)  # de un run anterior con el mismo id
+        checkpoint._fin_secciones = 0
+        checkpoint._escribir()
+        return checkpoint
+
+    @classmethod
+    def existe(cls, run_id: str) -> bool:
+        """ValueError si el run_id no es válido."""
+        return os.path.exists(cls._ruta(run_id))
+
+    @classmethod
+    def cargar(cls, run_id: str) -> "Checkpoint":
+        ruta = cls._ruta(run_id)
+        if not os.path.exists(ruta):
+            raise ValueError(f"No existe el run '{run_id.strip()}'")
+        with open(ruta, encoding="utf-8") as f:
+            checkpoint = cls(json.load(f))
+        checkpoint._indexar_secciones()
+        return checkpoint
+
+    def _indexar_secciones(self):
+        """Metadatos y posición de cada sección guardada (sin leer los textos)."""
+        ruta = self._ruta_secciones(self.run_id)
+        self._fin_secciones = 0
+        if not os.path.exists(ruta):
+            return
+        tamano = os.path.getsize(ruta)
+        with open(ruta, "rb") as f:
+            while linea := f.readline():
+                try:
+                    meta = json.loads(linea)
+                except ValueError:
+                    break  # cabecera a medias
+                inicio = f.tell()
+                longitud = meta.pop("bytes")
+                if inicio + longitud + 1 > tamano:
+                    break  # texto a medias
+                f.seek(longitud + 1, os.SEEK_CUR)
+                self._fin_secciones = f.tell()
+                num = str(meta.pop("num"))
+                self.datos["secciones"][num] = {**meta, "posicion": [inicio, longitud]}
+
+    # ── Escritura ──
+    def _escribir(self):
+        os.makedirs(Config.RUNS_DIR, exist_ok=True)
+        ruta = self._ruta(self.run_id)
+        tmp = f"{ruta}.tmp"
+        # Las secciones viven en su propio fichero (salvo las de checkpoints antiguos)
+        datos = {**self.datos, "secciones": {
+            num: s for num, s in self.datos["secciones"].items() if "contenido" in s
+        }}
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, ruta)
+
+    def _actualizar(self, **cambios):
+        with self._lock:
+            self.datos.update(cambios)
+            self._escribir()
+
+    def guardar_mega_prompt(self, mega_prompt: str, modelo: str | None = None):
+        with self._lock:
+            self.datos["mega_prompt"] = mega_prompt
+            if modelo:
+                self.datos.setdefault("modelos", {})["mega_prompt"] = modelo
+            self._escribir()
+
+    def guardar_seccion(self, dimension: dict, contenido: str,
+                        fuentes: list[str], exito: bool, modelo: str | None = None):
+        meta = {"fuentes": fuentes, "exito": exito, "modelo": modelo,
+                "caracteres": len(contenido)}
+        texto = contenido.encode("utf-8")
+        cabecera = json.dumps(
+            {"num": dimension["num"], **meta, "bytes": len(texto)}, ensure_ascii=False
+        )
+        with self._lock:
+            os.makedirs(Config.RUNS_DIR, exist_ok=True)
+            with open(self._ruta_secciones(self.run_id), "ab") as f:
+                if self._fin_secciones is not None and f.tell() > self._fin_secciones:
+                    f.truncate(self._fin_secciones)  # registro a medias de un corte
+                    f.seek(0, os.SEEK_END)
+                inicio = f.tell() + len(cabecera.encode("utf-8")) + 1
+                f.write(cabecera.encode("utf-8") + b"\n" + texto + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+                self._fin_secciones = f.tell()
+            self.datos["secciones"][str(dimension["num"])] = {
+                **meta, "posicion": [inicio, len(texto)],
+            }
+
+    def guardar_nota(self, num: int, nota: str):
+        """Nota condensada de una sección (entrada del resumen map-reduce)."""
+        with self._lock:
+            self.datos.setdefault("notas", {})[str(num)] = nota
+            self._escribir()
+
+    def guardar_resumen(self, resumen: str, modelo: str | None = None):
+        with self._lock:
+            self.datos["resumen"] = resumen
+            if modelo:
+                self.datos.setdefault("modelos", {})["resumen"] = modelo
+            self._escribir()
+
+    def marcar_estado(self, estado: str):
+        self._actualizar(estado=estado)
+
+    # ── Lectura ──
+    def seccion(self, num: int) -> dict | None:
+        """Metadatos de la sección (fuentes, exito, modelo, caracteres), sin el texto."""
+        return self.datos["secciones"].get(str(num))
+
+    def contenido(self, num: int) -> str | None:
+        """Texto de una sección guardada."""
+        seccion = self.seccion(num)
+        if seccion is None:
+            return None
+        if "contenido" in seccion:
+            return seccion["contenido"]
+        inicio, longitud = seccion["posicion"]
+        with open(self._ruta_secciones(self.run_id), "rb") as f:
+            f.seek(inicio)
+            return f.read(longitud).decode("utf-8")
+
+    def nota(self, num: int) -> str | None:
+        return self.datos.get("notas", {}).get(str(num))
+
+    def modelo(self, etapa: str) -> str | None:
+        """Modelo que generó el mega-prompt o el resumen guardados."""
+        return self.datos.get("modelos", {}).get(etapa)
+
+    def pendientes(self, dimensiones: list[dict]) -> list[dict]:
+        """Dimensiones que faltan o fallaron en este run."""
+        return [
+            d for d in dimensiones
+            if not (s := self.seccion(d["num"])) or not s["exito"]
+        ]
+
+    @property
+    def timestamp(self) -> datetime:
+        return datetime.fromisoformat(self.datos["timestamp"])
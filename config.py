@@ -1,6 +1,15 @@
-"""Configuración centralizada."""
+"""
+Configuración centralizada.
+
+`Config` tiene los valores por defecto y lo que es del proceso (rutas,
+pools, reintentos, breaker...). Lo que cada run puede elegir (key,
+modelo, generación, concurrencia, modos) va en un `Ajustes` inmutable
+que se crea al lanzar el run y viaja con el cliente: así varias sesiones
+con ajustes distintos pueden ejecutar a la vez en el mismo proceso.
+"""
 
 import os
+from dataclasses import dataclass, field, fields, replace
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,23 +19,180 @@ class Config:
     # API
     API_KEY = os.getenv("GEMINI_API_KEY", "")
     MODEL = "gemini-3-flash-preview"
+    # Modelos que se pueden elegir (selector de la app, campo "modelo" de la API)
+    MODELS = [
+        "gemini-3-flash-preview",
+        "gemini-2.0-flash",
+        "gemini-2.5-flash-preview-05-20",
+        "gemini-2.5-pro-preview-05-06",
+    ]
+    BACKEND = os.getenv("DEEP_RESEARCH_BACKEND", "gemini")  # o "simulado"
 
     # Generación
     MAX_TOKENS = 8192
     TEMPERATURE = 0.3
-    DELAY_BETWEEN_CALLS = 3  # segundos
+    DELAY_BETWEEN_CALLS = 3  # segundos (base del backoff tras error)
     MAX_RETRIES = 3
+    MAX_RETRY_DELAY = 120  # tope para el retraso sugerido por el servidor
+    BREAKER_THRESHOLD = 5  # fallos seguidos que abren el circuito
+    BREAKER_COOLDOWN = 60  # segundos antes de probar de nuevo
+    MAX_CONCURRENCY = 3  # llamadas simultáneas (1 = secuencial)
+    FAST_START = False  # dimensiones arrancan sin esperar al mega-prompt
+    # Modo granular: cada punto del checklist de una dimensión va en su
+    # propia llamada y las respuestas se fusionan en la sección
+    GRANULAR = False
+    GRANULAR_CONCURRENCY = 12  # subpreguntas en vuelo en total
+    STREAMING = True  # mostrar el texto mientras se genera
+    MEGA_PROMPT_MEMO = 64  # mega-prompts memorizados en el proceso (LRU)
+
+    # Enrutado por etapa (ver enrutador.py): modelos preferidos por etapa,
+    # o por dimensión con "dimension:<num>"; MODEL siempre es el último
+    # recurso: si el modelo enrutado falla, esa llamada se repite con MODEL.
+    # Se salta un modelo si falla o tarda más de lo presupuestado.
+    # Desactivado por defecto: al activarlo, mega-prompt y condensaciones
+    # dejan de usar MODEL y pasan a los modelos de MODEL_ROUTES
+    ROUTING = False
+    MODEL_ROUTES = {
+        "mega_prompt": ["gemini-2.0-flash"],
+        "condensar": ["gemini-2.0-flash"],
+        "dimension": [],
+        "resumen": [],
+    }
+    ROUTING_LATENCY_BUDGET = {"mega_prompt": 30, "condensar": 20}  # p50 en segundos
+    ROUTING_MAX_ERROR_RATE = 0.3
+    ROUTING_MIN_SAMPLES = 5  # muestras antes de juzgar un modelo
+    ROUTING_WINDOW = 50  # últimas llamadas por modelo
+    ROUTING_MAX_AGE = 600  # segundos; después un modelo descartado se reintenta
+    # USD por millón de tokens (entrada, salida), orientativos
+    MODEL_COSTS = {
+        "gemini-2.0-flash": (0.10, 0.40),
+        "gemini-2.5-flash": (0.30, 2.50),
+        "gemini-3-flash-preview": (0.50, 3.00),
+        "gemini-2.5-pro": (1.25, 10.00),
+    }
+    CACHED_TOKEN_DISCOUNT = 0.25  # fracción del precio de entrada
+
+    # Hedging: si la estrategia principal tarda más que su percentil
+    # histórico, se lanza una petición de respaldo y gana la primera
+    HEDGE_ENABLED = False
+    HEDGE_PERCENTILE = 0.9
+    HEDGE_MIN_SAMPLES = 5  # hasta tenerlas se usa HEDGE_DEFAULT_DELAY
+    HEDGE_DEFAULT_DELAY = 90  # segundos
+    HEDGE_BACKUP = "base"  # "base" (modelo sin search) o "misma" estrategia
+
+    # Contexto compartido: la base común de las dimensiones se sube una
+    # vez como contenido cacheado y cada dimensión envía solo su parte
+    CONTEXT_CACHE = True
+    CONTEXT_CACHE_TTL = 3600  # segundos
+    CONTEXT_CACHE_MIN_TOKENS = 1024  # por debajo Gemini no admite caché explícita
+
+    # Resumen ejecutivo map-reduce: cada sección se condensa al terminar
+    SUMMARY_NOTE_WORDS = 350  # extensión pedida a cada nota condensada
+    SUMMARY_INPUT_TOKENS = 12000  # presupuesto de las notas en el prompt final
+    SUMMARY_WORKERS = 2  # condensaciones simultáneas (se suman a MAX_CONCURRENCY)
+
+    # Cuota (compartida por proceso, por API key y modelo)
+    RPM_LIMIT = int(os.getenv("GEMINI_RPM", "15"))
+    TPM_LIMIT = int(os.getenv("GEMINI_TPM", "1000000"))
+
+    # Caché de respuestas (SQLite), compartida por todos los runs del
+    # fichero. Desactivada por defecto: reutiliza respuestas de otros runs
+    # (las de Google Search, solo las del mismo día)
+    CACHE_ENABLED = False
+    CACHE_PATH = "cache/respuestas.sqlite3"
+    CACHE_TTL_SEARCH = 6 * 3600  # respuestas con Google Search caducan antes
+    CACHE_TTL_BASE = 7 * 24 * 3600
+    CACHE_MAX_MB = 200
 
     # App
     VERSION = "5.0"
     REPORTS_DIR = "reports"
+    INCREMENTAL_REPORTS = False  # volcar cada sección a disco según llega
+    RUNS_DIR = "runs"  # checkpoints para reanudar ejecuciones
+    SESSION_RUNS = 3  # runs con resultados en memoria por sesión de la app
+    JOBS_PATH = "runs/trabajos.sqlite3"  # cola de trabajos en segundo plano
+    JOB_WORKERS = 4  # runs ejecutándose a la vez en el proceso
+    JOBS_PER_KEY = 2  # runs simultáneos por API key
+    POLL_SECONDS = 2  # cada cuánto consulta la app el progreso de un trabajo
+
+    # API HTTP (api.py)
+    API_HOST = os.getenv("API_HOST", "127.0.0.1")
+    API_PORT = int(os.getenv("API_PORT", "8765"))
+    API_MAX_JOBS = 20  # runs a la vez en el event loop; el resto espera
+    API_KEEP_JOBS = 100  # trabajos terminados que se recuerdan en memoria
+    API_KEEPALIVE = 15  # segundos entre comentarios keep-alive del SSE
+
+    # Telemetría
+    TELEMETRY_DIR = "telemetry"  # una traza JSONL por run
+    METRICS_PATH = "telemetry/metrics.prom"
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 = sin endpoint
 
     @classmethod
     def validate(cls):
         """Verifica que la configuración sea válida."""
+        return Ajustes.desde_config().validar()
+
+
+# Campo de Ajustes → atributo de Config del que toma su valor por defecto
+_POR_DEFECTO = {
+    "api_key": "API_KEY",
+    "modelo": "MODEL",
+    "temperatura": "TEMPERATURE",
+    "max_tokens": "MAX_TOKENS",
+    "retraso_base": "DELAY_BETWEEN_CALLS",
+    "rpm": "RPM_LIMIT",
+    "tpm": "TPM_LIMIT",
+    "max_concurrencia": "MAX_CONCURRENCY",
+    "arranque_rapido": "FAST_START",
+    "granular": "GRANULAR",
+    "streaming": "STREAMING",
+    "hedge": "HEDGE_ENABLED",
+    "enrutado": "ROUTING",
+    "contexto_cache": "CONTEXT_CACHE",
+    "cache_respuestas": "CACHE_ENABLED",
+    "incremental": "INCREMENTAL_REPORTS",
+}
+
+
+@dataclass(frozen=True)
+class Ajustes:
+    """Ajustes de un run, fijados al crearlo (ver `desde_config`)."""
+
+    api_key: str = field(repr=False)  # nunca en logs ni trazas
+    modelo: str
+    temperatura: float
+    max_tokens: int
+    retraso_base: float  # base del backoff tras error
+    rpm: int  # cuota de la key (compartida con otros runs de la misma key)
+    tpm: int
+    max_concurrencia: int
+    arranque_rapido: bool
+    granular: bool
+    streaming: bool
+    hedge: bool
+    enrutado: bool
+    contexto_cache: bool
+    cache_respuestas: bool
+    incremental: bool
+
+    @classmethod
+    def desde_config(cls, **cambios) -> "Ajustes":
+        """Valores actuales de Config, con `cambios` por encima."""
+        valores = {
+            campo.name: getattr(Config, _POR_DEFECTO[campo.name]) for campo in fields(cls)
+        }
+        return cls(**{**valores, **cambios})
+
+    def con(self, **cambios) -> "Ajustes":
+        """Copia con algunos campos cambiados."""
+        return replace(self, **cambios)
+
+    def validar(self) -> list[str]:
         errors = []
-        if not cls.API_KEY:
+        if Config.BACKEND == "simulado":
+            return errors
+        if not self.api_key:
             errors.append("GEMINI_API_KEY no está configurada")
-        if len(cls.API_KEY) < 10:
+        if len(self.api_key) < 10:
             errors.append("GEMINI_API_KEY parece inválida")
         return errors
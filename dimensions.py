@@ -1,8 +1,83 @@
 """Las 7 dimensiones de investigación con mega-prompt dinámico y PROHIBICIÓN TOTAL de tablas."""
 
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from cancelacion import Cancelado
+from config import Ajustes, Config
+
+_PUNTO = re.compile(r"\d+\.\s+(.*)")
+_TITULO = re.compile(r"\*\*(.+?)\*\*")
+
+# Mega-prompts ya generados por (objetivo normalizado, modelo, temperatura);
+# LRU de Config.MEGA_PROMPT_MEMO entradas: la API y la cola viven mucho
+_mega_prompts: OrderedDict[tuple[str, str, float], str] = OrderedDict()
+_mega_lock = threading.Lock()
+
+
+def normalizar_objetivo(objetivo: str) -> str:
+    return " ".join(objetivo.split()).casefold()
+
+
+def _clave_mega(objetivo: str, client) -> tuple[str, str, float]:
+    return (normalizar_objetivo(objetivo), client.modelo, client.ajustes.temperatura)
+
+
+def mega_prompt_memorizado(objetivo: str, client) -> str | None:
+    clave = _clave_mega(objetivo, client)
+    with _mega_lock:
+        if clave in _mega_prompts:
+            _mega_prompts.move_to_end(clave)
+        return _mega_prompts.get(clave)
+
+
+def mega_prompt_estatico(objetivo: str) -> str:
+    """Base fija para arrancar sin esperar al mega-prompt optimizado."""
+    return (
+        "Eres el mayor experto del mundo en este tema. Investiga de forma "
+        f"EXTREMADAMENTE detallada, objetiva y actualizada el siguiente objetivo: {objetivo}\n\n"
+        "**Instrucciones globales OBLIGATORIAS:**\n"
+        "- **Profundidad máxima con datos reales y actuales (2024-2026)**\n"
+        "- **Uso obligatorio de formato Markdown puro**\n"
+        "- **Citar fuentes siempre que sea posible**\n"
+        "- **Ser brutalmente honesto, evitar optimismo infundado y destacar riesgos reales**\n"
+        "- **Enfocarse en información accionable y concreta**"
+    )
+
+
 def generar_mega_prompt(client, objetivo: str) -> str:
-    """Genera el mega-prompt optimizado y fuerza cero tablas."""
-    prompt_meta = (
+    """
+    Genera el mega-prompt optimizado y fuerza cero tablas, con los ajustes
+    del run que lleva `client` (memorizado por objetivo, modelo y temperatura).
+    """
+    if memo := mega_prompt_memorizado(objetivo, client):
+        return memo
+    resultado = client.generar(prompt_meta(objetivo), con_search=False)
+    return _memorizar(objetivo, client, resultado["texto"].strip())
+
+
+async def agenerar_mega_prompt(client, objetivo: str) -> str:
+    """Versión asíncrona de `generar_mega_prompt` (misma memoria)."""
+    if memo := mega_prompt_memorizado(objetivo, client):
+        return memo
+    resultado = await client.agenerar(prompt_meta(objetivo), con_search=False)
+    return _memorizar(objetivo, client, resultado["texto"].strip())
+
+
+def _memorizar(objetivo: str, client, mega: str) -> str:
+    clave = _clave_mega(objetivo, client)
+    with _mega_lock:
+        _mega_prompts[clave] = mega
+        _mega_prompts.move_to_end(clave)
+        while len(_mega_prompts) > Config.MEGA_PROMPT_MEMO:
+            _mega_prompts.popitem(last=False)
+    return mega
+
+
+def prompt_meta(objetivo: str) -> str:
+    """Prompt que pide al modelo el mega-prompt del objetivo."""
+    return (
         f'Eres el mejor ingeniero de prompts del mundo especializado en investigación profunda con Gemini.\n\n'
         f'OBJETIVO DEL USUARIO: "{objetivo}"\n\n'
         'Genera UN SOLO MEGA-PROMPT completo, autónomo y ultra-optimizado que servirá de base común para investigar este objetivo en 7 dimensiones exhaustivas.\n'
@@ -17,126 +92,209 @@ def generar_mega_prompt(client, objetivo: str) -> str:
         '- Enfocarse en información accionable y concreta\n\n'
         'Devuelve **SOLO** el texto puro del mega-prompt. Sin explicaciones, sin markdown extra, sin introducciones.'
     )
-    
-    resultado = client.generar(prompt_meta, con_search=False)
-    return resultado["texto"].strip()
 
-def crear_dimensiones(mega_base: str) -> list[dict]:
-    """Crea las 7 dimensiones usando el mega-prompt generado como base y reforzando cero tablas."""
-    base = mega_base + (
+
+class MegaPromptDiferido:
+    """
+    Genera el mega-prompt en segundo plano. Mientras no esté listo, las
+    dimensiones que arrancan usan la base estática; las que arrancan
+    después ya usan el mega-prompt optimizado.
+    """
+
+    def __init__(self, client, objetivo: str):
+        self.estatico = mega_prompt_estatico(objetivo)
+        self.futuro: Future = Future()
+        self.ajustes = client.ajustes
+        if memo := mega_prompt_memorizado(objetivo, client):
+            self.futuro.set_result(memo)
+        else:
+            threading.Thread(
+                target=self._generar, args=(client, objetivo), daemon=True
+            ).start()
+
+    def _generar(self, client, objetivo: str):
+        try:
+            self.futuro.set_result(generar_mega_prompt(client, objetivo))
+        except (Exception, Cancelado) as e:
+            print(f"   ⚠️ Mega-prompt en segundo plano falló: {e}")
+            self.futuro.set_exception(e)
+
+    @property
+    def listo(self) -> bool:
+        return self.futuro.done() and not self.futuro.exception()
+
+    def base_actual(self) -> str:
+        return self.futuro.result() if self.listo else self.estatico
+
+    def resolver_prompt(self, dim: dict) -> str | list[str]:
+        """
+        Prompt de la dimensión con la mejor base disponible ahora mismo (en
+        modo granular, la lista de prompts de sus subpreguntas).
+        """
+        if self.listo:
+            dim = crear_dimensiones(self.futuro.result(), self.ajustes)[dim["num"] - 1]
+        return dim["subprompts"] if "subprompts" in dim else dim["prompt"]
+
+
+def base_compartida(mega_base: str) -> str:
+    """Parte común a las 7 dimensiones: mega-prompt + refuerzo de cero tablas."""
+    return mega_base + (
         "\n\nSé EXTREMADAMENTE detallado. Cita datos reales y actuales. "
         "Usa formato Markdown puro con secciones claras. "
         "**PROHIBIDO ABSOLUTAMENTE usar tablas Markdown en ninguna sección. "
         "Solo encabezados con # ## ###, listas con - o números, **negritas**, "
         "*cursiva* y bloques de código si es necesario. Nada de |---| ni tablas.**\n\n"
     )
-    
-    return [
-        {
-            "num": 1,
-            "emoji": "📖",
-            "nombre": "LENGUAJE Y TERMINOLOGÍA",
-            "prompt": "Eres el mayor experto terminólogo del mundo.\n\n" + base + 
-                      "Investiga EXHAUSTIVAMENTE todo el lenguaje y vocabulario:\n\n"
-                      "1. **GLOSARIO COMPLETO** (mín. 30 términos): Término → definición técnica → definición simple → ejemplo\n"
-                      "2. **JERGA PROFESIONAL**: Palabras que usan los insiders\n"
-                      "3. **ACRÓNIMOS Y SIGLAS**: Todos los relevantes\n"
-                      "4. **EVOLUCIÓN TERMINOLÓGICA**: Cómo cambiaron en 5-10 años\n"
-                      "5. **DIFERENCIAS REGIONALES**: Términos que cambian según país\n"
-                      "6. **TÉRMINOS EN TENDENCIA 2024-2026**: Neologismos emergentes\n"
-                      "7. **KEYWORDS DE BÚSQUEDA**: Palabras exactas para Google\n"
-                      "8. **FRAMEWORKS Y METODOLOGÍAS**: Marcos de trabajo reconocidos\n"
-                      "9. **PERSONAS CLAVE**: Referentes, empresas líderes\n"
-                      "10. **ERRORES COMUNES**: Términos que se confunden frecuentemente"
-        },
-        {
-            "num": 2,
-            "emoji": "💰",
-            "nombre": "ECONOMÍA Y MERCADO",
-            "prompt": "Eres el mayor analista económico y de mercados del mundo.\n\n" + base + 
-                      "Investiga EXHAUSTIVAMENTE la dimensión económica:\n\n"
-                      "1. **TAMAÑO DEL MERCADO**: Valor global y por regiones, proyecciones, CAGR\n"
-                      "2. **MODELOS DE NEGOCIO**: Monetización, pricing\n"
-                      "3. **INVERSIÓN**: VC, PE, gobierno, rondas recientes, ROI típico\n"
-                      "4. **COSTOS**: Estructura, costos de entrada, economías de escala\n"
-                      "5. **INGRESOS**: Fuentes, márgenes, revenue streams\n"
-                      "6. **IMPACTO MACRO**: PIB, empleos, cadenas de suministro\n"
-                      "7. **GEOGRAFÍA ECONÓMICA**: Mercados rentables, emergentes, barreras"
-        },
-        {
-            "num": 3,
-            "emoji": "📊",
-            "nombre": "DATOS, NÚMEROS Y ESTADÍSTICAS",
-            "prompt": "Eres el mayor analista de datos y estadístico del mundo.\n\n" + base + 
-                      "Investiga EXHAUSTIVAMENTE todos los datos:\n\n"
-                      "1. **KPIs FUNDAMENTALES**: Métricas, benchmarks (bueno/promedio/excelente)\n"
-                      "2. **ESTADÍSTICAS DE ADOPCIÓN**: Tasas, curva de crecimiento\n"
-                      "3. **DATOS DE RENDIMIENTO**: Éxito/fracaso, eficiencia\n"
-                      "4. **DATOS DEMOGRÁFICOS**: Quién usa/compra, segmentación\n"
-                      "5. **RANKINGS**: Top 10 por cuota, satisfacción, calidad\n"
-                      "6. **DATOS DE TENDENCIA**: Google Trends, volúmenes de búsqueda\n"
-                      "7. **ESTUDIOS**: Gartner, McKinsey, papers académicos"
-        },
-        {
-            "num": 4,
-            "emoji": "🏭",
-            "nombre": "SECTOR, INDUSTRIA Y COMPETENCIA",
-            "prompt": "Eres el mayor analista sectorial del mundo.\n\n" + base + 
-                      "Investiga EXHAUSTIVAMENTE el panorama competitivo:\n\n"
-                      "1. **MAPA DEL ECOSISTEMA**: Actores, cadena de valor\n"
-                      "2. **TOP 10 COMPETIDORES**: Nombre, país, propuesta, fortalezas, debilidades\n"
-                      "3. **ANÁLISIS PORTER**: 5 fuerzas, barreras de entrada\n"
-                      "4. **SEGMENTACIÓN**: Subsectores, nichos, verticales\n"
-                      "5. **REGULACIÓN**: Leyes clave, certificaciones, compliance\n"
-                      "6. **CADENA DE SUMINISTRO**: Proveedores, dependencias\n"
-                      "7. **MADUREZ**: Fase del ciclo de vida, predicción\n"
-                      "8. **MOVIMIENTOS RECIENTES**: M&A, alianzas 2023-2026"
-        },
-        {
-            "num": 5,
-            "emoji": "🎯",
-            "nombre": "ESTRATEGIAS Y CONSEJOS DE EXPERTOS",
-            "prompt": "Eres el mayor estratega y consultor del mundo.\n\n" + base + 
-                      "Investiga EXHAUSTIVAMENTE las mejores estrategias:\n\n"
-                      "1. **ROADMAP PARA SER #1**: Plan paso a paso, timeline\n"
-                      "2. **MEJORES PRÁCTICAS**: Top 20, casos de éxito\n"
-                      "3. **DIFERENCIACIÓN**: Propuestas únicas, blue ocean\n"
-                      "4. **GROWTH**: Canales de adquisición, retención\n"
-                      "5. **TECNOLOGÍA**: Stack recomendado, herramientas\n"
-                      "6. **EQUIPO**: Perfiles clave, dónde encontrar talento\n"
-                      "7. **CONSEJOS INSIDER**: Secretos, errores al empezar\n"
-                      "8. **FRAMEWORK DE DECISIÓN**: Priorización, cuándo pivotar"
-        },
-        {
-            "num": 6,
-            "emoji": "⚠️",
-            "nombre": "RIESGOS, AMENAZAS Y ERRORES",
-            "prompt": "Eres el mayor analista de riesgos del mundo.\n\n" + base + 
-                      "Investiga EXHAUSTIVAMENTE todos los riesgos:\n\n"
-                      "1. **MAPA DE RIESGOS**: Estratégicos, operativos, financieros, tecnológicos\n"
-                      "2. **FRACASOS DOCUMENTADOS**: 10 mayores, lecciones\n"
-                      "3. **ERRORES DE PRINCIPIANTE**: 20 errores, sesgos, trampas\n"
-                      "4. **AMENAZAS EXTERNAS**: Disrupciones, cambios regulatorios\n"
-                      "5. **RIESGOS LEGALES**: Demandas, IP, compliance\n"
-                      "6. **SEÑALES DE ALERTA**: Red flags, early warnings\n"
-                      "7. **PLAN DE MITIGACIÓN**: Plan B-C-D, seguros\n"
-                      "8. **BLACK SWANS**: Eventos devastadores, preparación"
-        },
-        {
-            "num": 7,
-            "emoji": "🚀",
-            "nombre": "OPORTUNIDADES, BENEFICIOS Y FUTURO",
-            "prompt": "Eres el mayor futurista del mundo.\n\n" + base + 
-                      "Investiga EXHAUSTIVAMENTE oportunidades y futuro:\n\n"
-                      "1. **OPORTUNIDADES INMEDIATAS** (0-6 meses): Low-hanging fruit\n"
-                      "2. **MEDIO PLAZO** (6-24 meses): Tendencias madurando\n"
-                      "3. **LARGO PLAZO** (2-10 años): Megatendencias\n"
-                      "4. **BENEFICIOS COMPROBADOS**: ROI documentado\n"
-                      "5. **NICHOS INEXPLORADOS**: Submarkets, combinaciones\n"
-                      "6. **TECNOLOGÍAS HABILITADORAS**: IA, blockchain, IoT\n"
-                      "7. **PREDICCIONES**: Gartner, McKinsey, escenarios\n"
-                      "8. **FIRST-MOVER ADVANTAGES**: Ventanas que se cierran\n"
-                      "9. **SINERGIAS**: Partners, co-creación\n"
-                      "10. **IMPACTO TRANSFORMADOR**: Mejor escenario posible"
-        },
-    ]
+
+
+def subpreguntas(checklist: str) -> list[tuple[str, str]]:
+    """(título, punto completo) de cada punto numerado del checklist."""
+    puntos = []
+    for linea in checklist.split("\n"):
+        if m := _PUNTO.match(linea.strip()):
+            titulo = _TITULO.search(m.group(1))
+            puntos.append((titulo.group(1) if titulo else m.group(1), m.group(1)))
+    return puntos
+
+
+def crear_dimensiones(mega_base: str, ajustes: Ajustes | None = None,
+                      contexto_compartido: bool = False) -> list[dict]:
+    """
+    Crea las 7 dimensiones usando el mega-prompt generado como base y reforzando cero tablas.
+    `ajustes` son los del run (por defecto, los de Config).
+
+    Con `contexto_compartido` el prompt de cada dimensión lleva solo su rol
+    y su checklist: la base común va delante como contexto cacheado
+    (GeminiClient.con_contexto).
+
+    Con `ajustes.granular` cada dimensión lleva además "subtemas" y "subprompts":
+    un prompt por punto numerado del checklist, para investigarlos en
+    llamadas separadas (scheduler.investigar_granular).
+    """
+    granular = (ajustes or Ajustes.desde_config()).granular
+    base = "" if contexto_compartido else base_compartida(mega_base)
+    dimensiones = []
+    for dim in _DIMENSIONES:
+        dim = {**dim, "prompt": dim["rol"] + base + dim["checklist"]}
+        if granular:
+            puntos = subpreguntas(dim["checklist"])
+            dim["subtemas"] = [titulo for titulo, _ in puntos]
+            dim["subprompts"] = [
+                f"{dim['rol']}{base}Dentro de la dimensión **{dim['nombre']}**, "
+                f"investiga EXHAUSTIVAMENTE SOLO este punto (el resto se "
+                f"investiga por separado):\n\n{punto}"
+                for _, punto in puntos
+            ]
+        dimensiones.append(dim)
+    return dimensiones
+
+
+_DIMENSIONES = [
+    {
+        "num": 1,
+        "emoji": "📖",
+        "nombre": "LENGUAJE Y TERMINOLOGÍA",
+        "rol": "Eres el mayor experto terminólogo del mundo.\n\n",
+        "checklist": "Investiga EXHAUSTIVAMENTE todo el lenguaje y vocabulario:\n\n"
+                     "1. **GLOSARIO COMPLETO** (mín. 30 términos): Término → definición técnica → definición simple → ejemplo\n"
+                     "2. **JERGA PROFESIONAL**: Palabras que usan los insiders\n"
+                     "3. **ACRÓNIMOS Y SIGLAS**: Todos los relevantes\n"
+                     "4. **EVOLUCIÓN TERMINOLÓGICA**: Cómo cambiaron en 5-10 años\n"
+                     "5. **DIFERENCIAS REGIONALES**: Términos que cambian según país\n"
+                     "6. **TÉRMINOS EN TENDENCIA 2024-2026**: Neologismos emergentes\n"
+                     "7. **KEYWORDS DE BÚSQUEDA**: Palabras exactas para Google\n"
+                     "8. **FRAMEWORKS Y METODOLOGÍAS**: Marcos de trabajo reconocidos\n"
+                     "9. **PERSONAS CLAVE**: Referentes, empresas líderes\n"
+                     "10. **ERRORES COMUNES**: Términos que se confunden frecuentemente"
+    },
+    {
+        "num": 2,
+        "emoji": "💰",
+        "nombre": "ECONOMÍA Y MERCADO",
+        "rol": "Eres el mayor analista económico y de mercados del mundo.\n\n",
+        "checklist": "Investiga EXHAUSTIVAMENTE la dimensión económica:\n\n"
+                     "1. **TAMAÑO DEL MERCADO**: Valor global y por regiones, proyecciones, CAGR\n"
+                     "2. **MODELOS DE NEGOCIO**: Monetización, pricing\n"
+                     "3. **INVERSIÓN**: VC, PE, gobierno, rondas recientes, ROI típico\n"
+                     "4. **COSTOS**: Estructura, costos de entrada, economías de escala\n"
+                     "5. **INGRESOS**: Fuentes, márgenes, revenue streams\n"
+                     "6. **IMPACTO MACRO**: PIB, empleos, cadenas de suministro\n"
+                     "7. **GEOGRAFÍA ECONÓMICA**: Mercados rentables, emergentes, barreras"
+    },
+    {
+        "num": 3,
+        "emoji": "📊",
+        "nombre": "DATOS, NÚMEROS Y ESTADÍSTICAS",
+        "rol": "Eres el mayor analista de datos y estadístico del mundo.\n\n",
+        "checklist": "Investiga EXHAUSTIVAMENTE todos los datos:\n\n"
+                     "1. **KPIs FUNDAMENTALES**: Métricas, benchmarks (bueno/promedio/excelente)\n"
+                     "2. **ESTADÍSTICAS DE ADOPCIÓN**: Tasas, curva de crecimiento\n"
+                     "3. **DATOS DE RENDIMIENTO**: Éxito/fracaso, eficiencia\n"
+                     "4. **DATOS DEMOGRÁFICOS**: Quién usa/compra, segmentación\n"
+                     "5. **RANKINGS**: Top 10 por cuota, satisfacción, calidad\n"
+                     "6. **DATOS DE TENDENCIA**: Google Trends, volúmenes de búsqueda\n"
+                     "7. **ESTUDIOS**: Gartner, McKinsey, papers académicos"
+    },
+    {
+        "num": 4,
+        "emoji": "🏭",
+        "nombre": "SECTOR, INDUSTRIA Y COMPETENCIA",
+        "rol": "Eres el mayor analista sectorial del mundo.\n\n",
+        "checklist": "Investiga EXHAUSTIVAMENTE el panorama competitivo:\n\n"
+                     "1. **MAPA DEL ECOSISTEMA**: Actores, cadena de valor\n"
+                     "2. **TOP 10 COMPETIDORES**: Nombre, país, propuesta, fortalezas, debilidades\n"
+                     "3. **ANÁLISIS PORTER**: 5 fuerzas, barreras de entrada\n"
+                     "4. **SEGMENTACIÓN**: Subsectores, nichos, verticales\n"
+                     "5. **REGULACIÓN**: Leyes clave, certificaciones, compliance\n"
+                     "6. **CADENA DE SUMINISTRO**: Proveedores, dependencias\n"
+                     "7. **MADUREZ**: Fase del ciclo de vida, predicción\n"
+                     "8. **MOVIMIENTOS RECIENTES**: M&A, alianzas 2023-2026"
+    },
+    {
+        "num": 5,
+        "emoji": "🎯",
+        "nombre": "ESTRATEGIAS Y CONSEJOS DE EXPERTOS",
+        "rol": "Eres el mayor estratega y consultor del mundo.\n\n",
+        "checklist": "Investiga EXHAUSTIVAMENTE las mejores estrategias:\n\n"
+                     "1. **ROADMAP PARA SER #1**: Plan paso a paso, timeline\n"
+                     "2. **MEJORES PRÁCTICAS**: Top 20, casos de éxito\n"
+                     "3. **DIFERENCIACIÓN**: Propuestas únicas, blue ocean\n"
+                     "4. **GROWTH**: Canales de adquisición, retención\n"
+                     "5. **TECNOLOGÍA**: Stack recomendado, herramientas\n"
+                     "6. **EQUIPO**: Perfiles clave, dónde encontrar talento\n"
+                     "7. **CONSEJOS INSIDER**: Secretos, errores al empezar\n"
+                     "8. **FRAMEWORK DE DECISIÓN**: Priorización, cuándo pivotar"
+    },
+    {
+        "num": 6,
+        "emoji": "⚠️",
+        "nombre": "RIESGOS, AMENAZAS Y ERRORES",
+        "rol": "Eres el mayor analista de riesgos del mundo.\n\n",
+        "checklist": "Investiga EXHAUSTIVAMENTE todos los riesgos:\n\n"
+                     "1. **MAPA DE RIESGOS**: Estratégicos, operativos, financieros, tecnológicos\n"
+                     "2. **FRACASOS DOCUMENTADOS**: 10 mayores, lecciones\n"
+                     "3. **ERRORES DE PRINCIPIANTE**: 20 errores, sesgos, trampas\n"
+                     "4. **AMENAZAS EXTERNAS**: Disrupciones, cambios regulatorios\n"
+                     "5. **RIESGOS LEGALES**: Demandas, IP, compliance\n"
+                     "6. **SEÑALES DE ALERTA**: Red flags, early warnings\n"
+                     "7. **PLAN DE MITIGACIÓN**: Plan B-C-D, seguros\n"
+                     "8. **BLACK SWANS**: Eventos devastadores, preparación"
+    },
+    {
+        "num": 7,
+        "emoji": "🚀",
+        "nombre": "OPORTUNIDADES, BENEFICIOS Y FUTURO",
+        "rol": "Eres el mayor futurista del mundo.\n\n",
+        "checklist": "Investiga EXHAUSTIVAMENTE oportunidades y futuro:\n\n"
+                     "1. **OPORTUNIDADES INMEDIATAS** (0-6 meses): Low-hanging fruit\n"
+                     "2. **MEDIO PLAZO** (6-24 meses): Tendencias madurando\n"
+                     "3. **LARGO PLAZO** (2-10 años): Megatendencias\n"
+                     "4. **BENEFICIOS COMPROBADOS**: ROI documentado\n"
+                     "5. **NICHOS INEXPLORADOS**: Submarkets, combinaciones\n"
+                     "6. **TECNOLOGÍAS HABILITADORAS**: IA, blockchain, IoT\n"
+                     "7. **PREDICCIONES**: Gartner, McKinsey, escenarios\n"
+                     "8. **FIRST-MOVER ADVANTAGES**: Ventanas que se cierran\n"
+                     "9. **SINERGIAS**: Partners, co-creación\n"
+                     "10. **IMPACTO TRANSFORMADOR**: Mejor escenario posible"
+    },
+]
@@ -0,0 +1,106 @@
+"""
+Enrutado de modelos por etapa.
+
+Cada etapa (mega-prompt, dimensiones, condensación, resumen) tiene en
+Config.MODEL_ROUTES su lista de modelos por orden de preferencia (los
+baratos primero); el modelo principal del cliente siempre queda como
+último recurso. Se elige el primero que esté sano según el historial
+reciente del proceso: tasa de error del modelo y latencia mediana en esa
+etapa frente a su presupuesto. Las muestras caducan, así que un modelo
+descartado vuelve a probarse pasado un rato.
+
+El coste de cada llamada se estima con Config.MODEL_COSTS a partir de
+los tokens que devuelve la API y queda en su telemetría.
+"""
+
+import threading
+import time
+from collections import deque
+from config import Config
+
+ETAPAS = ("mega_prompt", "dimension", "condensar", "resumen")
+
+
+class HistorialModelos:
+    """Resultados recientes por modelo (errores) y por (etapa, modelo) (latencias)."""
+
+    def __init__(self):
+        self._resultados: dict[str, deque] = {}  # modelo → (instante, ok)
+        self._latencias: dict[tuple[str, str], deque] = {}  # → (instante, segundos)
+        self._lock = threading.Lock()
+
+    def _cola(self, tabla: dict, clave) -> deque:
+        return tabla.setdefault(clave, deque(maxlen=Config.ROUTING_WINDOW))
+
+    def registrar(self, modelo: str, etapa: str | None, segundos: float):
+        ahora = time.monotonic()
+        with self._lock:
+            self._cola(self._resultados, modelo).append((ahora, True))
+            if etapa:
+                self._cola(self._latencias, (etapa, modelo)).append((ahora, segundos))
+
+    def registrar_fallo(self, modelo: str):
+        with self._lock:
+            self._cola(self._resultados, modelo).append((time.monotonic(), False))
+
+    @staticmethod
+    def _vigentes(muestras) -> list:
+        limite = time.monotonic() - Config.ROUTING_MAX_AGE
+        return [valor for instante, valor in muestras if instante >= limite]
+
+    def tasa_error(self, modelo: str) -> float | None:
+        with self._lock:
+            resultados = self._vigentes(self._resultados.get(modelo, ()))
+        if len(resultados) < Config.ROUTING_MIN_SAMPLES:
+            return None
+        return resultados.count(False) / len(resultados)
+
+    def p50(self, etapa: str, modelo: str) -> float | None:
+        with self._lock:
+            latencias = sorted(self._vigentes(self._latencias.get((etapa, modelo), ())))
+        if len(latencias) < Config.ROUTING_MIN_SAMPLES:
+            return None
+        return latencias[len(latencias) // 2]
+
+
+historial_modelos = HistorialModelos()
+
+
+def candidatos(etapa: str, principal: str, num: int | None = None) -> list[str]:
+    """Modelos de la etapa (o de esa dimensión concreta) seguidos del principal."""
+    rutas = Config.MODEL_ROUTES
+    preferidos = rutas.get(f"{etapa}:{num}") if num is not None else None
+    if preferidos is None:
+        preferidos = rutas.get(etapa, [])
+    return list(dict.fromkeys([*preferidos, principal]))
+
+
+def elegir_modelo(etapa: str, principal: str, num: int | None = None) -> str:
+    """Primer candidato sano; si ninguno lo está, el de menos errores y latencia."""
+    opciones = candidatos(etapa, principal, num)
+    presupuesto = Config.ROUTING_LATENCY_BUDGET.get(etapa)
+    puntuaciones = []
+    for orden, modelo in enumerate(opciones):
+        errores = historial_modelos.tasa_error(modelo)
+        latencia = historial_modelos.p50(etapa, modelo)
+        sano = (errores is None or errores <= Config.ROUTING_MAX_ERROR_RATE) and (
+            latencia is None or presupuesto is None or latencia <= presupuesto
+        )
+        if sano:
+            return modelo
+        puntuaciones.append((errores or 0.0, latencia or 0.0, orden, modelo))
+    return min(puntuaciones)[3]
+
+
+def coste_llamada(modelo: str, resultado: dict) -> float | None:
+    """Coste estimado (USD) de una llamada según Config.MODEL_COSTS."""
+    precios = Config.MODEL_COSTS.get(modelo)
+    if precios is None or resultado.get("cache"):
+        return None
+    entrada, salida = precios
+    cacheados = resultado.get("tokens_cache") or 0
+    nuevos = (resultado.get("tokens_entrada") or 0) - cacheados
+    return (
+        nuevos * entrada + cacheados * entrada * Config.CACHED_TOKEN_DISCOUNT
+        + (resultado.get("tokens_salida") or 0) * salida
+    ) / 1e6
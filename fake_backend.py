@@ -0,0 +1,282 @@
+"""
+Backend simulado de Gemini para pruebas y benchmarks sin gastar cuota.
+
+Imita lo que GeminiClient usa de `genai.GenerativeModel`: generate_content
+(normal y stream=True), generate_content_async, candidates, text,
+grounding_metadata, usage_metadata y contenido cacheado (desde_contexto).
+Latencia, coste de prefill, errores, ráfagas de 429, fuentes y tamaño de
+salida son configurables.
+"""
+
+import asyncio
+import math
+import random
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+
+_PALABRAS = (
+    "mercado", "análisis", "estrategia", "riesgo", "dato", "tendencia",
+    "cliente", "coste", "margen", "regulación", "tecnología", "competencia",
+    "crecimiento", "oportunidad", "sector", "inversión", "proceso", "calidad",
+)
+
+
+class ErrorSimulado(Exception):
+    """Error con `code` como las excepciones de google.api_core."""
+
+    def __init__(self, code: int, mensaje: str):
+        super().__init__(f"{code} {mensaje}")
+        self.code = code
+
+
+class PerfilSimulacion:
+    """
+    Parámetros del backend simulado.
+
+    latencia: ("lognormal", mediana_s, sigma) · ("uniforme", min_s, max_s)
+              · ("fija", s). Con search se multiplica por factor_search.
+    prefill_por_1k: segundos extra por cada 1000 tokens de entrada no
+              cacheados (los cacheados cuestan factor_cache de eso).
+    decodificacion_por_1k: segundos extra por cada 1000 tokens generados
+              (tras recortar la salida a max_output_tokens).
+    escala_tiempo: multiplica todas las esperas (0.01 = 100x más rápido).
+    """
+
+    def __init__(self, latencia=("lognormal", 20.0, 0.5), factor_search: float = 1.5,
+                 tasa_error: float = 0.0, prob_rafaga_429: float = 0.0,
+                 duracion_rafaga_429: int = 3, retry_429: float = 5.0,
+                 fuentes_por_respuesta: int = 6, caracteres_salida=(6000, 2000),
+                 ttft_fraccion: float = 0.15, fragmentos: int = 20,
+                 prefill_por_1k: float = 0.0, factor_cache: float = 0.1,
+                 decodificacion_por_1k: float = 0.0,
+                 escala_tiempo: float = 1.0, semilla: int | None = None):
+        self.latencia = latencia
+        self.factor_search = factor_search
+        self.tasa_error = tasa_error
+        self.prob_rafaga_429 = prob_rafaga_429
+        self.duracion_rafaga_429 = duracion_rafaga_429
+        self.retry_429 = retry_429
+        self.fuentes_por_respuesta = fuentes_por_respuesta
+        self.caracteres_salida = caracteres_salida  # (media, desviación)
+        self.ttft_fraccion = ttft_fraccion
+        self.fragmentos = fragmentos
+        self.prefill_por_1k = prefill_por_1k
+        self.factor_cache = factor_cache
+        self.decodificacion_por_1k = decodificacion_por_1k
+        self.escala_tiempo = escala_tiempo
+        self.semilla = semilla
+
+
+class ModeloSimulado:
+    """Sustituto de `genai.GenerativeModel` con el mismo interfaz mínimo."""
+
+    def __init__(self, model_name: str = "simulado", perfil: PerfilSimulacion | None = None):
+        self.model_name = model_name
+        self.perfil = perfil or PerfilSimulacion()
+        self.llamadas = 0
+        self.errores = 0
+        self.tokens_entrada = 0
+        self.tokens_cache = 0
+        self._rafaga_restante = 0
+        self._rng = random.Random(self.perfil.semilla)
+        self._lock = threading.Lock()
+
+    # ── Decisiones aleatorias (bajo lock para ser reproducibles) ──
+    def _planificar(self, con_search: bool, tokens: int = 0, cacheados: int = 0,
+                    max_tokens: int | None = None) -> tuple[float, Exception | None, int]:
+        p = self.perfil
+        with self._lock:
+            self.llamadas += 1
+            self.tokens_entrada += tokens
+            self.tokens_cache += cacheados
+            tipo, *args = p.latencia
+            if tipo == "lognormal":
+                latencia = self._rng.lognormvariate(math.log(args[0]), args[1])
+            elif tipo == "uniforme":
+                latencia = self._rng.uniform(*args)
+            else:
+                latencia = args[0]
+            if con_search:
+                latencia *= p.factor_search
+            latencia += p.prefill_por_1k * (
+                tokens - cacheados + cacheados * p.factor_cache
+            ) / 1000
+
+            error = None
+            if self._rafaga_restante == 0 and self._rng.random() < p.prob_rafaga_429:
+                self._rafaga_restante = p.duracion_rafaga_429
+            if self._rafaga_restante:
+                self._rafaga_restante -= 1
+                error = ErrorSimulado(
+                    429, "Resource has been exhausted (e.g. check quota). "
+                         f"Please retry in {p.retry_429 * p.escala_tiempo:.3f}s."
+                )
+                latencia *= 0.05
+            elif self._rng.random() < p.tasa_error:
+                error = ErrorSimulado(503, "The service is currently unavailable.")
+                latencia *= 0.3
+            if error:
+                self.errores += 1
+
+            media, desviacion = p.caracteres_salida
+            caracteres = max(200, int(self._rng.gauss(media, desviacion)))
+            if max_tokens:
+                caracteres = min(caracteres, max_tokens * 4)
+            if not error:
+                latencia += p.decodificacion_por_1k * caracteres / 4 / 1000
+        return latencia * p.escala_tiempo, error, caracteres
+
+    def _texto(self, prompt: str, caracteres: int, max_tokens: int | None) -> str:
+        if max_tokens:
+            caracteres = min(caracteres, max_tokens * 4)
+        rng = random.Random(zlib.crc32(prompt.encode()) ^ caracteres)
+        lineas = ["## Resultado simulado", ""]
+        total = 0
+        while total < caracteres:
+            frase = " ".join(rng.choice(_PALABRAS) for _ in range(12)).capitalize()
+            linea = f"- **{frase.split()[0]}**: {frase}."
+            lineas.append(linea)
+            total += len(linea) + 1
+        return "\n".join(lineas)
+
+    def _respuesta(self, texto: str, prompt: str, con_search: bool,
+                   fuentes: int | None = None, cacheados: int = 0):
+        n = self.perfil.fuentes_por_respuesta if fuentes is None else fuentes
+        chunks = [
+            SimpleNamespace(web=SimpleNamespace(
+                title=f"Fuente simulada {i + 1}",
+                uri=f"https://ejemplo.org/{zlib.crc32(prompt.encode()) % 10_000}/{i}",
+            ))
+            for i in range(n if con_search else 0)
+        ]
+        metadata = SimpleNamespace(grounding_chunks=chunks) if chunks else None
+        return SimpleNamespace(
+            text=texto,
+            candidates=[SimpleNamespace(grounding_metadata=metadata, finish_reason=1)],
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=len(prompt) // 4 + 1,
+                candidates_token_count=len(texto) // 4 + 1,
+                cached_content_token_count=cacheados,
+            ),
+            prompt_feedback=None,
+        )
+
+    @staticmethod
+    def _max_tokens(generation_config) -> int | None:
+        return getattr(generation_config, "max_output_tokens", None)
+
+    # ── Interfaz de GenerativeModel ──
+    def generate_content(self, prompt, generation_config=None, tools=None,
+                         stream: bool = False, **kwargs):
+        return self._generar(prompt, generation_config, tools, stream)
+
+    async def generate_content_async(self, prompt, generation_config=None,
+                                     tools=None, **kwargs):
+        return await self._agenerar(prompt, generation_config, tools)
+
+    def desde_contexto(self, texto: str, tools=None) -> "_ModeloConContexto":
+        """Como GenerativeModel.from_cached_content: `texto` y `tools` ya van en la caché."""
+        return _ModeloConContexto(self, texto, tools)
+
+    def _generar(self, prompt, generation_config, tools, stream=False, prefijo=""):
+        con_search = bool(tools)
+        completo = prefijo + prompt
+        cacheados = len(prefijo) // 4
+        latencia, error, caracteres = self._planificar(
+            con_search, len(completo) // 4 + 1, cacheados,
+            self._max_tokens(generation_config),
+        )
+        texto = self._texto(completo, caracteres, self._max_tokens(generation_config))
+        if stream:
+            return _RespuestaStream(
+                self, completo, texto, con_search, latencia, error, cacheados
+            )
+        time.sleep(latencia)
+        if error:
+            raise error
+        return self._respuesta(texto, completo, con_search, cacheados=cacheados)
+
+    async def _agenerar(self, prompt, generation_config, tools, prefijo=""):
+        con_search = bool(tools)
+        completo = prefijo + prompt
+        cacheados = len(prefijo) // 4
+        latencia, error, caracteres = self._planificar(
+            con_search, len(completo) // 4 + 1, cacheados,
+            self._max_tokens(generation_config),
+        )
+        await asyncio.sleep(latencia)
+        if error:
+            raise error
+        texto = self._texto(completo, caracteres, self._max_tokens(generation_config))
+        return self._respuesta(texto, completo, con_search, cacheados=cacheados)
+
+
+class _ModeloConContexto:
+    """Modelo ligado a un contenido cacheado (prefijo + tools) del simulado."""
+
+    def __init__(self, base: ModeloSimulado, texto: str, tools):
+        self.base = base
+        self.texto = texto
+        self.tools = tools
+        self.model_name = base.model_name
+
+    def _comprobar(self, tools):
+        if tools:
+            # La API real rechaza tools junto a cached_content
+            raise ErrorSimulado(400, "CachedContent can not be used with tools")
+
+    def generate_content(self, prompt, generation_config=None, tools=None,
+                         stream: bool = False, **kwargs):
+        self._comprobar(tools)
+        return self.base._generar(
+            prompt, generation_config, self.tools, stream, prefijo=self.texto
+        )
+
+    async def generate_content_async(self, prompt, generation_config=None,
+                                     tools=None, **kwargs):
+        self._comprobar(tools)
+        return await self.base._agenerar(
+            prompt, generation_config, self.tools, prefijo=self.texto
+        )
+
+
+class _RespuestaStream:
+    """
+    Como la respuesta en streaming del SDK: se itera por fragmentos y,
+    al terminar, expone candidates/usage_metadata del total.
+    """
+
+    def __init__(self, modelo: ModeloSimulado, prompt: str, texto: str,
+                 con_search: bool, latencia: float, error: Exception | None,
+                 cacheados: int = 0):
+        self._modelo = modelo
+        self._cacheados = cacheados
+        self._prompt = prompt
+        self._texto = texto
+        self._con_search = con_search
+        self._latencia = latencia
+        self._error = error
+        self.candidates = []
+        self.usage_metadata = None
+        self.prompt_feedback = None
+
+    def __iter__(self):
+        p = self._modelo.perfil
+        time.sleep(self._latencia * p.ttft_fraccion)
+        if self._error:
+            raise self._error
+        n = max(1, p.fragmentos)
+        paso = max(1, math.ceil(len(self._texto) / n))
+        resto = self._latencia * (1 - p.ttft_fraccion) / n
+        for i in range(0, len(self._texto), paso):
+            yield self._modelo._respuesta(
+                self._texto[i:i + paso], self._prompt, False
+            )
+            time.sleep(resto)
+        final = self._modelo._respuesta(
+            self._texto, self._prompt, self._con_search, cacheados=self._cacheados
+        )
+        self.candidates = final.candidates
+        self.usage_metadata = final.usage_metadata
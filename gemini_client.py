@@ -1,88 +1,648 @@
 """Cliente de Gemini con reintentos y fallback."""
 
+import asyncio
+import copy
+import hashlib
+import threading
 import time
+from datetime import timedelta
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import google.generativeai as genai
-from config import Config
+from cancelacion import SIN_CANCELACION, Cancelado, TokenCancelacion
+from config import Ajustes, Config
+from enrutador import coste_llamada, elegir_modelo, historial_modelos
+from hedging import historial_latencias
+from telemetria import registrar_error, registrar_llamada
+from resiliencia import (
+    CUOTA, ESTRATEGIA, FATAL, ErrorEstrategia, ErrorFatal, clasificar_error,
+    obtener_breaker, retraso_sugerido,
+)
+from response_cache import obtener_cache
+from rate_limiter import estimar_tokens, obtener_limitador
+
+
+# Hilos para las peticiones con hedge (primaria + respaldo), compartidos
+_pool_hedge = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+
+
+# ── Pool de modelos por API key ──
+# `genai.configure` es global al proceso: con varias sesiones y keys a la
+# vez, una sesión podía acabar llamando con la key de otra. Cada key tiene
+# sus propios clientes de la API (y su conexión), creados una vez y
+# compartidos por todas las sesiones que la usan.
+class _Transporte:
+    """Clientes de la API ligados a una API key."""
+
+    def __init__(self, api_key: str):
+        from google.ai import generativelanguage as glm
+        opciones = {"api_key": api_key}
+        self.generativo = glm.GenerativeServiceClient(client_options=opciones)
+        self.generativo_async = glm.GenerativeServiceAsyncClient(client_options=opciones)
+        self.cache = glm.CacheServiceClient(client_options=opciones)
+
+    def enlazar(self, model):
+        """Hace que `model` use estos clientes en vez de los globales de genai."""
+        model._client = self.generativo
+        model._async_client = self.generativo_async
+        return model
+
+
+_transportes: dict[str, _Transporte] = {}
+_modelos: dict[tuple[str, str], "genai.GenerativeModel"] = {}
+_pool_lock = threading.Lock()
+
+
+def huella_api_key(api_key: str) -> str:
+    """Identificador de la key para registros y logs (nunca la key en claro)."""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+def obtener_transporte(api_key: str) -> _Transporte:
+    """Clientes de la API de esa key, compartidos por todo el proceso."""
+    huella = huella_api_key(api_key)
+    with _pool_lock:
+        transporte = _transportes.get(huella)
+        if transporte is None:
+            transporte = _transportes[huella] = _Transporte(api_key)
+    return transporte
+
+
+def obtener_modelo(api_key: str, modelo: str) -> "genai.GenerativeModel":
+    """GenerativeModel de (key, modelo) sobre el transporte de esa key."""
+    clave = (huella_api_key(api_key), modelo)
+    with _pool_lock:
+        model = _modelos.get(clave)
+    if model is None:
+        model = obtener_transporte(api_key).enlazar(genai.GenerativeModel(modelo))
+        with _pool_lock:
+            model = _modelos.setdefault(clave, model)
+    return model
 
 
 class GeminiClient:
     """Wrapper robusto para la API de Gemini."""
 
-    def __init__(self):
-        genai.configure(api_key=Config.API_KEY)
-        self.model = genai.GenerativeModel(Config.MODEL)
+    def __init__(self, ajustes: Ajustes | None = None, backend=None,
+                 cancelacion: TokenCancelacion | None = None):
+        """
+        `ajustes` son los del run (key, modelo, generación...), fijos
+        durante toda la vida del cliente; por defecto, los de Config en el
+        momento de crearlo. `ajustes.modelo` es el modelo principal;
+        `para_etapa` da vistas enrutadas a otros modelos.
+        `backend` permite inyectar cualquier objeto con el interfaz de
+        `genai.GenerativeModel` (p. ej. fake_backend.ModeloSimulado).
+        Con Config.BACKEND = "simulado" se usa el simulado por defecto.
+        Con `cancelacion`, al cancelar el token las esperas se cortan y las
+        peticiones en vuelo se abandonan lanzando `cancelacion.Cancelado`.
+        """
+        self.ajustes = ajustes or Ajustes.desde_config()
+        self.modelo = self.ajustes.modelo
+        self.etapa: str | None = None
+        self.api_key = self.ajustes.api_key
+        self.transporte: _Transporte | None = None
+        if backend is not None:
+            self.model = backend
+        elif Config.BACKEND == "simulado":
+            from fake_backend import ModeloSimulado
+            self.model = ModeloSimulado(self.modelo)
+        else:
+            # Crear clientes es barato: el modelo sale del pool por key
+            self.transporte = obtener_transporte(self.api_key)
+            self.model = obtener_modelo(self.api_key, self.modelo)
+        self.limitador = self._limitador(self.modelo)
+        self.cache = obtener_cache() if self.ajustes.cache_respuestas else None
+        self.contexto: "ContextoCompartido | None" = None
+        self.cancelacion = cancelacion or SIN_CANCELACION
+
+    # ── Enrutado por etapa ──
+    def para_modelo(self, modelo: str) -> "GeminiClient":
+        """Copia del cliente que llama a `modelo` (misma key, contexto y caché)."""
+        if modelo == self.modelo:
+            return self
+        vista = copy.copy(self)
+        vista.modelo = modelo
+        if self.transporte:
+            vista.model = obtener_modelo(self.api_key, modelo)
+        # Con un backend inyectado o simulado se sigue usando el mismo
+        # objeto: solo cambian la etiqueta y la cuota
+        vista.limitador = self._limitador(modelo)
+        return vista
+
+    def _limitador(self, modelo: str):
+        return obtener_limitador(self.api_key, modelo, self.ajustes.rpm, self.ajustes.tpm)
+
+    def para_etapa(self, etapa: str, num: int | None = None) -> "GeminiClient":
+        """
+        Vista del cliente con el modelo que toca a esa etapa (y dimensión)
+        según el enrutador; sin `ajustes.enrutado`, el modelo principal.
+        """
+        principal = self.ajustes.modelo
+        modelo = (
+            elegir_modelo(etapa, principal, num) if self.ajustes.enrutado
+            else principal
+        )
+        vista = copy.copy(self.para_modelo(modelo))
+        vista.etapa = etapa
+        return vista
+
+    def _principal(self) -> "GeminiClient | None":
+        """Vista con el modelo principal si esta va enrutada a otro (si no, None)."""
+        if self.modelo == self.ajustes.modelo:
+            return None
+        return self.para_modelo(self.ajustes.modelo)
+
+    def _aviso_principal(self, error: Exception) -> "GeminiClient | None":
+        """
+        Tras un fallo de un modelo enrutado (404, cuota agotada...), la vista
+        con la que repetir la llamada; None si no la hay. Los errores fatales
+        (key, seguridad) fallarían igual con el principal.
+        """
+        if isinstance(error, ErrorFatal) or (principal := self._principal()) is None:
+            return None
+        print(f"   ↩️ {self.modelo} falló ({error}); se repite con {principal.modelo}")
+        return principal
+
+    # ── Contexto compartido (prefijo común cacheado) ──
+    def registrar_contexto(self, texto: str) -> "ContextoCompartido":
+        """Registra un prefijo común para enviarlo una sola vez (ver `con_contexto`)."""
+        return ContextoCompartido(self, texto)
+
+    def con_contexto(self, contexto: "ContextoCompartido") -> "GeminiClient":
+        """
+        Copia del cliente cuyas llamadas van precedidas por `contexto`: el
+        prompt solo lleva lo específico de cada llamada.
+        """
+        vista = copy.copy(self)
+        vista.contexto = contexto
+        return vista
+
+    def _prompt_completo(self, prompt: str) -> str:
+        return self.contexto.texto + prompt if self.contexto else prompt
+
+    def _preparar(self, prompt: str, tool: dict | None) -> tuple:
+        """(modelo, prompt, tools) a usar: el cacheado si el contexto lo tiene."""
+        if self.contexto:
+            modelo = self.contexto.modelo_para(self, tool)
+            if modelo is not None:
+                # Las tools van dentro del contenido cacheado
+                return modelo, prompt, None
+            prompt = self._prompt_completo(prompt)
+        return self.model, prompt, [tool] if tool else None
+
+    def _crear_modelo_cacheado(self, texto: str, tool: dict | None):
+        """Modelo ligado a un contenido cacheado en el servidor con `texto` y `tool`."""
+        tools = [tool] if tool else None
+        if hasattr(self.model, "desde_contexto"):  # backend simulado
+            return self.model.desde_contexto(texto, tools)
+        from google.generativeai import caching
+        # CachedContent.create usa el cliente global de genai; la petición
+        # va por el transporte de esta key
+        peticion = caching.CachedContent._prepare_create_request(
+            model=self.modelo,
+            contents=[texto],
+            tools=tools,
+            ttl=timedelta(seconds=Config.CONTEXT_CACHE_TTL),
+        )
+        cache = caching.CachedContent._from_obj(
+            self.transporte.cache.create_cached_content(peticion)
+        )
+        return self.transporte.enlazar(
+            genai.GenerativeModel.from_cached_content(cached_content=cache)
+        )
+
+    def _borrar_modelo_cacheado(self, modelo):
+        nombre = getattr(modelo, "cached_content", None)
+        if nombre and self.transporte:
+            self.transporte.cache.delete_cached_content(name=nombre)
 
     def generar(self, prompt: str, con_search: bool = True) -> dict:
         """
         Genera contenido con estrategia de fallback.
-        Retorna: {"texto": str, "fuentes": list, "metodo": str}
+        Retorna: {"texto": str, "fuentes": list, "metodo": str} más la
+        telemetría de la llamada (latencia, tokens_entrada, tokens_salida,
+        tokens_cache, reintentos y, si aplica, cache/hedge).
+        En una vista enrutada, si el modelo de la etapa falla del todo la
+        llamada se repite con el modelo principal.
         """
+        try:
+            return self._generar(prompt, con_search)
+        except Exception as e:
+            if (principal := self._aviso_principal(e)) is None:
+                raise
+            return principal._generar(prompt, con_search)
 
-        estrategias = []
+    def _generar(self, prompt: str, con_search: bool) -> dict:
+        self.cancelacion.comprobar()
+        inicio = time.monotonic()
+        clave = self._clave_cache(prompt, con_search)
+        if clave and (cacheado := self.cache.obtener(clave)):
+            return self._finalizar(cacheado, inicio)
 
-        if con_search:
-            estrategias.append(
-                ("Google Search", {"google_search": {}})
-            )
-
-        # Siempre incluir modelo base como fallback
-        estrategias.append(("Modelo base", None))
+        estrategias = self._estrategias(con_search)
+        if self.ajustes.hedge:
+            resultado, estrategias = self._generar_con_hedge(prompt, estrategias)
+            if resultado:
+                if clave:
+                    self.cache.guardar(clave, resultado, con_search)
+                return self._finalizar(resultado, inicio)
 
+        intentos_fallidos = 0
         for nombre_estrategia, tool in estrategias:
             try:
                 resultado = self._llamar_con_reintentos(
                     prompt, tool, nombre_estrategia
                 )
                 if resultado:
-                    return resultado
+                    if clave:
+                        self.cache.guardar(clave, resultado, con_search)
+                    return self._finalizar(resultado, inicio, intentos_fallidos)
+                intentos_fallidos += Config.MAX_RETRIES
+            except ErrorFatal:
+                raise
             except Exception as e:
                 print(f"   ⚠️ {nombre_estrategia} falló: {e}")
-                time.sleep(1)
+                self.cancelacion.esperar(1)
 
         raise RuntimeError("Todas las estrategias fallaron")
 
-    def _llamar_con_reintentos(
-        self, prompt: str, tool: dict | None, nombre: str
-    ) -> dict | None:
-        """Llama a la API con backoff exponencial."""
+    def generar_stream(self, prompt: str, con_search: bool = True) -> "Transmision":
+        """
+        Igual que `generar`, pero devuelve un iterable de fragmentos de texto.
+        Al agotarlo, `transmision.resultado` tiene el dict completo (con
+        fuentes) más `ttft` y `duracion` en segundos.
+        """
+        return Transmision(self, prompt, con_search)
 
-        generation_config = genai.types.GenerationConfig(
-            temperature=Config.TEMPERATURE,
-            max_output_tokens=Config.MAX_TOKENS,
-        )
+    async def agenerar(self, prompt: str, con_search: bool = True) -> dict:
+        """
+        Versión asíncrona de `generar` (mismo fallback, mismo resultado).
+        Todas las llamadas en vuelo comparten el event loop y el cliente
+        asíncrono del modelo, sin ocupar un hilo por llamada.
+        """
+        try:
+            return await self._agenerar(prompt, con_search)
+        except Exception as e:
+            if (principal := self._aviso_principal(e)) is None:
+                raise
+            return await principal._agenerar(prompt, con_search)
 
-        tools = [tool] if tool else None
+    async def _agenerar(self, prompt: str, con_search: bool) -> dict:
+        self.cancelacion.comprobar()
+        inicio = time.monotonic()
+        clave = self._clave_cache(prompt, con_search)
+        if clave and (
+            cacheado := await asyncio.to_thread(self.cache.obtener, clave)
+        ):
+            return self._finalizar(cacheado, inicio)
 
-        for intento in range(1, Config.MAX_RETRIES + 1):
+        estrategias = self._estrategias(con_search)
+        if self.ajustes.hedge:
+            resultado, estrategias = await self._agenerar_con_hedge(
+                prompt, estrategias
+            )
+            if resultado:
+                if clave:
+                    await asyncio.to_thread(
+                        self.cache.guardar, clave, resultado, con_search
+                    )
+                return self._finalizar(resultado, inicio)
+
+        intentos_fallidos = 0
+        for nombre_estrategia, tool in estrategias:
             try:
-                response = self.model.generate_content(
-                    prompt,
-                    generation_config=generation_config,
-                    tools=tools,
+                resultado = await self._allamar_con_reintentos(
+                    prompt, tool, nombre_estrategia
                 )
+                if resultado:
+                    if clave:
+                        await asyncio.to_thread(
+                            self.cache.guardar, clave, resultado, con_search
+                        )
+                    return self._finalizar(resultado, inicio, intentos_fallidos)
+                intentos_fallidos += Config.MAX_RETRIES
+            except ErrorFatal:
+                raise
+            except Exception as e:
+                print(f"   ⚠️ {nombre_estrategia} falló: {e}")
+                await self.cancelacion.aesperar(1)
 
-                if not response.candidates:
-                    raise ValueError("Respuesta sin candidatos")
+        raise RuntimeError("Todas las estrategias fallaron")
 
-                texto = response.text
+    def _finalizar(self, resultado: dict, inicio: float,
+                   intentos_fallidos: int = 0) -> dict:
+        """Completa la telemetría de la llamada y la registra en las métricas."""
+        resultado["latencia"] = time.monotonic() - inicio
+        resultado["reintentos"] = resultado.get("reintentos", 0) + intentos_fallidos
+        resultado["modelo"] = self.modelo
+        resultado["coste"] = coste_llamada(self.modelo, resultado)
+        registrar_llamada(self.modelo, resultado)
+        return resultado
 
-                # Extraer fuentes si existen
-                fuentes = self._extraer_fuentes(response)
+    # ── Hedging ──
+    def _plan_hedge(self, estrategias: list) -> tuple[tuple, tuple, float]:
+        """Estrategia primaria, la de respaldo y el umbral de espera (s)."""
+        primaria = estrategias[0]
+        if Config.HEDGE_BACKUP == "misma" or len(estrategias) == 1:
+            respaldo = primaria
+        else:
+            respaldo = estrategias[-1]
+        umbral = historial_latencias.umbral_hedge(self.modelo, primaria[0])
+        return primaria, respaldo, umbral
 
-                return {
-                    "texto": texto,
-                    "fuentes": fuentes,
-                    "metodo": nombre,
-                }
+    def _generar_con_hedge(self, prompt: str,
+                           estrategias: list) -> tuple[dict | None, list]:
+        """
+        Lanza la primaria; si no responde en su percentil de latencia,
+        lanza también el respaldo y se queda con la primera respuesta buena.
+        La perdedora deja de reintentar (el hilo no se puede matar).
+        Devuelve también las estrategias que no llegaron a lanzarse.
+        """
+        primaria, respaldo, umbral = self._plan_hedge(estrategias)
+        restantes = [e for e in estrategias if e != primaria]
+        abandonar = threading.Event()
+        futuros = {
+            _pool_hedge.submit(
+                self._llamar_con_reintentos, prompt, primaria[1],
+                primaria[0], abandonar,
+            ): "primaria"
+        }
+        hecho, _ = wait(futuros, timeout=umbral)
+        if not hecho:
+            print(f"   🐢 Sin respuesta en {umbral:.1f}s, lanzando respaldo ({respaldo[0]})")
+            futuros[_pool_hedge.submit(
+                self._llamar_con_reintentos, prompt, respaldo[1],
+                respaldo[0], abandonar,
+            )] = "respaldo"
+            restantes = [e for e in restantes if e != respaldo]
 
-            except Exception as e:
-                print(f"   ⚠️ Intento {intento}/{Config.MAX_RETRIES}: {e}")
+        pendientes = set(futuros)
+        while pendientes:
+            hecho, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+            for futuro in hecho:
+                try:
+                    resultado = futuro.result()
+                except (ErrorFatal, Cancelado):
+                    abandonar.set()
+                    raise
+                except Exception as e:
+                    print(f"   ⚠️ Hedge {futuros[futuro]} falló: {e}")
+                    continue
+                if resultado:
+                    abandonar.set()
+                    for otro in pendientes:
+                        otro.cancel()
+                    resultado["hedge"] = futuros[futuro]
+                    print(f"   🏁 Hedge: gana la {futuros[futuro]} ({resultado['metodo']})")
+                    return resultado, restantes
 
-                if intento < Config.MAX_RETRIES:
-                    espera = Config.DELAY_BETWEEN_CALLS * (2 ** (intento - 1))
-                    print(f"   ⏳ Esperando {espera}s...")
-                    time.sleep(espera)
+        return None, restantes
+
+    async def _agenerar_con_hedge(self, prompt: str,
+                                  estrategias: list) -> tuple[dict | None, list]:
+        """Versión asíncrona: aquí la perdedora sí se cancela de verdad."""
+        primaria, respaldo, umbral = self._plan_hedge(estrategias)
+        restantes = [e for e in estrategias if e != primaria]
+        tareas = {
+            asyncio.create_task(self._allamar_con_reintentos(
+                prompt, primaria[1], primaria[0]
+            )): "primaria"
+        }
+        hecho, _ = await asyncio.wait(tareas, timeout=umbral)
+        if not hecho:
+            print(f"   🐢 Sin respuesta en {umbral:.1f}s, lanzando respaldo ({respaldo[0]})")
+            tareas[asyncio.create_task(self._allamar_con_reintentos(
+                prompt, respaldo[1], respaldo[0]
+            ))] = "respaldo"
+            restantes = [e for e in restantes if e != respaldo]
+
+        pendientes = set(tareas)
+        try:
+            while pendientes:
+                hecho, pendientes = await asyncio.wait(
+                    pendientes, return_when=asyncio.FIRST_COMPLETED
+                )
+                for tarea in hecho:
+                    try:
+                        resultado = tarea.result()
+                    except ErrorFatal:
+                        raise
+                    except Exception as e:
+                        print(f"   ⚠️ Hedge {tareas[tarea]} falló: {e}")
+                        continue
+                    if resultado:
+                        resultado["hedge"] = tareas[tarea]
+                        print(f"   🏁 Hedge: gana la {tareas[tarea]} ({resultado['metodo']})")
+                        return resultado, restantes
+        finally:
+            for tarea in pendientes:
+                tarea.cancel()
+
+        return None, restantes
+
+    def _clave_cache(self, prompt: str, con_search: bool) -> str | None:
+        if not self.cache:
+            return None
+        return self.cache.clave(
+            self._prompt_completo(prompt), self.modelo, self.ajustes.temperatura,
+            self.ajustes.max_tokens, con_search,
+        )
+
+    def _estrategias(self, con_search: bool) -> list[tuple[str, dict | None]]:
+        """Orden de estrategias: Google Search (opcional) → modelo base."""
+        estrategias = []
+
+        if con_search:
+            estrategias.append(
+                ("Google Search", {"google_search": {}})
+            )
+
+        # Siempre incluir modelo base como fallback
+        estrategias.append(("Modelo base", None))
+
+        # Con el circuito abierto se salta la estrategia (nunca la última)
+        disponibles = []
+        for estrategia in estrategias[:-1]:
+            if obtener_breaker(self.modelo, estrategia[0]).permitir():
+                disponibles.append(estrategia)
+            else:
+                print(f"   🔌 {estrategia[0]} con circuito abierto, se omite")
+        return disponibles + estrategias[-1:]
+
+    def _generation_config(self):
+        return genai.types.GenerationConfig(
+            temperature=self.ajustes.temperatura,
+            max_output_tokens=self.ajustes.max_tokens,
+        )
+
+    def _procesar_respuesta(self, response, nombre: str) -> dict:
+        """Convierte la respuesta del SDK en el dict de resultado."""
+        feedback = getattr(response, "prompt_feedback", None)
+        if getattr(feedback, "block_reason", None):
+            raise ErrorFatal(f"Prompt bloqueado: {feedback.block_reason}")
+        if not response.candidates:
+            raise ValueError("Respuesta sin candidatos")
+
+        return {
+            "texto": response.text,
+            "fuentes": self._extraer_fuentes(response),
+            "metodo": nombre,
+            **self._tokens(response),
+        }
+
+    @staticmethod
+    def _tokens(response) -> dict:
+        uso = getattr(response, "usage_metadata", None)
+        return {
+            "tokens_entrada": getattr(uso, "prompt_token_count", 0) or 0,
+            "tokens_salida": getattr(uso, "candidates_token_count", 0) or 0,
+            "tokens_cache": getattr(uso, "cached_content_token_count", 0) or 0,
+        }
+
+    def _ajustar_cuota(self, response, estimados: int):
+        """Corrige la reserva de tokens con el conteo real de la API."""
+        try:
+            reales = response.usage_metadata.prompt_token_count
+        except AttributeError:
+            return
+        if reales:
+            self.limitador.ajustar(reales - estimados)
+
+    def _espera_backoff(self, intento: int) -> float:
+        return self.ajustes.retraso_base * (2 ** (intento - 1))
+
+    def _espera_tras_error(self, error: Exception, intento: int) -> float:
+        """Backoff exponencial, o el retraso que pida el servidor si es cuota."""
+        espera = self._espera_backoff(intento)
+        if clasificar_error(error) == CUOTA:
+            sugerido = retraso_sugerido(error)
+            if sugerido is not None:
+                espera = max(espera, sugerido)
+        return min(espera, Config.MAX_RETRY_DELAY)
+
+    def _fallo_no_reintentable(self, error: Exception, nombre: str):
+        """
+        Lo que no se arregla reintentando no se reintenta ni cuenta para el
+        breaker: los fatales (auth, bloqueos) abortan la llamada; el resto
+        de 400/404 solo descartan esta estrategia.
+        """
+        tipo = clasificar_error(error)
+        if tipo == FATAL:
+            obtener_breaker(self.modelo, nombre).liberar()
+            print(f"   ⛔ Error no reintentable: {error}")
+            raise ErrorFatal(str(error)) from error
+        if tipo == ESTRATEGIA:
+            obtener_breaker(self.modelo, nombre).liberar()
+            print(f"   ↪️ {nombre} no aplica: {error}")
+            raise ErrorEstrategia(str(error)) from error
+
+    def _llamar_con_reintentos(
+        self, prompt: str, tool: dict | None, nombre: str,
+        abandonar: threading.Event | None = None,
+    ) -> dict | None:
+        """
+        Llama a la API con backoff exponencial (se corta si `abandonar`).
+        Si se cancela el run, la espera o la petición en vuelo se abandonan
+        y se lanza `Cancelado`.
+        """
+
+        generation_config = self._generation_config()
+        estimados = estimar_tokens(self._prompt_completo(prompt))
+        abandonar = abandonar or threading.Event()
+        breaker = obtener_breaker(self.modelo, nombre)
+        quitar_aviso = self.cancelacion.al_cancelar(abandonar.set)
 
+        try:
+            for intento in range(1, Config.MAX_RETRIES + 1):
+                self.cancelacion.comprobar()
+                if abandonar.is_set():
+                    breaker.liberar()
+                    return None
+                try:
+                    self.limitador.adquirir(estimados, self.cancelacion)
+                    inicio = time.monotonic()
+                    modelo, texto, tools = self._preparar(prompt, tool)
+                    response = self.cancelacion.ejecutar(
+                        modelo.generate_content,
+                        texto,
+                        generation_config=generation_config,
+                        tools=tools,
+                    )
+                    self._ajustar_cuota(response, estimados)
+                    resultado = self._procesar_respuesta(response, nombre)
+                    resultado["reintentos"] = intento - 1
+                    segundos = time.monotonic() - inicio
+                    historial_latencias.registrar(self.modelo, nombre, segundos)
+                    historial_modelos.registrar(self.modelo, self.etapa, segundos)
+                    breaker.registrar_exito()
+                    return resultado
+
+                except Exception as e:
+                    registrar_error(self.modelo, clasificar_error(e))
+                    historial_modelos.registrar_fallo(self.modelo)
+                    self._fallo_no_reintentable(e, nombre)
+                    print(f"   ⚠️ Intento {intento}/{Config.MAX_RETRIES}: {e}")
+
+                    if intento < Config.MAX_RETRIES:
+                        espera = self._espera_tras_error(e, intento)
+                        print(f"   ⏳ Esperando {espera}s...")
+                        abandonar.wait(espera)
+        except Cancelado:
+            breaker.liberar()
+            raise
+        finally:
+            quitar_aviso()
+
+        breaker.registrar_fallo()
+        return None
+
+    async def _allamar_con_reintentos(
+        self, prompt: str, tool: dict | None, nombre: str
+    ) -> dict | None:
+        """Como `_llamar_con_reintentos`, pero sin bloquear el hilo."""
+
+        generation_config = self._generation_config()
+        estimados = estimar_tokens(self._prompt_completo(prompt))
+        breaker = obtener_breaker(self.modelo, nombre)
+
+        try:
+            for intento in range(1, Config.MAX_RETRIES + 1):
+                try:
+                    await self.limitador.aadquirir(estimados, self.cancelacion)
+                    inicio = time.monotonic()
+                    modelo, texto, tools = await asyncio.to_thread(
+                        self._preparar, prompt, tool
+                    )
+                    response = await self.cancelacion.acorrer(modelo.generate_content_async(
+                        texto,
+                        generation_config=generation_config,
+                        tools=tools,
+                    ))
+                    self._ajustar_cuota(response, estimados)
+                    resultado = self._procesar_respuesta(response, nombre)
+                    resultado["reintentos"] = intento - 1
+                    segundos = time.monotonic() - inicio
+                    historial_latencias.registrar(self.modelo, nombre, segundos)
+                    historial_modelos.registrar(self.modelo, self.etapa, segundos)
+                    breaker.registrar_exito()
+                    return resultado
+
+                except Exception as e:
+                    registrar_error(self.modelo, clasificar_error(e))
+                    historial_modelos.registrar_fallo(self.modelo)
+                    self._fallo_no_reintentable(e, nombre)
+                    print(f"   ⚠️ Intento {intento}/{Config.MAX_RETRIES}: {e}")
+
+                    if intento < Config.MAX_RETRIES:
+                        espera = self._espera_tras_error(e, intento)
+                        print(f"   ⏳ Esperando {espera}s...")
+                        await self.cancelacion.aesperar(espera)
+        except (asyncio.CancelledError, Cancelado):
+            # Cancelada (perdió el hedge o se canceló el run): no dice nada
+            # de la estrategia
+            breaker.liberar()
+            raise
+
+        breaker.registrar_fallo()
         return None
 
     def _extraer_fuentes(self, response) -> list[str]:
@@ -108,6 +668,7 @@ class GeminiClient:
         resultado = {"base": False, "search": False, "detalle": ""}
 
         try:
+            self.limitador.adquirir(estimar_tokens("Responde: CONEXION OK"))
             resp = self.model.generate_content("Responde: CONEXION OK")
             if resp.text:
                 resultado["base"] = True
@@ -116,3 +677,206 @@ class GeminiClient:
             resultado["detalle"] = str(e)
 
         return resultado
+
+
+class Transmision:
+    """Respuesta en streaming de Gemini con el mismo fallback que `generar`."""
+
+    def __init__(self, client: GeminiClient, prompt: str, con_search: bool):
+        self.client = client
+        self.prompt = prompt
+        self.con_search = con_search
+        self.resultado: dict | None = None
+        self.ttft: float | None = None
+
+    def __iter__(self):
+        try:
+            yield from self._transmitir()
+        except Exception as e:
+            # Con texto ya emitido no se puede repetir con otro modelo
+            if self.ttft is not None or (principal := self.client._aviso_principal(e)) is None:
+                raise
+            self.client = principal
+            yield from self._transmitir()
+
+    def _transmitir(self):
+        inicio = time.monotonic()
+        client = self.client
+        client.cancelacion.comprobar()
+
+        clave = client._clave_cache(self.prompt, self.con_search)
+        if clave and (cacheado := client.cache.obtener(clave)):
+            self.ttft = time.monotonic() - inicio
+            yield cacheado["texto"]
+            self.resultado = client._finalizar({
+                **cacheado, "ttft": self.ttft,
+                "duracion": time.monotonic() - inicio,
+            }, inicio)
+            return
+
+        intentos_fallidos = 0
+        for nombre_estrategia, tool in client._estrategias(self.con_search):
+            try:
+                resultado = yield from self._transmitir_con_reintentos(
+                    tool, nombre_estrategia, inicio
+                )
+            except ErrorFatal:
+                raise
+            except Exception as e:
+                if self.ttft is not None:
+                    raise
+                print(f"   ⚠️ {nombre_estrategia} falló: {e}")
+                resultado = None
+            if resultado:
+                if clave:
+                    client.cache.guardar(clave, resultado, self.con_search)
+                self.resultado = client._finalizar(
+                    resultado, inicio, intentos_fallidos
+                )
+                return
+            intentos_fallidos += Config.MAX_RETRIES
+            client.cancelacion.esperar(1)
+
+        raise RuntimeError("Todas las estrategias fallaron")
+
+    def _transmitir_con_reintentos(self, tool: dict | None, nombre: str,
+                                   inicio: float):
+        """
+        Reintenta solo mientras no se haya emitido nada: una vez que el
+        texto llegó a la UI, un fallo a mitad se propaga tal cual.
+        """
+        client = self.client
+        estimados = estimar_tokens(client._prompt_completo(self.prompt))
+        breaker = obtener_breaker(client.modelo, nombre)
+        try:
+            return (yield from self._intentos(tool, nombre, inicio, estimados, breaker))
+        except Cancelado:
+            breaker.liberar()
+            raise
+
+    def _intentos(self, tool: dict | None, nombre: str, inicio: float,
+                  estimados: int, breaker):
+        """Bucle de reintentos de `_transmitir_con_reintentos`."""
+        client = self.client
+        for intento in range(1, Config.MAX_RETRIES + 1):
+            partes: list[str] = []
+            fuentes: list[str] = []
+            try:
+                client.limitador.adquirir(estimados, client.cancelacion)
+                llamada = time.monotonic()
+                modelo, texto, tools = client._preparar(self.prompt, tool)
+                response = client.cancelacion.ejecutar(
+                    modelo.generate_content,
+                    texto,
+                    generation_config=client._generation_config(),
+                    tools=tools,
+                    stream=True,
+                )
+                # Cada fragmento se espera de forma cancelable: un stream
+                # parado no retiene el run
+                fragmentos = iter(response)
+                while (chunk := client.cancelacion.ejecutar(next, fragmentos, None)) is not None:
+                    fuentes.extend(client._extraer_fuentes(chunk))
+                    texto = self._texto_fragmento(chunk)
+                    if not texto:
+                        continue
+                    if self.ttft is None:
+                        self.ttft = time.monotonic() - inicio
+                    partes.append(texto)
+                    yield texto
+
+                if not partes:
+                    raise ValueError("Respuesta sin candidatos")
+
+                client._ajustar_cuota(response, estimados)
+                fuentes.extend(client._extraer_fuentes(response))
+                historial_modelos.registrar(
+                    client.modelo, client.etapa, time.monotonic() - llamada
+                )
+                breaker.registrar_exito()
+                return {
+                    "texto": "".join(partes),
+                    "fuentes": list(dict.fromkeys(fuentes)),
+                    "metodo": nombre,
+                    "ttft": self.ttft,
+                    "duracion": time.monotonic() - inicio,
+                    "reintentos": intento - 1,
+                    **client._tokens(response),
+                }
+
+            except Exception as e:
+                registrar_error(client.modelo, clasificar_error(e))
+                historial_modelos.registrar_fallo(client.modelo)
+                if partes:
+                    raise
+                client._fallo_no_reintentable(e, nombre)
+                print(f"   ⚠️ Intento {intento}/{Config.MAX_RETRIES}: {e}")
+
+                if intento < Config.MAX_RETRIES:
+                    espera = client._espera_tras_error(e, intento)
+                    print(f"   ⏳ Esperando {espera}s...")
+                    client.cancelacion.esperar(espera)
+
+        breaker.registrar_fallo()
+        return None
+
+    @staticmethod
+    def _texto_fragmento(chunk) -> str:
+        """`chunk.text` lanza si el fragmento no trae texto (p. ej. solo metadata)."""
+        try:
+            return chunk.text
+        except (ValueError, AttributeError, IndexError):
+            return ""
+
+
+class ContextoCompartido:
+    """
+    Prefijo común a varias llamadas (p. ej. la base del mega-prompt de las
+    7 dimensiones). Se sube una vez como contenido cacheado de Gemini por
+    cada combinación de tools; si no se puede (modelo sin soporte, texto
+    por debajo del mínimo, error) se antepone localmente a cada prompt.
+    """
+
+    def __init__(self, client: GeminiClient, texto: str):
+        self.client = client
+        self.texto = texto
+        self.tokens = estimar_tokens(texto)
+        # (modelo, tool) → (cliente que lo creó, modelo cacheado o None)
+        self._modelos: dict[tuple[str, str], tuple] = {}
+        self._lock = threading.Lock()
+
+    def modelo_para(self, client: GeminiClient, tool: dict | None):
+        """
+        Modelo cacheado para el modelo de `client` y esa tool, creado en
+        la primera llamada (o None). El contenido cacheado va ligado a un
+        modelo, así que con enrutado puede haber uno por modelo.
+        """
+        clave = (client.modelo, repr(tool))
+        with self._lock:
+            if clave not in self._modelos:
+                self._modelos[clave] = (client, self._crear(client, tool))
+            return self._modelos[clave][1]
+
+    def _crear(self, client: GeminiClient, tool: dict | None):
+        if not client.ajustes.contexto_cache \
+                or self.tokens < Config.CONTEXT_CACHE_MIN_TOKENS:
+            return None
+        try:
+            modelo = client._crear_modelo_cacheado(self.texto, tool)
+            print(f"   🧷 Contexto compartido cacheado (~{self.tokens} tokens)")
+            return modelo
+        except Exception as e:
+            print(f"   ⚠️ No se pudo cachear el contexto, se envía completo: {e}")
+            return None
+
+    def liberar(self):
+        """Borra los contenidos cacheados en el servidor (si no, caducan por TTL)."""
+        with self._lock:
+            modelos, self._modelos = list(self._modelos.values()), {}
+        for client, modelo in modelos:
+            if modelo is None:
+                continue
+            try:
+                client._borrar_modelo_cacheado(modelo)
+            except Exception as e:
+                print(f"   ⚠️ No se pudo borrar el contexto cacheado: {e}")
@@ -0,0 +1,35 @@
+"""Historial de latencias por estrategia para decidir cuándo lanzar un hedge."""
+
+import threading
+from collections import deque
+from config import Config
+
+
+class HistorialLatencias:
+    """Últimas N latencias con éxito por (modelo, estrategia), compartidas por proceso."""
+
+    def __init__(self, ventana: int = 200):
+        self.ventana = ventana
+        self._muestras: dict[tuple[str, str], deque] = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, modelo: str, estrategia: str, segundos: float):
+        with self._lock:
+            self._muestras.setdefault(
+                (modelo, estrategia), deque(maxlen=self.ventana)
+            ).append(segundos)
+
+    def percentil(self, modelo: str, estrategia: str, p: float) -> float | None:
+        with self._lock:
+            muestras = sorted(self._muestras.get((modelo, estrategia), ()))
+        if len(muestras) < Config.HEDGE_MIN_SAMPLES:
+            return None
+        return muestras[round(p * (len(muestras) - 1))]
+
+    def umbral_hedge(self, modelo: str, estrategia: str) -> float:
+        """Segundos a esperar a la primaria antes de lanzar el respaldo."""
+        umbral = self.percentil(modelo, estrategia, Config.HEDGE_PERCENTILE)
+        return umbral if umbral is not None else Config.HEDGE_DEFAULT_DELAY
+
+
+historial_latencias = HistorialLatencias()
@@ -0,0 +1,245 @@
+"""
+Conversor Markdown → DOCX en una sola pasada.
+
+Cubre lo que devuelve Gemini en los informes: encabezados, párrafos con
+**negrita**, *cursiva*, `código` y enlaces, listas con viñetas y numeradas
+(anidadas por sangría), bloques de código, citas y tablas.
+"""
+
+import re
+from docx.shared import Pt
+from docx.enum.text import WD_BREAK
+
+# Un solo regex para todo el formato en línea; el orden de las
+# alternativas decide la prioridad (*** antes que ** antes que *)
+_EN_LINEA = re.compile(
+    r"\*\*\*(?P<negrita_cursiva>[^*]+?)\*\*\*"
+    r"|\*\*(?P<negrita>.+?)\*\*"
+    r"|__(?P<negrita2>.+?)__"
+    r"|\*(?P<cursiva>[^*\s][^*]*?)\*"
+    r"|(?<!\w)_(?P<cursiva2>[^_\s][^_]*?)_(?!\w)"
+    r"|`(?P<codigo>[^`]+)`"
+    r"|\[(?P<enlace>[^\]]+)\]\((?P<url>[^)\s]+)\)"
+)
+_ENCABEZADO = re.compile(r"(#{1,6})\s+(.*)")
+_VINETA = re.compile(r"( *)[-*+]\s+(.*)")
+_NUMERADO = re.compile(r"( *)\d+[.)]\s+(.*)")
+_SEPARADOR_TABLA = re.compile(r"\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?")
+_LINEA_HORIZONTAL = re.compile(r"(-{3,}|\*{3,}|_{3,})")
+
+FUENTE_CODIGO = "Consolas"
+
+
+class ConversorMarkdownDocx:
+    """
+    Añade Markdown a un `docx.Document`. Los estilos se resuelven una vez
+    por documento y cada línea se recorre una sola vez. Todo pasa por la
+    API pública de python-docx salvo lo que hace `_InternosDocx`.
+    """
+
+    def __init__(self, doc, nivel_base: int = 1):
+        self.doc = doc
+        self.nivel_base = nivel_base  # "# " dentro de una sección = nivel_base + 1
+        self._estilos: dict[str, object | None] = {}
+        self._internos = _InternosDocx(doc)
+
+    def _estilo(self, nombre: str):
+        """Estilo por nombre (None si la plantilla no lo tiene), buscado una vez."""
+        if nombre not in self._estilos:
+            try:
+                self._estilos[nombre] = self.doc.styles[nombre]
+            except KeyError:
+                self._estilos[nombre] = None
+        return self._estilos[nombre]
+
+    # ── Bloques ──
+    def convertir(self, texto: str):
+        lineas = texto.split("\n")
+        i, n = 0, len(lineas)
+        lista_numerada = None  # numId de la lista numerada abierta (nivel 0)
+        while i < n:
+            linea = lineas[i].rstrip()
+            limpia = linea.strip()
+
+            if not limpia:
+                i += 1
+                continue
+
+            if limpia.startswith("```"):
+                fin = i + 1
+                while fin < n and not lineas[fin].strip().startswith("```"):
+                    fin += 1
+                self._codigo(lineas[i + 1:fin])
+                i = fin + 1
+                lista_numerada = None
+                continue
+
+            if limpia.startswith("|") and i + 1 < n \
+                    and _SEPARADOR_TABLA.fullmatch(lineas[i + 1].strip()):
+                fin = i + 2
+                while fin < n and lineas[fin].strip().startswith("|"):
+                    fin += 1
+                self._tabla(lineas[i], lineas[i + 2:fin])
+                i = fin
+                lista_numerada = None
+                continue
+
+            m = _ENCABEZADO.match(limpia)
+            if m:
+                nivel = min(max(len(m.group(1)), self.nivel_base + 1), 9)
+                self._parrafo(m.group(2), f"Heading {nivel}")
+                lista_numerada = None
+            elif (m := _VINETA.match(linea)) and not _LINEA_HORIZONTAL.fullmatch(limpia):
+                self._parrafo(m.group(2), self._estilo_lista("List Bullet", m.group(1)))
+            elif (m := _NUMERADO.match(linea)):
+                estilo = self._estilo_lista("List Number", m.group(1))
+                parrafo = self._parrafo(m.group(2), estilo)
+                if estilo == "List Number":
+                    # Cada lista empieza en 1, no continúa la anterior del documento
+                    if lista_numerada is None:
+                        lista_numerada = self._internos.nueva_numeracion(estilo)
+                    self._internos.numerar(parrafo, lista_numerada)
+            elif _LINEA_HORIZONTAL.fullmatch(limpia):
+                lista_numerada = None
+            elif limpia.startswith(">"):
+                self._parrafo(limpia.lstrip("> "), "Quote")
+                lista_numerada = None
+            else:
+                self._parrafo(limpia, None)
+                lista_numerada = None
+            i += 1
+
+    @staticmethod
+    def _estilo_lista(base: str, sangria: str) -> str:
+        nivel = min(len(sangria) // 2, 2)
+        return base if nivel == 0 else f"{base} {nivel + 1}"
+
+    def _parrafo(self, texto: str, estilo: str | None):
+        parrafo = self._nuevo_parrafo(estilo)
+        self._en_linea(parrafo, texto)
+        return parrafo
+
+    def _nuevo_parrafo(self, estilo: str | None):
+        parrafo = self.doc.add_paragraph()
+        if estilo and (objeto := self._estilo(estilo)) is not None:
+            self._internos.estilo(parrafo, objeto)
+        return parrafo
+
+    def _codigo(self, lineas: list[str]):
+        parrafo = self._nuevo_parrafo("No Spacing")
+        for k, linea in enumerate(lineas):
+            run = self._run(parrafo, linea)
+            run.font.name = FUENTE_CODIGO
+            run.font.size = Pt(9)
+            if k < len(lineas) - 1:
+                run.add_break(WD_BREAK.LINE)
+
+    @staticmethod
+    def _celdas(linea: str) -> list[str]:
+        return [c.strip() for c in linea.strip().strip("|").split("|")]
+
+    def _tabla(self, cabecera: str, filas: list[str]):
+        columnas = self._celdas(cabecera)
+        tabla = self.doc.add_table(1 + len(filas), len(columnas))
+        if (estilo := self._estilo("Table Grid")) is not None:
+            self._internos.estilo_tabla(tabla, estilo)
+        for fila, linea in zip(tabla.rows, [cabecera, *filas]):
+            for celda, texto in zip(fila.cells, self._celdas(linea)):
+                self._en_linea(celda.paragraphs[0], texto, negrita=fila is tabla.rows[0])
+
+    # ── Formato en línea ──
+    def _en_linea(self, parrafo, texto: str, negrita: bool = False):
+        pos = 0
+        for m in _EN_LINEA.finditer(texto):
+            if m.start() > pos:
+                self._run(parrafo, texto[pos:m.start()], negrita)
+            grupo = m.lastgroup
+            if grupo == "url":
+                run = self._run(parrafo, m.group("enlace"))
+                run.underline = True
+            else:
+                run = self._run(parrafo, m.group(grupo))
+                if grupo == "codigo":
+                    run.font.name = FUENTE_CODIGO
+                if grupo in ("negrita", "negrita2", "negrita_cursiva") or negrita:
+                    run.bold = True
+                if grupo in ("cursiva", "cursiva2", "negrita_cursiva"):
+                    run.italic = True
+            pos = m.end()
+        if pos < len(texto):
+            self._run(parrafo, texto[pos:], negrita)
+
+    @staticmethod
+    def _run(parrafo, texto: str, negrita: bool = False):
+        # Run.text revisa carácter a carácter por \t y \n; aquí cada texto es
+        # una sola línea, así que basta con add_text
+        run = parrafo.add_run()
+        run.add_text(texto)
+        if negrita:
+            run.bold = True
+        return run
+
+
+# ── Internos de python-docx ──
+class _InternosDocx:
+    """
+    Único sitio que toca internos de python-docx (requirements.txt acota
+    la versión). Si no están, con otra versión o plantilla, se vuelve a la
+    API pública o a la numeración del estilo.
+
+    - Estilos: `Paragraph.style = ...` (y `Table.style`) busca además el
+      estilo predeterminado recorriendo todos los estilos; con miles de
+      párrafos domina el tiempo, así que se asigna el style_id directamente.
+    - Listas numeradas: cada lista "1." del Markdown empieza en 1 en vez de
+      continuar la anterior; no hay API pública para numeraciones.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self._numeracion = None  # (numbering, abstractNumId, siguiente numId)
+
+    @staticmethod
+    def estilo(parrafo, estilo):
+        try:
+            parrafo._p.style = estilo.style_id
+        except AttributeError:
+            parrafo.style = estilo
+
+    @staticmethod
+    def estilo_tabla(tabla, estilo):
+        try:
+            tabla._tbl.tblPr.style = estilo.style_id
+        except AttributeError:
+            tabla.style = estilo
+
+    def nueva_numeracion(self, estilo: str) -> int | None:
+        """numId de una instancia nueva (empieza en 1) sobre la del estilo."""
+        try:
+            if self._numeracion is None:
+                numbering = self.doc.part.numbering_part.numbering_definitions._numbering
+                num_id = self.doc.styles[estilo].element.pPr.numPr.numId.val
+                abstract_id = numbering.num_having_numId(num_id).abstractNumId.val
+                num = numbering.add_num(abstract_id)
+            else:
+                # add_num busca el siguiente numId con un xpath sobre todas las
+                # numeraciones; con un contador propio no crece con cada lista
+                from docx.oxml.numbering import CT_Num
+
+                numbering, abstract_id, siguiente = self._numeracion
+                num = numbering._insert_num(CT_Num.new(siguiente, abstract_id))
+            num.add_lvlOverride(ilvl=0).add_startOverride(1)
+        except (AttributeError, KeyError, NotImplementedError, ImportError, TypeError):
+            return None  # plantilla sin numeración: se usa la del estilo
+        self._numeracion = (numbering, abstract_id, num.numId + 1)
+        return num.numId
+
+    @staticmethod
+    def numerar(parrafo, num_id: int | None):
+        if num_id is None:
+            return
+        try:
+            num_pr = parrafo._p.get_or_add_pPr().get_or_add_numPr()
+            num_pr.get_or_add_ilvl().val = 0
+            num_pr.get_or_add_numId().val = num_id
+        except AttributeError:
+            pass  # sigue la numeración del estilo
@@ -0,0 +1,331 @@
+"""Pipeline de investigación sin interfaz: mega-prompt → dimensiones → resumen."""
+
+import asyncio
+import time
+from cancelacion import Cancelado
+from checkpoint import Checkpoint
+from dimensions import (
+    MegaPromptDiferido, agenerar_mega_prompt, base_compartida, crear_dimensiones,
+    generar_mega_prompt,
+)
+from report_builder import ReportBuilder
+from resumen import Condensador, construir_prompt_resumen, reducir
+from scheduler import aejecutar_dimensiones, ejecutar_dimensiones
+from telemetria import Traza, atributos_llamada, metricas
+
+
+class _Run:
+    """
+    Estado de un run y lo que hay que hacer en cada paso (checkpoint,
+    informe, traza, condensación), común a `investigar` y `ainvestigar`:
+    cada uno solo decide cómo se hacen las llamadas.
+    """
+
+    def __init__(self, client, checkpoint: Checkpoint, asincrono: bool = False):
+        self.client = client
+        self.checkpoint = checkpoint
+        self.datos = checkpoint.datos
+        self.objetivo = self.datos["objetivo"]
+        self.ajustes = client.ajustes
+        self.asincrono = asincrono
+        # En asíncrono los pasos con escrituras a disco van a hilos
+        # (asyncio.to_thread) y las condensaciones vuelven al loop
+        self._loop = asyncio.get_running_loop() if asincrono else None
+        self.traza = Traza(checkpoint.run_id)
+        self.inicio = time.time()
+        self.builder = ReportBuilder(
+            self.objetivo, checkpoint.timestamp, traza=self.traza, ajustes=self.ajustes,
+            run_id=checkpoint.run_id,
+        )
+        self.cliente_mega = client.para_etapa("mega_prompt")
+        self.contexto = None
+        self.condensador: Condensador | None = None
+        self.tokens = {"tokens_entrada": 0, "tokens_cache": 0}
+        self._inicios: dict[int, float] = {}
+        self.cerrado = False
+
+    # ── Mega-prompt ──
+    def mega_guardado(self) -> str | None:
+        if self.datos["mega_prompt"]:
+            self.builder.registrar_modelo("mega_prompt", self.checkpoint.modelo("mega_prompt"))
+        return self.datos["mega_prompt"]
+
+    def guardar_mega(self, mega_base: str):
+        self.checkpoint.guardar_mega_prompt(mega_base, self.cliente_mega.modelo)
+        self.builder.registrar_modelo("mega_prompt", self.cliente_mega.modelo)
+
+    # ── Dimensiones ──
+    def preparar(self, mega_base: str, contexto: bool) -> tuple:
+        """Cliente de las dimensiones y el evento ("dimensiones", None, activas)."""
+        cliente_dims = self.client
+        if contexto and self.ajustes.contexto_cache:
+            self.contexto = self.client.registrar_contexto(base_compartida(mega_base))
+            cliente_dims = self.client.con_contexto(self.contexto)
+        dimensiones = crear_dimensiones(
+            mega_base, self.ajustes, contexto_compartido=self.contexto is not None,
+        )
+        self.dims_activas = [dimensiones[i] for i in self.datos["seleccionadas"]]
+        self.pendientes = self.checkpoint.pendientes(self.dims_activas)
+        self._posicion = [self.dims_activas.index(d) for d in self.pendientes]
+
+        # Resumen map-reduce: cada sección se condensa en cuanto está lista
+        if self.datos["incluir_resumen"] and not self.resumen_guardado():
+            self.condensador = Condensador(
+                self.client, self.objetivo, self.checkpoint, self.traza
+            )
+        return cliente_dims, ("dimensiones", None, self.dims_activas)
+
+    def _condensar(self, dim: dict, contenido: str):
+        if self.condensador and self.asincrono:
+            self._loop.call_soon_threadsafe(self.condensador.aenviar, dim, contenido)
+        elif self.condensador:
+            self.condensador.enviar(dim, contenido)
+
+    def restauradas(self):
+        """Eventos de las secciones ya completadas en el checkpoint."""
+        for idx, dim in enumerate(self.dims_activas):
+            if dim not in self.pendientes:
+                guardada = {
+                    **self.checkpoint.seccion(dim["num"]),
+                    "contenido": self.checkpoint.contenido(dim["num"]),
+                }
+                self.builder.agregar_seccion(
+                    dim, guardada["contenido"], guardada["fuentes"], True,
+                    guardada.get("modelo"),
+                )
+                self._condensar(dim, guardada["contenido"])
+                yield ("restaurada", idx, guardada)
+
+    def evento_dimension(self, tipo: str, i: int, dato) -> tuple:
+        """Registra un evento del planificador y lo devuelve con la posición en las activas."""
+        dim = self.pendientes[i]
+        if tipo == "inicio":
+            self._inicios[i] = time.time()
+        elif tipo == "fin":
+            self.builder.agregar_seccion(
+                dim, dato["texto"], dato["fuentes"], True, dato.get("modelo")
+            )
+            self.checkpoint.guardar_seccion(
+                dim, dato["texto"], dato["fuentes"], True, dato.get("modelo")
+            )
+            self._condensar(dim, dato["texto"])
+            for clave in self.tokens:
+                self.tokens[clave] += dato.get(clave) or 0
+            self.traza.registrar(
+                f"dimension:{dim['num']}", self._inicios[i], time.time() - self._inicios[i],
+                nombre=dim["nombre"], **atributos_llamada(dato),
+            )
+        elif tipo == "error":
+            self.builder.agregar_seccion(dim, str(dato), [], False)
+            self.checkpoint.guardar_seccion(dim, str(dato), [], False)
+            self.traza.registrar(
+                f"dimension:{dim['num']}", self._inicios[i], time.time() - self._inicios[i],
+                nombre=dim["nombre"], error=f"{type(dato).__name__}: {dato}",
+            )
+        return (tipo, self._posicion[i], dato)
+
+    # ── Resumen ──
+    def resumen_guardado(self) -> bool:
+        return bool(self.datos["resumen"]) and not self.pendientes
+
+    def resumen_restaurado(self) -> tuple:
+        self.builder.set_resumen(self.datos["resumen"])
+        self.builder.registrar_modelo("resumen", self.checkpoint.modelo("resumen"))
+        return ("resumen_restaurado", None, self.datos["resumen"])
+
+    def guardar_resumen(self, resultado: dict) -> tuple:
+        if self.condensador.modelos:
+            self.builder.registrar_modelo(
+                "condensar", ", ".join(sorted(self.condensador.modelos))
+            )
+        self.builder.set_resumen(resultado["texto"])
+        self.builder.registrar_modelo("resumen", resultado["modelo"])
+        self.checkpoint.guardar_resumen(resultado["texto"], resultado["modelo"])
+        return ("resumen", None, resultado["texto"])
+
+    def cerrar(self, estado: str = "completado") -> tuple:
+        """Último evento: ("completado" | "cancelado", None, builder)."""
+        motivo = None
+        if estado == "cancelado":
+            motivo = self.client.cancelacion.motivo or "Cancelado"
+            self.builder.marcar_cancelado(motivo)
+        self.checkpoint.marcar_estado(estado)
+        self.traza.registrar(
+            "run", self.inicio, time.time() - self.inicio,
+            objetivo=self.objetivo, modelo=self.client.modelo, cancelado=motivo,
+            **self.builder.stats, **self.tokens,
+        )
+        metricas.escribir()
+        self.cerrado = True
+        return (estado, None, self.builder)
+
+
+def investigar(client, checkpoint: Checkpoint, stream: bool = False):
+    """
+    Ejecuta (o reanuda) el run descrito por `checkpoint` y emite eventos.
+    Todo lo completado se guarda en el checkpoint según termina.
+
+    Eventos (tuplas tipo, idx, dato); idx es la posición en las
+    dimensiones activas:
+      ("mega_inicio", None, None)        · ("dimensiones", None, dims_activas)
+      ("restaurada", idx, seccion)       · ("inicio"|"fragmento"|"fin"|"error", idx, …)
+      ("resumen_inicio", None, None)     · ("resumen", None, texto)
+      ("resumen_restaurado", None, texto) · ("resumen_error", None, excepción)
+      ("completado", None, builder)      · ("cancelado", None, builder)
+
+    Los ajustes del run (modelo, concurrencia, modos...) son los de
+    `client.ajustes`, fijos durante todo el run.
+
+    Con resumen, cada sección terminada se condensa en segundo plano
+    (resumen.Condensador) y el resumen final solo reduce esas notas.
+    Con `contexto_cache` la base común de las dimensiones se registra
+    como contexto compartido (cacheado en el servidor una vez) y cada
+    dimensión envía solo su rol y checklist. No aplica con arranque rápido: ahí
+    la base cambia a mitad del run.
+    En modo granular cada punto del checklist de una dimensión es una
+    llamada aparte y la sección es la fusión de sus respuestas.
+    Con `enrutado` cada etapa usa el modelo que le asigna el
+    enrutador (`client.para_etapa`); el informe recoge cuál atendió cada
+    etapa y cada sección.
+    Un fallo del mega-prompt se propaga como excepción. Cada etapa queda
+    como span en la traza del run (telemetry/<run_id>.jsonl).
+
+    Si se cancela `client.cancelacion`, las llamadas en vuelo se abandonan
+    y el último evento es "cancelado": el builder conserva las secciones
+    ya terminadas (también guardadas en el checkpoint, para reanudar).
+    """
+    run = _Run(client, checkpoint)
+    try:
+        yield from _investigar(run, stream)
+    except Cancelado:
+        yield run.cerrar("cancelado")
+    finally:
+        if not run.cerrado:  # falló o se abandonó: nadie recogerá el builder
+            run.builder.descartar()
+
+
+def _investigar(run: _Run, stream: bool):
+    client = run.client
+
+    # Mega-prompt: del checkpoint, primero (bloqueante) o en paralelo
+    resolver_prompt = None
+    mega_diferido = None
+    mega_base = run.mega_guardado()
+    if not mega_base and run.ajustes.arranque_rapido:
+        mega_diferido = MegaPromptDiferido(run.cliente_mega, run.objetivo)
+        mega_base = mega_diferido.base_actual()
+        resolver_prompt = mega_diferido.resolver_prompt
+    elif not mega_base:
+        yield ("mega_inicio", None, None)
+        with run.traza.span("mega_prompt", modelo=run.cliente_mega.modelo):
+            mega_base = generar_mega_prompt(run.cliente_mega, run.objetivo)
+        run.guardar_mega(mega_base)
+
+    cliente_dims, evento = run.preparar(mega_base, contexto=mega_diferido is None)
+    yield evento
+    yield from run.restauradas()
+
+    try:
+        for tipo, i, dato in ejecutar_dimensiones(
+            cliente_dims, run.pendientes, run.ajustes.max_concurrencia, resolver_prompt,
+            stream=stream,
+        ):
+            yield run.evento_dimension(tipo, i, dato)
+    finally:
+        if run.contexto:
+            run.contexto.liberar()
+    if mega_diferido and mega_diferido.listo:
+        run.guardar_mega(mega_diferido.base_actual())
+
+    # Resumen ejecutivo
+    if run.datos["incluir_resumen"]:
+        if run.resumen_guardado():
+            yield run.resumen_restaurado()
+        else:
+            yield ("resumen_inicio", None, None)
+            try:
+                with run.traza.span("resumen") as atributos:
+                    notas = reducir(
+                        client, run.objetivo, run.condensador.notas(),
+                        modelos=run.condensador.modelos,
+                    )
+                    resp_resumen = client.para_etapa("resumen").generar(
+                        construir_prompt_resumen(run.objetivo, notas)
+                    )
+                    atributos.update(atributos_llamada(resp_resumen))
+                yield run.guardar_resumen(resp_resumen)
+            except Exception as e:
+                yield ("resumen_error", None, e)
+
+    yield run.cerrar()
+
+
+async def ainvestigar(client, checkpoint: Checkpoint):
+    """
+    Equivalente asíncrono de `investigar`, con los mismos eventos y el
+    mismo checkpoint, sobre `client.agenerar`: muchos runs a la vez
+    comparten un solo event loop (p. ej. api.py). Sin streaming de
+    fragmentos ni arranque rápido (el mega-prompt siempre va primero).
+    Las condensaciones son tareas del loop; la rara fusión de notas que
+    no caben en el presupuesto va a un hilo, igual que las escrituras del
+    checkpoint, la traza y las métricas. La cancelación funciona igual
+    que en `investigar`.
+    """
+    run = _Run(client, checkpoint, asincrono=True)
+    try:
+        async for evento in _ainvestigar(run):
+            yield evento
+    except Cancelado:
+        yield await asyncio.to_thread(run.cerrar, "cancelado")
+    finally:
+        if not run.cerrado:
+            run.builder.descartar()
+
+
+async def _ainvestigar(run: _Run):
+    client = run.client
+
+    if not (mega_base := run.mega_guardado()):
+        yield ("mega_inicio", None, None)
+        async with run.traza.aspan("mega_prompt", modelo=run.cliente_mega.modelo):
+            mega_base = await agenerar_mega_prompt(run.cliente_mega, run.objetivo)
+        await asyncio.to_thread(run.guardar_mega, mega_base)
+
+    cliente_dims, evento = await asyncio.to_thread(run.preparar, mega_base, contexto=True)
+    yield evento
+    restauradas = run.restauradas()
+    while evento := await asyncio.to_thread(next, restauradas, None):
+        yield evento
+
+    eventos = aejecutar_dimensiones(
+        cliente_dims, run.pendientes, run.ajustes.max_concurrencia
+    )
+    try:
+        async for tipo, i, dato in eventos:
+            yield await asyncio.to_thread(run.evento_dimension, tipo, i, dato)
+    finally:
+        await eventos.aclose()
+        if run.contexto:
+            await asyncio.to_thread(run.contexto.liberar)
+
+    if run.datos["incluir_resumen"]:
+        if run.resumen_guardado():
+            yield run.resumen_restaurado()
+        else:
+            yield ("resumen_inicio", None, None)
+            try:
+                async with run.traza.aspan("resumen") as atributos:
+                    notas = run.condensador.notas()
+                    notas = await asyncio.to_thread(
+                        reducir, client, run.objetivo, notas,
+                        modelos=run.condensador.modelos,
+                    )
+                    resp_resumen = await client.para_etapa("resumen").agenerar(
+                        construir_prompt_resumen(run.objetivo, notas)
+                    )
+                    atributos.update(atributos_llamada(resp_resumen))
+                yield await asyncio.to_thread(run.guardar_resumen, resp_resumen)
+            except Exception as e:
+                yield ("resumen_error", None, e)
+
+    yield await asyncio.to_thread(run.cerrar)
@@ -0,0 +1,174 @@
+"""Limitador de cuota RPM/TPM compartido por todo el proceso (token bucket)."""
+
+import asyncio
+import hashlib
+import threading
+import time
+from config import Config
+
+
+class Reloj:
+    """Reloj real (monotónico)."""
+
+    def ahora(self) -> float:
+        return time.monotonic()
+
+    def dormir(self, segundos: float, cancelacion=None):
+        if cancelacion:
+            cancelacion.esperar(segundos)
+        else:
+            time.sleep(segundos)
+
+    async def adormir(self, segundos: float, cancelacion=None):
+        if cancelacion:
+            await cancelacion.aesperar(segundos)
+        else:
+            await asyncio.sleep(segundos)
+
+
+class RelojFalso(Reloj):
+    """Reloj simulado para pruebas: dormir avanza el tiempo al instante."""
+
+    def __init__(self, inicio: float = 0.0):
+        self.t = inicio
+        self._lock = threading.Lock()
+
+    def ahora(self) -> float:
+        with self._lock:
+            return self.t
+
+    def avanzar(self, segundos: float):
+        with self._lock:
+            self.t += segundos
+
+    def dormir(self, segundos: float, cancelacion=None):
+        if cancelacion:
+            cancelacion.comprobar()
+        self.avanzar(segundos)
+
+    async def adormir(self, segundos: float, cancelacion=None):
+        if cancelacion:
+            cancelacion.comprobar()
+        self.avanzar(segundos)
+        await asyncio.sleep(0)
+
+
+class TokenBucket:
+    """Cubo de capacidad fija que se rellena a ritmo constante."""
+
+    def __init__(self, capacidad: float, por_segundo: float, reloj: Reloj):
+        self.capacidad = capacidad
+        self.por_segundo = por_segundo
+        self.reloj = reloj
+        self.nivel = capacidad  # arranca lleno: permite ráfagas hasta la cuota
+        self._ultimo = reloj.ahora()
+
+    def _rellenar(self):
+        ahora = self.reloj.ahora()
+        self.nivel = min(
+            self.capacidad,
+            self.nivel + (ahora - self._ultimo) * self.por_segundo,
+        )
+        self._ultimo = ahora
+
+    def espera_para(self, cantidad: float) -> float:
+        """Segundos hasta poder consumir `cantidad` (0 si ya se puede)."""
+        self._rellenar()
+        cantidad = min(cantidad, self.capacidad)
+        if self.nivel >= cantidad:
+            return 0.0
+        return (cantidad - self.nivel) / self.por_segundo
+
+    def consumir(self, cantidad: float):
+        self.nivel -= min(cantidad, self.capacidad)
+
+    def redimensionar(self, capacidad: float, por_segundo: float):
+        """
+        Cambia capacidad y ritmo sin regalar cuota: lo rellenado hasta ahora
+        cuenta al ritmo anterior y el nivel nunca sube por el cambio.
+        """
+        self._rellenar()
+        self.capacidad = capacidad
+        self.por_segundo = por_segundo
+        self.nivel = min(self.nivel, capacidad)
+
+
+class LimitadorCuota:
+    """Peticiones por minuto + tokens de entrada por minuto."""
+
+    def __init__(self, rpm: int, tpm: int, reloj: Reloj | None = None):
+        self.reloj = reloj or Reloj()
+        self._lock = threading.Lock()
+        self.configurar(rpm, tpm)
+
+    def configurar(self, rpm: int, tpm: int):
+        """Cambia los límites conservando el consumo actual."""
+        with self._lock:
+            if getattr(self, "rpm", None) == rpm and self.tpm == tpm:
+                return
+            if getattr(self, "rpm", None) is None:
+                self.peticiones = TokenBucket(rpm, rpm / 60, self.reloj)
+                self.tokens = TokenBucket(tpm, tpm / 60, self.reloj)
+            else:
+                self.peticiones.redimensionar(rpm, rpm / 60)
+                self.tokens.redimensionar(tpm, tpm / 60)
+            self.rpm, self.tpm = rpm, tpm
+
+    def _reservar(self, tokens: int) -> float:
+        """Reserva si hay hueco; si no, devuelve cuánto esperar."""
+        with self._lock:
+            espera = max(
+                self.peticiones.espera_para(1),
+                self.tokens.espera_para(tokens),
+            )
+            if espera <= 0:
+                self.peticiones.consumir(1)
+                self.tokens.consumir(tokens)
+            return espera
+
+    def adquirir(self, tokens: int = 0, cancelacion=None):
+        """
+        Bloquea hasta que la petición cabe en la cuota. Con `cancelacion`
+        (cancelacion.TokenCancelacion) la espera se corta al cancelar.
+        """
+        while (espera := self._reservar(tokens)) > 0:
+            self.reloj.dormir(espera, cancelacion)
+
+    async def aadquirir(self, tokens: int = 0, cancelacion=None):
+        while (espera := self._reservar(tokens)) > 0:
+            await self.reloj.adormir(espera, cancelacion)
+
+    def ajustar(self, diferencia: int):
+        """Corrige la estimación con los tokens reales (puede dejar deuda)."""
+        with self._lock:
+            self.tokens._rellenar()
+            self.tokens.nivel -= diferencia
+
+
+def estimar_tokens(texto: str) -> int:
+    """Aproximación barata: ~4 caracteres por token."""
+    return len(texto) // 4 + 1
+
+
+# ── Registro por proceso ──
+_limitadores: dict[tuple[str, str], LimitadorCuota] = {}
+_registro_lock = threading.Lock()
+
+
+def obtener_limitador(api_key: str, modelo: str, rpm: int | None = None,
+                      tpm: int | None = None) -> LimitadorCuota:
+    """
+    Limitador compartido por todas las sesiones con la misma key y modelo.
+    La cuota es de la key: `rpm`/`tpm` (por defecto, los de Config)
+    actualizan la del limitador compartido.
+    """
+    rpm = rpm or Config.RPM_LIMIT
+    tpm = tpm or Config.TPM_LIMIT
+    clave = (hashlib.sha256(api_key.encode()).hexdigest()[:16], modelo)
+    with _registro_lock:
+        limitador = _limitadores.get(clave)
+        if limitador is None:
+            limitador = LimitadorCuota(rpm, tpm)
+            _limitadores[clave] = limitador
+    limitador.configurar(rpm, tpm)
+    return limitador
@@ -1,43 +1,189 @@
 """Generador de reportes en múltiples formatos."""
 
 import os
+import threading
+import uuid
+import weakref
+from contextlib import nullcontext
 from datetime import datetime
+from io import BytesIO
 from docx import Document
 from docx.shared import Inches, Pt, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH
-from config import Config
+from config import Ajustes, Config
+from markdown_docx import ConversorMarkdownDocx
+from telemetria import metricas
 
+_EXTENSIONES = {"markdown": "md", "texto": "txt", "docx": "docx"}
+_ETAPAS = {"mega_prompt": "Mega-prompt", "condensar": "Condensación", "resumen": "Resumen"}
+
+
+class _Borrador:
+    """Fichero temporal donde se van añadiendo trozos; cada uno se relee por posición."""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._f = open(ruta, "w+b")
+        self._lock = threading.Lock()
+
+    def anadir(self, texto: str) -> tuple[int, int]:
+        datos = texto.encode("utf-8")
+        with self._lock:
+            self._f.seek(0, os.SEEK_END)
+            posicion = (self._f.tell(), len(datos))
+            self._f.write(datos)
+        return posicion
+
+    def leer(self, posicion: tuple[int, int]) -> bytes:
+        offset, longitud = posicion
+        with self._lock:
+            self._f.seek(offset)
+            return self._f.read(longitud)
+
+    def cerrar(self):
+        self._f.close()
+        if os.path.exists(self.ruta):
+            os.remove(self.ruta)
 
-class ReportBuilder:
-    """Construye reportes en Markdown, DOCX y TXT."""
 
-    def __init__(self, objetivo: str):
+class ReportBuilder:
+    """
+    Construye reportes en Markdown, DOCX y TXT.
+
+    `ajustes` son los del run (por defecto, los de Config): dan el modelo
+    principal y si el informe es incremental.
+
+    En modo incremental cada sección se renderiza al llegar y se vuelca
+    a un borrador en REPORTS_DIR; en memoria solo quedan sus metadatos.
+    Índice, resumen y metadata se escriben al finalizar, copiando las
+    secciones del borrador una a una en orden canónico. El borrador dura
+    lo que el builder (se borra al liberarlo o con `descartar()`), así que
+    un cambio posterior vuelve a componer los ficheros finales.
+
+    La metadata recoge el modelo que atendió cada etapa y cada sección
+    (con enrutado por etapa pueden ser distintos del principal).
+
+    Los ficheros (borrador y finales) llevan `run_id` en el nombre, así que
+    dos runs con el mismo objetivo nunca comparten ficheros; sin `run_id`
+    se genera uno.
+    """
+
+    def __init__(self, objetivo: str, timestamp: datetime | None = None,
+                 traza=None, ajustes: Ajustes | None = None,
+                 run_id: str | None = None):
+        ajustes = ajustes or Ajustes.desde_config()
         self.objetivo = objetivo
+        self.modelo = ajustes.modelo  # principal
+        self.modelos: dict[str, str] = {}  # etapa → modelo(s)
+        self.traza = traza  # telemetria.Traza opcional para medir exports
         self.secciones: list[dict] = []
         self.resumen = ""
-        self.timestamp = datetime.now()
-
-        # Crear directorio de reportes
-        os.makedirs(Config.REPORTS_DIR, exist_ok=True)
+        self.cancelado: str | None = None  # motivo, si el run se canceló
+        # Al reanudar un run se conservan su fecha y su run_id (y sus ficheros)
+        self.timestamp = timestamp or datetime.now()
+        self.run_id = run_id or (
+            f"{self.timestamp.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        )
+        self._renders: dict | None = None
+
+        self.incremental = ajustes.incremental
+        self._borrador: _Borrador | None = None
+        self._rutas: dict | None = None  # finales al día (modo incremental)
+        self._lock_final = threading.Lock()
+        self._borrar = None
+        if self.incremental:
+            os.makedirs(Config.REPORTS_DIR, exist_ok=True)
+            self._borrador = _Borrador(os.path.join(
+                Config.REPORTS_DIR, self._nombre_archivo("parcial")
+            ))
+            self._borrar = weakref.finalize(self, self._borrador.cerrar)
 
     def agregar_seccion(self, dimension: dict, contenido: str,
-                        fuentes: list[str], exito: bool):
-        """Agrega una sección completada."""
-        self.secciones.append({
+                        fuentes: list[str], exito: bool, modelo: str | None = None):
+        """Agrega una sección completada (en orden canónico de dimensión)."""
+        seccion = {
             "dimension": dimension,
             "contenido": contenido,
             "fuentes": fuentes,
             "exito": exito,
-        })
+            "caracteres": len(contenido),
+            "modelo": modelo,
+        }
+        if self._borrador:
+            seccion["partes"] = {
+                "contenido": self._borrador.anadir(contenido),
+                "markdown": self._borrador.anadir(self._md_seccion(seccion) + "\n"),
+                "texto": self._borrador.anadir(self._txt_seccion(seccion) + "\n"),
+            }
+            del seccion["contenido"]
+        self.secciones.append(seccion)
+        # Con ejecución concurrente las secciones llegan en cualquier orden
+        self.secciones.sort(key=lambda s: s["dimension"]["num"])
+        self._invalidar()
 
     def set_resumen(self, resumen: str):
         self.resumen = resumen
+        self._invalidar()
+
+    def marcar_cancelado(self, motivo: str):
+        """El run se canceló: el informe es parcial (solo lo ya terminado)."""
+        self.cancelado = motivo or "Cancelado"
+        self._invalidar()
+
+    def registrar_modelo(self, etapa: str, modelo: str | None):
+        """Modelo que atendió una etapa (mega_prompt, condensar, resumen)."""
+        if modelo:
+            self.modelos[etapa] = modelo
+            self._invalidar()
+
+    def _invalidar(self):
+        """Renders y ficheros finales dejan de estar al día."""
+        self._renders = None
+        self._rutas = None
+
+    def descartar(self):
+        """Borra el borrador del modo incremental (run fallido o builder ya usado)."""
+        if self._borrar:
+            self._borrar()
+
+    def iterar_secciones(self):
+        """Secciones en orden con su contenido (en incremental se lee del borrador una a una)."""
+        for s in self.secciones:
+            if "contenido" in s:
+                yield s
+            else:
+                yield {**s, "contenido": self._leer(s, "contenido").decode("utf-8")}
+
+    def _leer(self, seccion: dict, parte: str) -> bytes:
+        return self._borrador.leer(seccion["partes"][parte])
+
+    # ── Modelos ──
+    def modelos_usados(self) -> list[str]:
+        """Modelos distintos que intervinieron, el principal primero."""
+        usados = [self.modelo, *self.modelos.values()]
+        usados += [s["modelo"] for s in self.secciones if s["modelo"]]
+        return list(dict.fromkeys(
+            m.strip() for grupo in usados for m in grupo.split(",")
+        ))
+
+    def _lineas_modelos(self) -> list[str]:
+        lineas = [
+            f"- Modelo {_ETAPAS.get(etapa, etapa)}: {modelo}"
+            for etapa, modelo in self.modelos.items()
+        ]
+        por_seccion = [
+            f"{s['dimension']['num']} {s['modelo']}"
+            for s in self.secciones if s["modelo"]
+        ]
+        if por_seccion:
+            lineas.append(f"- Modelo por sección: {' · '.join(por_seccion)}")
+        return lineas
 
     # ── Estadísticas ──
     @property
     def stats(self) -> dict:
         exitosas = sum(1 for s in self.secciones if s["exito"])
-        total_chars = sum(len(s["contenido"]) for s in self.secciones)
+        total_chars = sum(s["caracteres"] for s in self.secciones)
         return {
             "exitosas": exitosas,
             "total": len(self.secciones),
@@ -47,13 +193,19 @@ class ReportBuilder:
     # ── Exportar Markdown ──
     def exportar_markdown(self) -> str:
         """Genera el informe completo en Markdown."""
+        return "\n".join([
+            self._md_cabecera(),
+            *(self._md_seccion(s) for s in self.iterar_secciones()),
+            self._md_cierre(),
+        ])
 
+    def _md_cabecera(self) -> str:
         lineas = [
             f"# 🔬 MEGA INFORME DE INVESTIGACIÓN PROFUNDA",
             f"",
             f"**Objetivo:** {self.objetivo}",
             f"**Fecha:** {self.timestamp.strftime('%d/%m/%Y %H:%M')}",
-            f"**Modelo:** {Config.MODEL}",
+            f"**Modelo:** {', '.join(self.modelos_usados())}",
             f"**Versión:** Deep Research v{Config.VERSION}",
             f"",
             f"---",
@@ -69,24 +221,29 @@ class ReportBuilder:
             )
 
         lineas.extend(["", "---", ""])
+        return "\n".join(lineas)
 
-        for s in self.secciones:
-            d = s["dimension"]
-            lineas.extend([
-                f"## {d['emoji']} Sección {d['num']}: {d['nombre']}",
-                f"",
-                s["contenido"],
-                f"",
-            ])
+    @staticmethod
+    def _md_seccion(s: dict) -> str:
+        d = s["dimension"]
+        lineas = [
+            f"## {d['emoji']} Sección {d['num']}: {d['nombre']}",
+            f"",
+            s["contenido"],
+            f"",
+        ]
 
-            if s["fuentes"]:
-                lineas.append("### 📚 Fuentes")
-                for f in s["fuentes"]:
-                    lineas.append(f"- {f}")
-                lineas.append("")
+        if s["fuentes"]:
+            lineas.append("### 📚 Fuentes")
+            for f in s["fuentes"]:
+                lineas.append(f"- {f}")
+            lineas.append("")
 
-            lineas.extend(["---", ""])
+        lineas.extend(["---", ""])
+        return "\n".join(lineas)
 
+    def _md_cierre(self) -> str:
+        lineas = []
         if self.resumen:
             lineas.extend([
                 "## 📋 RESUMEN EJECUTIVO INTEGRADO",
@@ -102,36 +259,48 @@ class ReportBuilder:
             "## 📊 Metadata",
             f"- Secciones exitosas: {stats['exitosas']}/{stats['total']}",
             f"- Caracteres totales: {stats['caracteres']:,}",
-            f"- Modelo: {Config.MODEL}",
+            *([f"- ⛔ Informe parcial: {self.cancelado}"] if self.cancelado else []),
+            f"- Modelo principal: {self.modelo}",
+            *self._lineas_modelos(),
             f"- Generado: {self.timestamp.strftime('%d/%m/%Y %H:%M')}",
         ])
-
         return "\n".join(lineas)
 
     # ── Exportar TXT (para alimentar IA) ──
     def exportar_texto_plano(self) -> str:
         """Texto limpio optimizado para LLMs."""
-        partes = [
+        return "\n".join([
+            self._txt_cabecera(),
+            *(self._txt_seccion(s) for s in self.iterar_secciones()),
+            self._txt_cierre(),
+        ])
+
+    def _txt_cabecera(self) -> str:
+        return "\n".join([
             "═" * 50,
             "MEGA INFORME DE INVESTIGACIÓN PROFUNDA",
             "═" * 50,
             "",
             f"OBJETIVO: {self.objetivo}",
             f"FECHA: {self.timestamp.strftime('%d/%m/%Y %H:%M')}",
+            *([f"INFORME PARCIAL: {self.cancelado}"] if self.cancelado else []),
             "",
-        ]
+        ])
 
-        for s in self.secciones:
-            d = s["dimension"]
-            partes.extend([
-                "─" * 50,
-                f"SECCIÓN {d['num']}: {d['nombre']}",
-                "─" * 50,
-                "",
-                s["contenido"],
-                "",
-            ])
+    @staticmethod
+    def _txt_seccion(s: dict) -> str:
+        d = s["dimension"]
+        return "\n".join([
+            "─" * 50,
+            f"SECCIÓN {d['num']}: {d['nombre']}",
+            "─" * 50,
+            "",
+            s["contenido"],
+            "",
+        ])
 
+    def _txt_cierre(self) -> str:
+        partes = []
         if self.resumen:
             partes.extend([
                 "─" * 50,
@@ -142,12 +311,11 @@ class ReportBuilder:
             ])
 
         partes.extend(["", "═" * 50, "FIN DEL INFORME", "═" * 50])
-
         return "\n".join(partes)
 
     # ── Exportar DOCX ──
-    def exportar_docx(self) -> str:
-        """Genera archivo Word y retorna la ruta."""
+    def exportar_docx(self) -> bytes:
+        """Genera el documento Word en memoria y retorna sus bytes."""
         doc = Document()
 
         # Portada
@@ -163,80 +331,127 @@ class ReportBuilder:
 
         doc.add_paragraph(
             f"Fecha: {self.timestamp.strftime('%d/%m/%Y')} | "
-            f"Modelo: {Config.MODEL}"
+            f"Modelo: {', '.join(self.modelos_usados())}"
         ).alignment = WD_ALIGN_PARAGRAPH.CENTER
+        if self.cancelado:
+            doc.add_paragraph(
+                f"Informe parcial: {self.cancelado}"
+            ).alignment = WD_ALIGN_PARAGRAPH.CENTER
 
         doc.add_page_break()
 
         # Secciones
-        for s in self.secciones:
+        conversor = ConversorMarkdownDocx(doc)
+        for s in self.iterar_secciones():
             d = s["dimension"]
             doc.add_heading(
                 f"{d['emoji']} {d['nombre']}", level=1
             )
 
-            for parrafo in s["contenido"].split("\n"):
-                parrafo = parrafo.strip()
-                if not parrafo:
-                    continue
-                if parrafo.startswith("### "):
-                    doc.add_heading(parrafo[4:], level=3)
-                elif parrafo.startswith("## "):
-                    doc.add_heading(parrafo[3:], level=2)
-                elif parrafo.startswith("# "):
-                    doc.add_heading(parrafo[2:], level=2)
-                elif parrafo.startswith(("- ", "* ")):
-                    doc.add_paragraph(parrafo[2:], style="List Bullet")
-                else:
-                    doc.add_paragraph(parrafo)
-
+            conversor.convertir(s["contenido"])
             doc.add_page_break()
 
         # Resumen
         if self.resumen:
             doc.add_heading("📋 RESUMEN EJECUTIVO", level=1)
-            for p in self.resumen.split("\n"):
-                if p.strip():
-                    doc.add_paragraph(p)
+            conversor.convertir(self.resumen)
+
+        buffer = BytesIO()
+        doc.save(buffer)
+        return buffer.getvalue()
+
+    # ── Renderizar y guardar ──
+    def renderizar(self) -> dict:
+        """
+        Genera cada formato una sola vez, en memoria:
+        {"markdown": str, "texto": str, "docx": bytes}. Se reutiliza
+        hasta que cambien las secciones o el resumen. En modo incremental
+        finaliza los ficheros y los carga.
+        """
+        if self._renders is None:
+            if self.incremental:
+                rutas = self._finalizar()
+                renders = {}
+                for formato, ruta in rutas.items():
+                    with open(ruta, "rb") as f:
+                        renders[formato] = f.read()
+                renders["markdown"] = renders["markdown"].decode("utf-8")
+                renders["texto"] = renders["texto"].decode("utf-8")
+                self._renders = renders
+                return renders
+            renders = {}
+            with self._span("exportar:markdown"):
+                renders["markdown"] = self.exportar_markdown()
+            with self._span("exportar:texto"):
+                renders["texto"] = self.exportar_texto_plano()
+            with self._span("exportar:docx"):
+                renders["docx"] = self.exportar_docx()
+            self._renders = renders
+            if self.traza:
+                metricas.escribir()
+        return self._renders
 
-        # Guardar
-        nombre = self._nombre_archivo("docx")
-        ruta = os.path.join(Config.REPORTS_DIR, nombre)
-        doc.save(ruta)
-        return ruta
-
-    # ── Guardar archivos ──
     def guardar_todo(self) -> dict:
-        """Guarda en todos los formatos y retorna rutas."""
-        rutas = {}
-
-        # Markdown
-        md = self.exportar_markdown()
-        ruta_md = os.path.join(
-            Config.REPORTS_DIR, self._nombre_archivo("md")
-        )
-        with open(ruta_md, "w", encoding="utf-8") as f:
-            f.write(md)
-        rutas["markdown"] = ruta_md
-
-        # Texto plano
-        txt = self.exportar_texto_plano()
-        ruta_txt = os.path.join(
-            Config.REPORTS_DIR, self._nombre_archivo("txt")
-        )
-        with open(ruta_txt, "w", encoding="utf-8") as f:
-            f.write(txt)
-        rutas["texto"] = ruta_txt
+        """Escribe los formatos renderizados en REPORTS_DIR y retorna rutas."""
+        if self.incremental:
+            return self._finalizar()
+        rutas = self._rutas_finales()
+        self._escribir(self.renderizar(), rutas)
+        return rutas
 
-        # DOCX
-        rutas["docx"] = self.exportar_docx()
+    def _rutas_finales(self) -> dict:
+        return {
+            formato: os.path.join(Config.REPORTS_DIR, self._nombre_archivo(ext))
+            for formato, ext in _EXTENSIONES.items()
+        }
 
+    def _escribir(self, renders: dict, rutas: dict):
+        with self._span("guardar_reportes"):
+            os.makedirs(Config.REPORTS_DIR, exist_ok=True)
+            for formato, ruta in rutas.items():
+                contenido = renders[formato]
+                if isinstance(contenido, str):
+                    contenido = contenido.encode("utf-8")
+                with open(ruta, "wb") as f:
+                    f.write(contenido)
+
+    def _finalizar(self) -> dict:
+        """Compone los ficheros finales desde el borrador si no están al día."""
+        with self._lock_final:
+            if not self._rutas:
+                self._rutas = self._componer_todo()
+        return self._rutas
+
+    def _componer_todo(self) -> dict:
+        rutas = self._rutas_finales()
+        with self._span("exportar:markdown"):
+            self._componer(rutas["markdown"], "markdown",
+                           self._md_cabecera(), self._md_cierre())
+        with self._span("exportar:texto"):
+            self._componer(rutas["texto"], "texto",
+                           self._txt_cabecera(), self._txt_cierre())
+        with self._span("exportar:docx"):
+            with open(rutas["docx"], "wb") as f:
+                f.write(self.exportar_docx())
+        if self.traza:
+            metricas.escribir()
         return rutas
 
+    def _componer(self, ruta: str, formato: str, cabecera: str, cierre: str):
+        tmp = f"{ruta}.tmp"
+        with open(tmp, "wb") as f:
+            f.write((cabecera + "\n").encode("utf-8"))
+            for s in self.secciones:
+                f.write(self._leer(s, formato))
+            f.write(cierre.encode("utf-8"))
+        os.replace(tmp, ruta)
+
+    def _span(self, nombre: str):
+        return self.traza.span(nombre) if self.traza else nullcontext()
+
     def _nombre_archivo(self, extension: str) -> str:
         slug = self.objetivo[:40].replace(" ", "_")
         slug = "".join(
             c for c in slug if c.isalnum() or c == "_"
         )
-        fecha = self.timestamp.strftime("%Y%m%d_%H%M")
-        return f"informe_{slug}_{fecha}.{extension}"
+        return f"informe_{slug}_{self.run_id}.{extension}"
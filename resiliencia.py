@@ -0,0 +1,151 @@
+"""Clasificación de errores de la API y circuit breaker por estrategia."""
+
+import re
+import threading
+import time
+from config import Config
+
+REINTENTABLE = "reintentable"
+CUOTA = "cuota"
+ESTRATEGIA = "estrategia"
+FATAL = "fatal"
+
+# Abortan toda la llamada: credenciales y bloqueos de contenido
+_CODIGOS_FATALES = {401, 403}
+_NOMBRES_FATALES = {
+    "PermissionDenied", "Unauthenticated",
+    "BlockedPromptException", "StopCandidateException",
+}
+# No se arreglan reintentando, pero solo descartan la estrategia actual
+# (p. ej. "Search Grounding is not supported" → se pasa al modelo base)
+_CODIGOS_ESTRATEGIA = {400, 404}
+_NOMBRES_ESTRATEGIA = {"InvalidArgument", "NotFound"}
+_TEXTOS_FATALES = (
+    "api key not valid", "api_key_invalid", "permission denied",
+    "safety", "blocked", "prohibited_content",
+)
+
+
+class ErrorFatal(Exception):
+    """Error que no se arregla reintentando (key inválida, contenido bloqueado...)."""
+
+
+class ErrorEstrategia(Exception):
+    """La estrategia no sirve para esta llamada (400/404): se pasa a la siguiente."""
+
+
+def _codigo(error: Exception) -> int | None:
+    codigo = getattr(error, "code", None)
+    codigo = getattr(codigo, "value", codigo)  # grpc.StatusCode → (int, str)
+    if isinstance(codigo, tuple):
+        codigo = codigo[0]
+    return codigo if isinstance(codigo, int) else None
+
+
+def clasificar_error(error: Exception) -> str:
+    """reintentable · cuota · estrategia · fatal."""
+    if isinstance(error, ErrorFatal):
+        return FATAL
+    codigo = _codigo(error)
+    nombre = type(error).__name__
+    texto = str(error).lower()
+
+    if codigo == 429 or nombre in ("ResourceExhausted", "TooManyRequests") \
+            or "quota" in texto or "resource_exhausted" in texto:
+        return CUOTA
+    if codigo in _CODIGOS_FATALES or nombre in _NOMBRES_FATALES \
+            or any(t in texto for t in _TEXTOS_FATALES):
+        return FATAL
+    if codigo in _CODIGOS_ESTRATEGIA or nombre in _NOMBRES_ESTRATEGIA:
+        return ESTRATEGIA
+    return REINTENTABLE
+
+
+def retraso_sugerido(error: Exception) -> float | None:
+    """Retraso que propone el servidor (RetryInfo / Retry-After), si lo hay."""
+    for detalle in getattr(error, "details", None) or ():
+        retry_delay = getattr(detalle, "retry_delay", None)
+        if retry_delay is not None:
+            segundos = getattr(retry_delay, "seconds", 0)
+            nanos = getattr(retry_delay, "nanos", 0)
+            return segundos + nanos / 1e9
+
+    respuesta = getattr(error, "response", None)
+    cabecera = getattr(respuesta, "headers", {}).get("Retry-After") if respuesta else None
+    if cabecera and cabecera.replace(".", "", 1).isdigit():
+        return float(cabecera)
+
+    texto = str(error)
+    coincidencia = (
+        re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", texto)
+        or re.search(r"retry in ([\d.]+)\s*s", texto, re.IGNORECASE)
+    )
+    return float(coincidencia.group(1)) if coincidencia else None
+
+
+class CircuitBreaker:
+    """
+    cerrado → (N fallos seguidos) → abierto → (tras enfriamiento) →
+    semiabierto: deja pasar una llamada de prueba; si sale bien se cierra,
+    si falla vuelve a abrirse.
+    """
+
+    def __init__(self, nombre: str, umbral: int | None = None,
+                 enfriamiento: float | None = None, reloj=time.monotonic):
+        self.nombre = nombre
+        self.umbral = umbral or Config.BREAKER_THRESHOLD
+        self.enfriamiento = enfriamiento or Config.BREAKER_COOLDOWN
+        self.reloj = reloj
+        self.estado = "cerrado"
+        self.fallos = 0
+        self._abierto_desde = 0.0
+        self._prueba_en_vuelo = False
+        self._lock = threading.Lock()
+
+    def permitir(self) -> bool:
+        with self._lock:
+            if self.estado == "cerrado":
+                return True
+            if self.estado == "abierto":
+                if self.reloj() - self._abierto_desde < self.enfriamiento:
+                    return False
+                self.estado = "semiabierto"
+                self._prueba_en_vuelo = False
+            if self._prueba_en_vuelo:
+                return False
+            self._prueba_en_vuelo = True
+            return True
+
+    def registrar_exito(self):
+        with self._lock:
+            self.estado = "cerrado"
+            self.fallos = 0
+            self._prueba_en_vuelo = False
+
+    def liberar(self):
+        """La llamada se abandonó sin resultado: no cuenta ni a favor ni en contra."""
+        with self._lock:
+            self._prueba_en_vuelo = False
+
+    def registrar_fallo(self):
+        with self._lock:
+            self.fallos += 1
+            if self.estado == "semiabierto" or self.fallos >= self.umbral:
+                if self.estado != "abierto":
+                    print(f"   🔌 Circuito '{self.nombre}' abierto")
+                self.estado = "abierto"
+                self._abierto_desde = self.reloj()
+                self._prueba_en_vuelo = False
+
+
+_breakers: dict[tuple[str, str], CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def obtener_breaker(modelo: str, estrategia: str) -> CircuitBreaker:
+    """Un breaker por (modelo, estrategia) para todo el proceso."""
+    with _breakers_lock:
+        clave = (modelo, estrategia)
+        if clave not in _breakers:
+            _breakers[clave] = CircuitBreaker(f"{estrategia} · {modelo}")
+        return _breakers[clave]
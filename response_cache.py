@@ -0,0 +1,166 @@
+"""Caché persistente (SQLite) de respuestas de Gemini con TTL y desalojo LRU."""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+from config import Config
+
+
+class CacheRespuestas:
+    """
+    Guarda {texto, fuentes, metodo} por hash de prompt + parámetros; las
+    respuestas con Google Search llevan además la fecha en la clave, así
+    que no se reutilizan de un día para otro aunque el TTL lo permita.
+    Cada operación abre su propia conexión (WAL), así que es segura entre
+    hilos, sesiones de Streamlit y procesos que compartan el fichero.
+    """
+
+    def __init__(self, ruta: str | None = None,
+                 ttl_search: int | None = None, ttl_base: int | None = None,
+                 max_bytes: int | None = None, reloj=time.time):
+        self.ruta = ruta or Config.CACHE_PATH
+        self.ttl_search = ttl_search if ttl_search is not None else Config.CACHE_TTL_SEARCH
+        self.ttl_base = ttl_base if ttl_base is not None else Config.CACHE_TTL_BASE
+        self.max_bytes = max_bytes if max_bytes is not None else Config.CACHE_MAX_MB * 1024 * 1024
+        self.reloj = reloj
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+        with self._conectar() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS respuestas (
+                    clave TEXT PRIMARY KEY,
+                    texto TEXT NOT NULL,
+                    fuentes TEXT NOT NULL,
+                    metodo TEXT NOT NULL,
+                    con_search INTEGER NOT NULL,
+                    creado REAL NOT NULL,
+                    ultimo_acceso REAL NOT NULL,
+                    tamano INTEGER NOT NULL
+                )
+            """)
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS idx_lru ON respuestas(ultimo_acceso)"
+            )
+
+    @contextmanager
+    def _conectar(self):
+        con = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+        try:
+            yield con
+        finally:
+            con.close()
+
+    @staticmethod
+    def clave(prompt: str, modelo: str, temperatura: float,
+              max_tokens: int, con_search: bool) -> str:
+        material = json.dumps(
+            [hashlib.sha256(prompt.encode()).hexdigest(),
+             modelo, temperatura, max_tokens, con_search]
+            + ([date.today().isoformat()] if con_search else [])
+        )
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def obtener(self, clave: str) -> dict | None:
+        """Devuelve el resultado si existe y no ha caducado."""
+        ahora = self.reloj()
+        with self._conectar() as con:
+            fila = con.execute(
+                "SELECT texto, fuentes, metodo, con_search, creado "
+                "FROM respuestas WHERE clave = ?", (clave,)
+            ).fetchone()
+            if fila:
+                texto, fuentes, metodo, con_search, creado = fila
+                ttl = self.ttl_search if con_search else self.ttl_base
+                if ahora - creado <= ttl:
+                    con.execute(
+                        "UPDATE respuestas SET ultimo_acceso = ? WHERE clave = ?",
+                        (ahora, clave),
+                    )
+                    self._contar(hit=True)
+                    return {
+                        "texto": texto,
+                        "fuentes": json.loads(fuentes),
+                        "metodo": metodo,
+                        "cache": True,
+                    }
+                con.execute("DELETE FROM respuestas WHERE clave = ?", (clave,))
+
+        self._contar(hit=False)
+        return None
+
+    def guardar(self, clave: str, resultado: dict, con_search: bool):
+        ahora = self.reloj()
+        fuentes = json.dumps(resultado["fuentes"], ensure_ascii=False)
+        tamano = len(resultado["texto"].encode()) + len(fuentes.encode())
+        with self._conectar() as con:
+            con.execute("BEGIN IMMEDIATE")
+            con.execute(
+                "INSERT OR REPLACE INTO respuestas VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (clave, resultado["texto"], fuentes, resultado["metodo"],
+                 int(con_search), ahora, ahora, tamano),
+            )
+            self._desalojar(con)
+            con.execute("COMMIT")
+
+    def _desalojar(self, con: sqlite3.Connection):
+        """Borra las entradas menos usadas hasta quedar bajo el límite."""
+        total = con.execute(
+            "SELECT COALESCE(SUM(tamano), 0) FROM respuestas"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        borrar = []
+        for clave, tamano in con.execute(
+            "SELECT clave, tamano FROM respuestas ORDER BY ultimo_acceso"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            borrar.append((clave,))
+            total -= tamano
+        con.executemany("DELETE FROM respuestas WHERE clave = ?", borrar)
+
+    def _contar(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def vaciar(self):
+        with self._conectar() as con:
+            con.execute("DELETE FROM respuestas")
+
+    @property
+    def stats(self) -> dict:
+        with self._conectar() as con:
+            entradas, tamano = con.execute(
+                "SELECT COUNT(*), COALESCE(SUM(tamano), 0) FROM respuestas"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entradas": entradas,
+            "bytes": tamano,
+        }
+
+
+_caches: dict[str, CacheRespuestas] = {}
+_caches_lock = threading.Lock()
+
+
+def obtener_cache(ruta: str | None = None) -> CacheRespuestas:
+    """Instancia compartida por proceso (los contadores son globales)."""
+    ruta = ruta or Config.CACHE_PATH
+    with _caches_lock:
+        if ruta not in _caches:
+            _caches[ruta] = CacheRespuestas(ruta)
+        return _caches[ruta]
@@ -0,0 +1,232 @@
+"""
+Resumen ejecutivo map-reduce.
+
+map: cada sección se condensa en una nota con su propia llamada en cuanto
+termina, solapándose con las dimensiones que siguen en curso.
+reduce: el resumen final parte de esas notas; si no caben en el
+presupuesto de tokens se fusionan por parejas (otra ronda de llamadas en
+paralelo) hasta que caben. Las secciones cuya nota aún no está (las
+últimas en terminar) entran como extracto recortado al presupuesto, para
+no añadir una llamada más tras la última dimensión.
+
+Condensar y fusionar son la etapa "condensar" del enrutador: cada llamada
+va al modelo que le asigne (uno barato por defecto).
+"""
+
+import asyncio
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from cancelacion import Cancelado
+from config import Config
+from rate_limiter import estimar_tokens
+from telemetria import atributos_llamada
+
+_pool_condensar = ThreadPoolExecutor(
+    max_workers=max(1, Config.SUMMARY_WORKERS), thread_name_prefix="condensar"
+)
+# Condensaciones asíncronas en curso: el event loop solo guarda referencias
+# débiles a sus tareas, y una nota puede seguir tras terminar el run
+_tareas_en_vuelo: set[asyncio.Task] = set()
+
+
+def recortar(texto: str, tokens: int) -> str:
+    """Corta a ~`tokens` (4 caracteres por token), marcando el corte."""
+    limite = max(0, tokens) * 4
+    return texto if len(texto) <= limite else texto[:limite].rstrip() + "..."
+
+
+def prompt_condensar(objetivo: str, titulo: str, contenido: str) -> str:
+    return (
+        f'Eres un analista senior preparando notas para un resumen ejecutivo.\n\n'
+        f'OBJETIVO: "{objetivo}"\n\n'
+        f'SECCIÓN: {titulo}\n\n{contenido}\n\n'
+        f'Condensa la sección en un máximo de {Config.SUMMARY_NOTE_WORDS} palabras: '
+        f'hallazgos clave, cifras con su fuente, riesgos, oportunidades y '
+        f'recomendaciones accionables. Solo viñetas, sin introducción.'
+    )
+
+
+def prompt_fusionar(objetivo: str, notas: list[tuple[str, str]]) -> str:
+    bloques = "\n\n".join(f"**{titulo}:**\n{nota}" for titulo, nota in notas)
+    return (
+        f'OBJETIVO: "{objetivo}"\n\n{bloques}\n\n'
+        f'Fusiona estas notas en una sola de máximo {Config.SUMMARY_NOTE_WORDS} '
+        f'palabras, sin perder cifras ni riesgos. Solo viñetas.'
+    )
+
+
+def construir_prompt_resumen(objetivo: str, notas: list[tuple[str, str]]) -> str:
+    """Prompt del resumen ejecutivo a partir de las notas condensadas."""
+    extractos = "\n\n".join(f"**{titulo}:**\n{nota}" for titulo, nota in notas)
+    return (
+        f'Eres un consultor ejecutivo de élite.\n\n'
+        f'OBJETIVO: "{objetivo}"\n\n'
+        f'Notas condensadas de {len(notas)} dimensiones:\n\n{extractos}\n\n'
+        f'GENERA UN RESUMEN EJECUTIVO con:\n'
+        f'1. CONCLUSIÓN PRINCIPAL\n'
+        f'2. 10 INSIGHTS MÁS IMPORTANTES\n'
+        f'3. PLAN DE ACCIÓN (5 pasos inmediatos)\n'
+        f'4. DECISIÓN CRÍTICA\n'
+        f'5. VENTAJA COMPETITIVA\n'
+        f'6. MAYOR RIESGO + mitigación\n'
+        f'7. OPORTUNIDAD DORADA\n'
+        f'8. PREDICCIÓN a 12 meses\n\n'
+        f'Sé directo y accionable.'
+    )
+
+
+class Condensador:
+    """
+    Condensa secciones en segundo plano según terminan. Las notas se
+    guardan en el checkpoint, así que al reanudar no se repiten.
+    `modelos` acumula los modelos que atendieron las condensaciones.
+    `aenviar` es la variante para el pipeline asíncrono: la condensación
+    es una tarea del event loop en vez de un hilo del pool.
+    """
+
+    def __init__(self, client, objetivo: str, checkpoint=None, traza=None):
+        self.client = client
+        self.objetivo = objetivo
+        self.checkpoint = checkpoint
+        self.traza = traza
+        self._futuros: dict[int, tuple[str, Future]] = {}
+        self._contenidos: dict[int, str] = {}  # solo mientras se condensan
+        self.modelos: set[str] = set()
+
+    def enviar(self, dimension: dict, contenido: str):
+        self._registrar(dimension, contenido, lambda titulo: _pool_condensar.submit(
+            self._condensar, dimension, titulo, contenido
+        ))
+
+    def aenviar(self, dimension: dict, contenido: str):
+        """Como `enviar`, desde el event loop del pipeline asíncrono."""
+        def lanzar(titulo):
+            tarea = asyncio.ensure_future(self._acondensar(dimension, titulo, contenido))
+            _tareas_en_vuelo.add(tarea)
+            tarea.add_done_callback(_tareas_en_vuelo.discard)
+            return tarea
+
+        self._registrar(dimension, contenido, lanzar)
+
+    def _registrar(self, dimension: dict, contenido: str, lanzar):
+        num = dimension["num"]
+        titulo = f"{dimension['emoji']} {dimension['nombre']}"
+        guardada = self.checkpoint.nota(num) if self.checkpoint else None
+        if guardada:
+            futuro = Future()
+            futuro.set_result(guardada)
+        else:
+            self._contenidos[num] = contenido
+            futuro = lanzar(titulo)
+            futuro.add_done_callback(lambda _, num=num: self._contenidos.pop(num, None))
+        self._futuros[num] = (titulo, futuro)
+
+    def _condensar(self, dimension: dict, titulo: str, contenido: str) -> str:
+        inicio = time.time()
+        cliente = self.client.para_etapa("condensar")
+        try:
+            resultado = cliente.generar(
+                prompt_condensar(self.objetivo, titulo, contenido), con_search=False
+            )
+        except (Exception, Cancelado) as e:
+            return self._sin_nota(dimension, contenido, inicio, e)
+        return self._nota(dimension, resultado, inicio)
+
+    async def _acondensar(self, dimension: dict, titulo: str, contenido: str) -> str:
+        inicio = time.time()
+        cliente = self.client.para_etapa("condensar")
+        try:
+            resultado = await cliente.agenerar(
+                prompt_condensar(self.objetivo, titulo, contenido), con_search=False
+            )
+        except (Exception, Cancelado) as e:
+            return await asyncio.to_thread(self._sin_nota, dimension, contenido, inicio, e)
+        # Checkpoint y traza escriben a disco: fuera del event loop
+        return await asyncio.to_thread(self._nota, dimension, resultado, inicio)
+
+    def _sin_nota(self, dimension: dict, contenido: str, inicio: float,
+                  error: Exception) -> str:
+        # Sin nota, el resumen usa el principio de la sección (como antes)
+        print(f"   ⚠️ No se pudo condensar '{dimension['nombre']}': {error}")
+        if self.traza:
+            self.traza.registrar(
+                f"condensar:{dimension['num']}", inicio, time.time() - inicio,
+                error=f"{type(error).__name__}: {error}",
+            )
+        return recortar(contenido, Config.SUMMARY_NOTE_WORDS * 2)
+
+    def _nota(self, dimension: dict, resultado: dict, inicio: float) -> str:
+        nota = resultado["texto"].strip()
+        self.modelos.add(resultado["modelo"])  # el principal si el enrutado falló
+        if self.checkpoint:
+            self.checkpoint.guardar_nota(dimension["num"], nota)
+        if self.traza:
+            self.traza.registrar(
+                f"condensar:{dimension['num']}", inicio, time.time() - inicio,
+                **atributos_llamada(resultado),
+            )
+        return nota
+
+    def notas(self, esperar: bool = False) -> list[tuple[str, str]]:
+        """
+        (título, nota) en orden de dimensión. Sin `esperar`, las secciones
+        aún sin nota entran como extracto de su contenido; su condensación
+        no se interrumpe si ya está en vuelo (hilo del pool o tarea del
+        event loop) y la nota queda en el checkpoint para una reanudación.
+        Solo se cancela la que aún espera turno en el pool.
+        """
+        por_nota = Config.SUMMARY_INPUT_TOKENS // max(1, len(self._futuros))
+        notas = []
+        for num, (titulo, futuro) in sorted(self._futuros.items()):
+            contenido = self._contenidos.get(num)
+            if esperar or futuro.done() or contenido is None:
+                notas.append((titulo, futuro.result()))
+            else:
+                if not isinstance(futuro, asyncio.Future):
+                    futuro.cancel()  # sin efecto si el hilo ya la está condensando
+                notas.append((titulo, recortar(contenido, por_nota)))
+        return notas
+
+
+def reducir(client, objetivo: str, notas: list[tuple[str, str]],
+            presupuesto: int | None = None,
+            modelos: set[str] | None = None) -> list[tuple[str, str]]:
+    """
+    Fusiona notas por parejas hasta que quepan en `presupuesto` tokens.
+    Los modelos usados en las fusiones se añaden a `modelos`.
+    """
+    presupuesto = presupuesto or Config.SUMMARY_INPUT_TOKENS
+    modelos = set() if modelos is None else modelos
+
+    def tokens(lista):
+        return sum(estimar_tokens(nota) for _, nota in lista)
+
+    while tokens(notas) > presupuesto and len(notas) > 1:
+        grupos = [notas[i:i + 2] for i in range(0, len(notas), 2)]
+        cliente = client.para_etapa("condensar")
+        futuros = [
+            _pool_condensar.submit(
+                cliente.generar, prompt_fusionar(objetivo, grupo), False
+            ) if len(grupo) > 1 else None
+            for grupo in grupos
+        ]
+        fusionadas = []
+        for grupo, futuro in zip(grupos, futuros):
+            titulo = " + ".join(t for t, _ in grupo)
+            if futuro is None:
+                fusionadas.append(grupo[0])
+                continue
+            try:
+                resultado = futuro.result()
+                modelos.add(resultado["modelo"])
+                fusionadas.append((titulo, resultado["texto"].strip()))
+            except Exception:
+                fusionadas.append((titulo, "\n".join(n for _, n in grupo)))
+        if tokens(fusionadas) >= tokens(notas):
+            break  # la fusión no reduce: se recorta abajo
+        notas = fusionadas
+
+    if tokens(notas) > presupuesto:
+        por_nota = presupuesto // len(notas)
+        notas = [(titulo, recortar(nota, por_nota)) for titulo, nota in notas]
+    return notas
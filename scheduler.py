@@ -0,0 +1,230 @@
+"""Planificador de llamadas por dimensión (secuencial o concurrente)."""
+
+import asyncio
+import queue
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from cancelacion import Cancelado
+from config import Config
+
+# Subpreguntas del modo granular, compartido por todas las dimensiones:
+# acota las llamadas en vuelo aunque cada dimensión abra 7-10
+_pool_subpreguntas = ThreadPoolExecutor(
+    max_workers=max(1, Config.GRANULAR_CONCURRENCY), thread_name_prefix="subpregunta"
+)
+# Lo mismo en asíncrono: un semáforo por event loop (no se comparten entre loops)
+_limites_subpreguntas = weakref.WeakKeyDictionary()  # loop → asyncio.Semaphore
+
+
+def _limite_subpreguntas() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    if (limite := _limites_subpreguntas.get(loop)) is None:
+        limite = _limites_subpreguntas[loop] = asyncio.Semaphore(
+            max(1, Config.GRANULAR_CONCURRENCY)
+        )
+    return limite
+
+
+def fusionar_subrespuestas(dim: dict, resultados: list) -> dict:
+    """
+    Une las respuestas de las subpreguntas en una sola sección, en el orden
+    del checklist y sin fuentes repetidas. Las que fallaron se indican en
+    el texto; si fallaron todas, se propaga el primer error.
+    """
+    correctos = [r for r in resultados if not isinstance(r, Exception)]
+    if not correctos:
+        raise resultados[0]
+    bloques, fallidas = [], []
+    for titulo, resultado in zip(dim["subtemas"], resultados):
+        if isinstance(resultado, Exception):
+            fallidas.append(titulo)
+            bloques.append(f"## {titulo}\n\n⚠️ No se pudo investigar: {resultado}")
+        else:
+            bloques.append(f"## {titulo}\n\n{resultado['texto'].strip()}")
+    return {
+        "texto": "\n\n".join(bloques),
+        "fuentes": list(dict.fromkeys(f for r in correctos for f in r["fuentes"])),
+        "metodo": " + ".join(dict.fromkeys(r["metodo"] for r in correctos)),
+        "modelo": ", ".join(dict.fromkeys(r.get("modelo") or "?" for r in correctos)),
+        "coste": sum(r.get("coste") or 0 for r in correctos),
+        "latencia": max(r.get("latencia") or 0 for r in correctos),
+        **{
+            clave: sum(r.get(clave) or 0 for r in correctos)
+            for clave in ("tokens_entrada", "tokens_salida", "tokens_cache", "reintentos")
+        },
+        "cache": all(r.get("cache") for r in correctos),
+        "subpreguntas": len(resultados),
+        "subpreguntas_fallidas": len(fallidas),
+    }
+
+
+def investigar_granular(client, dim: dict, prompts: list[str]) -> dict:
+    """Una llamada por subpregunta, en paralelo, fusionadas en una sección."""
+    futuros = [_pool_subpreguntas.submit(client.generar, p) for p in prompts]
+    resultados = []
+    for futuro in futuros:
+        try:
+            resultados.append(futuro.result())
+        except Exception as e:
+            resultados.append(e)
+    return fusionar_subrespuestas(dim, resultados)
+
+
+async def ainvestigar_granular(client, dim: dict, prompts: list[str]) -> dict:
+    """Como `investigar_granular`; el límite de llamadas en vuelo es un semáforo."""
+    limite = _limite_subpreguntas()
+
+    async def subpregunta(prompt: str) -> dict:
+        async with limite:
+            return await client.agenerar(prompt)
+
+    resultados = await asyncio.gather(
+        *(subpregunta(p) for p in prompts), return_exceptions=True
+    )
+    client.cancelacion.comprobar()  # gather devuelve los Cancelado como resultados
+    return fusionar_subrespuestas(dim, list(resultados))
+
+
+def ejecutar_dimensiones(client, dimensiones: list[dict],
+                         max_concurrencia: int = 1, resolver_prompt=None,
+                         stream: bool = False):
+    """
+    Ejecuta las dimensiones y emite eventos según van terminando.
+
+    Con max_concurrencia=1 va una tras otra; con un valor mayor reparte los
+    prompts en un pool de hilos limitado a ese número de llamadas
+    simultáneas. El ritmo lo marca el limitador de cuota del cliente.
+
+    `resolver_prompt(dim)`, si se pasa, decide el prompt justo al arrancar
+    cada llamada (p. ej. para cambiar a un mega-prompt que acaba de llegar).
+
+    Con stream=True se usa `client.generar_stream` y además se emiten
+    ("fragmento", idx, texto) según llega el texto.
+
+    Cada dimensión usa el modelo que le asigna el enrutador en el momento
+    de arrancar (`client.para_etapa("dimension", num)`).
+
+    Las dimensiones con "subprompts" (modo granular) se investigan con
+    `investigar_granular`: sin fragmentos, porque sus subpreguntas llegan
+    en paralelo. `resolver_prompt` devuelve entonces la lista de prompts.
+
+    Eventos (tuplas): ("inicio", idx, None) · ("fin", idx, resultado)
+    · ("error", idx, excepción). idx es la posición en `dimensiones`.
+
+    Si se cancela `client.cancelacion`, se emiten las que ya habían
+    terminado y se lanza `Cancelado`: las llamadas en vuelo se abandonan y
+    las que no habían empezado ya no arrancan.
+    """
+    eventos: queue.Queue = queue.Queue()
+    cancelacion = client.cancelacion
+
+    def trabajo(idx: int, dim: dict):
+        if cancelacion.cancelado:
+            return
+        eventos.put(("inicio", idx, None))
+        try:
+            inicio = time.monotonic()
+            cliente = client.para_etapa("dimension", dim["num"])
+            prompt = resolver_prompt(dim) if resolver_prompt \
+                else dim.get("subprompts", dim["prompt"])
+            if isinstance(prompt, list):
+                resultado = investigar_granular(cliente, dim, prompt)
+            elif stream:
+                transmision = cliente.generar_stream(prompt)
+                for fragmento in transmision:
+                    eventos.put(("fragmento", idx, fragmento))
+                resultado = transmision.resultado
+            else:
+                resultado = cliente.generar(prompt)
+            resultado.setdefault("duracion", time.monotonic() - inicio)
+            eventos.put(("fin", idx, resultado))
+        except Cancelado:
+            pass  # el consumidor se entera por el aviso del token
+        except Exception as e:
+            eventos.put(("error", idx, e))
+
+    pool = ThreadPoolExecutor(
+        max_workers=max(1, max_concurrencia),
+        thread_name_prefix="dimension",
+    )
+    quitar_aviso = cancelacion.al_cancelar(lambda: eventos.put(None))
+    try:
+        for idx, dim in enumerate(dimensiones):
+            pool.submit(trabajo, idx, dim)
+
+        pendientes = len(dimensiones)
+        while pendientes:
+            evento = eventos.get()
+            if evento is None:
+                yield from _terminadas(eventos)
+                cancelacion.comprobar()
+            if evento[0] in ("fin", "error"):
+                pendientes -= 1
+            yield evento
+    finally:
+        quitar_aviso()
+        # Si el consumidor abandona, no lanzar las que siguen en cola
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _terminadas(eventos):
+    """Los "fin" que ya estaban en la cola al cancelar: esas secciones se conservan."""
+    while True:
+        try:
+            evento = eventos.get_nowait()
+        except (queue.Empty, asyncio.QueueEmpty):
+            return
+        if evento and evento[0] == "fin":
+            yield evento
+
+
+async def aejecutar_dimensiones(client, dimensiones: list[dict],
+                                max_concurrencia: int = 1):
+    """
+    Equivalente asíncrono de `ejecutar_dimensiones` sobre `client.agenerar`.
+    Un semáforo limita las llamadas en vuelo; todas comparten el event loop.
+    Al cancelar `client.cancelacion` las tareas se cancelan de verdad.
+    """
+    eventos: asyncio.Queue = asyncio.Queue()
+    limite = asyncio.Semaphore(max(1, max_concurrencia))
+    cancelacion = client.cancelacion
+    loop = asyncio.get_running_loop()
+
+    async def trabajo(idx: int, dim: dict):
+        async with limite:
+            eventos.put_nowait(("inicio", idx, None))
+            try:
+                cliente = client.para_etapa("dimension", dim["num"])
+                if "subprompts" in dim:
+                    resultado = await ainvestigar_granular(cliente, dim, dim["subprompts"])
+                else:
+                    resultado = await cliente.agenerar(dim["prompt"])
+                eventos.put_nowait(("fin", idx, resultado))
+            except Cancelado:
+                pass
+            except Exception as e:
+                eventos.put_nowait(("error", idx, e))
+
+    tareas = [
+        asyncio.create_task(trabajo(idx, dim))
+        for idx, dim in enumerate(dimensiones)
+    ]
+    quitar_aviso = cancelacion.al_cancelar(
+        lambda: loop.call_soon_threadsafe(eventos.put_nowait, None)
+    )
+    try:
+        pendientes = len(dimensiones)
+        while pendientes:
+            evento = await eventos.get()
+            if evento is None:
+                for terminada in _terminadas(eventos):
+                    yield terminada
+                cancelacion.comprobar()
+            if evento[0] in ("fin", "error"):
+                pendientes -= 1
+            yield evento
+    finally:
+        quitar_aviso()
+        for tarea in tareas:
+            tarea.cancel()
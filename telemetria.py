@@ -0,0 +1,230 @@
+"""Telemetría: trazas JSONL por ejecución y métricas estilo Prometheus."""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import Config
+
+_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, float("inf"))
+
+
+class Metricas:
+    """Contadores e histogramas del proceso, exportables en formato texto Prometheus."""
+
+    def __init__(self):
+        self._contadores: dict[tuple, float] = {}
+        self._histogramas: dict[tuple, list] = {}
+        self._ayuda: dict[str, tuple[str, str]] = {}
+        self._lock = threading.Lock()
+        self._lock_escritura = threading.Lock()  # runs que terminan a la vez
+
+    @staticmethod
+    def _clave(nombre: str, etiquetas: dict) -> tuple:
+        return (nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items())))
+
+    def incrementar(self, nombre: str, valor: float = 1, ayuda: str = "", **etiquetas):
+        with self._lock:
+            self._ayuda.setdefault(nombre, ("counter", ayuda))
+            clave = self._clave(nombre, etiquetas)
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def observar(self, nombre: str, valor: float, ayuda: str = "", **etiquetas):
+        with self._lock:
+            self._ayuda.setdefault(nombre, ("histogram", ayuda))
+            clave = self._clave(nombre, etiquetas)
+            # [cuentas por bucket..., suma, total]
+            h = self._histogramas.setdefault(clave, [0] * len(_BUCKETS) + [0.0, 0])
+            for i, limite in enumerate(_BUCKETS):
+                if valor <= limite:
+                    h[i] += 1
+            h[-2] += valor
+            h[-1] += 1
+
+    @staticmethod
+    def _etiquetas(pares, extra: str = "") -> str:
+        partes = [f'{k}="{v}"' for k, v in pares]
+        if extra:
+            partes.append(extra)
+        return "{" + ",".join(partes) + "}" if partes else ""
+
+    def exportar(self) -> str:
+        """Texto en formato de exposición de Prometheus."""
+        lineas = []
+        with self._lock:
+            nombres = sorted(self._ayuda)
+            for nombre in nombres:
+                tipo, ayuda = self._ayuda[nombre]
+                lineas.append(f"# HELP {nombre} {ayuda}")
+                lineas.append(f"# TYPE {nombre} {tipo}")
+                if tipo == "counter":
+                    for (n, pares), valor in self._contadores.items():
+                        if n == nombre:
+                            lineas.append(f"{nombre}{self._etiquetas(pares)} {valor:g}")
+                    continue
+                for (n, pares), h in self._histogramas.items():
+                    if n != nombre:
+                        continue
+                    for limite, cuenta in zip(_BUCKETS, h):
+                        le = "+Inf" if limite == float("inf") else f"{limite:g}"
+                        extra = f'le="{le}"'
+                        lineas.append(
+                            f"{nombre}_bucket{self._etiquetas(pares, extra)} {cuenta}"
+                        )
+                    lineas.append(f"{nombre}_sum{self._etiquetas(pares)} {h[-2]:.3f}")
+                    lineas.append(f"{nombre}_count{self._etiquetas(pares)} {h[-1]}")
+        return "\n".join(lineas) + "\n"
+
+    def escribir(self, ruta: str | None = None):
+        """
+        Vuelca las métricas a fichero (p. ej. para el textfile collector).
+        El temporal lleva el pid: con varios procesos (batch.py) cada uno
+        reemplaza el fichero con el suyo en vez de pisarse el temporal.
+        """
+        ruta = ruta or Config.METRICS_PATH
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        tmp = f"{ruta}.{os.getpid()}.tmp"
+        with self._lock_escritura:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self.exportar())
+            os.replace(tmp, ruta)
+
+
+metricas = Metricas()
+
+
+def registrar_llamada(modelo: str, resultado: dict):
+    """Métricas de una llamada a `generar` (la llama el cliente)."""
+    etiquetas = {"modelo": modelo, "metodo": resultado["metodo"]}
+    cache = "si" if resultado.get("cache") else "no"
+    metricas.incrementar(
+        "deep_research_llamadas_total", ayuda="Llamadas a generar",
+        cache=cache, **etiquetas,
+    )
+    if resultado.get("cache"):
+        return
+    metricas.observar(
+        "deep_research_latencia_segundos", resultado.get("latencia", 0),
+        ayuda="Latencia por llamada (incluye reintentos)", **etiquetas,
+    )
+    for tipo in ("entrada", "salida", "cache"):
+        metricas.incrementar(
+            "deep_research_tokens_total", resultado.get(f"tokens_{tipo}", 0),
+            ayuda="Tokens consumidos (cache: parte de la entrada servida desde caché)",
+            modelo=modelo, tipo=tipo,
+        )
+    metricas.incrementar(
+        "deep_research_reintentos_total", resultado.get("reintentos", 0),
+        ayuda="Reintentos de llamadas", modelo=modelo,
+    )
+    if resultado.get("coste"):
+        metricas.incrementar(
+            "deep_research_coste_usd_total", resultado["coste"],
+            ayuda="Coste estimado según Config.MODEL_COSTS", modelo=modelo,
+        )
+
+
+def registrar_error(modelo: str, tipo: str):
+    metricas.incrementar(
+        "deep_research_errores_total", ayuda="Errores de la API por tipo",
+        modelo=modelo, tipo=tipo,
+    )
+
+
+class Traza:
+    """Spans de una ejecución, añadidos a <TELEMETRY_DIR>/<run_id>.jsonl según terminan."""
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.spans: list[dict] = []
+        self.ruta = os.path.join(Config.TELEMETRY_DIR, f"{run_id}.jsonl")
+        self._lock = threading.Lock()
+        os.makedirs(Config.TELEMETRY_DIR, exist_ok=True)
+
+    def registrar(self, etapa: str, inicio: float, duracion: float, **atributos):
+        """Añade un span ya medido (inicio en epoch, duración en segundos)."""
+        span = {
+            "run_id": self.run_id,
+            "span": etapa,
+            "inicio": round(inicio, 3),
+            "duracion": round(duracion, 3),
+            **{k: v for k, v in atributos.items() if v is not None},
+        }
+        metricas.observar(
+            "deep_research_etapa_segundos", duracion,
+            ayuda="Duración por etapa del pipeline", etapa=etapa.split(":")[0],
+        )
+        with self._lock:
+            self.spans.append(span)
+            with open(self.ruta, "a", encoding="utf-8") as f:
+                f.write(json.dumps(span, ensure_ascii=False) + "\n")
+
+    @contextmanager
+    def span(self, etapa: str, **atributos):
+        """Mide el bloque; los atributos se pueden completar dentro (dict mutable)."""
+        inicio = time.time()
+        try:
+            yield atributos
+        except Exception as e:
+            atributos["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.registrar(etapa, inicio, time.time() - inicio, **atributos)
+
+    @asynccontextmanager
+    async def aspan(self, etapa: str, **atributos):
+        """`span` para el event loop: el span se añade al fichero desde un hilo."""
+        inicio = time.time()
+        try:
+            yield atributos
+        except Exception as e:
+            atributos["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            await asyncio.to_thread(
+                self.registrar, etapa, inicio, time.time() - inicio, **atributos
+            )
+
+
+def atributos_llamada(resultado: dict) -> dict:
+    """Campos de telemetría de un resultado de `generar` para un span."""
+    return {
+        clave: resultado.get(clave)
+        for clave in ("modelo", "metodo", "coste", "latencia", "ttft", "tokens_entrada",
+                      "tokens_salida", "tokens_cache", "reintentos", "hedge", "cache",
+                      "subpreguntas", "subpreguntas_fallidas")
+    }
+
+
+# ── Endpoint HTTP opcional ──
+_servidor: ThreadingHTTPServer | None = None
+_servidor_lock = threading.Lock()
+
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        cuerpo = metricas.exportar().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def iniciar_servidor_metricas(puerto: int):
+    """Sirve /metrics en un hilo de fondo (una sola vez por proceso)."""
+    global _servidor
+    with _servidor_lock:
+        if _servidor is None:
+            _servidor = ThreadingHTTPServer(("127.0.0.1", puerto), _ManejadorMetricas)
+            threading.Thread(target=_servidor.serve_forever, daemon=True).start()
+            print(f"📈 Métricas en http://127.0.0.1:{puerto}/metrics")
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos viven en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_backend  # noqa: E402
+from config import Config  # noqa: E402
+
+
+@pytest.fixture
+def simulado(tmp_path, monkeypatch):
+    """Backend simulado y rápido, con todos los ficheros en tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    for nombre, valor in {
+        "BACKEND": "simulado", "API_KEY": "simulada", "CACHE_ENABLED": False,
+        "RPM_LIMIT": 100000, "TPM_LIMIT": 10**9,
+        "RUNS_DIR": str(tmp_path / "runs"), "REPORTS_DIR": str(tmp_path / "reports"),
+        "TELEMETRY_DIR": str(tmp_path / "telemetry"),
+        "JOBS_PATH": str(tmp_path / "runs" / "trabajos.sqlite3"),
+        "METRICS_PATH": str(tmp_path / "telemetry" / "metricas.prom"),
+    }.items():
+        monkeypatch.setattr(Config, nombre, valor)
+    iniciar = fake_backend.ModeloSimulado.__init__
+    rapido = fake_backend.PerfilSimulacion(latencia=("fija", 0.01))
+    monkeypatch.setattr(
+        fake_backend.ModeloSimulado, "__init__",
+        lambda self, nombre="simulado", perfil=None: iniciar(self, nombre, rapido),
+    )
+    return tmp_path
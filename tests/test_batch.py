@@ -0,0 +1,27 @@
+"""Lotes con el backend simulado (sin API key ni red)."""
+
+import json
+
+import batch
+
+
+def test_mismo_objetivo_no_comparte_ficheros(simulado):
+    tmp_path = simulado
+    entrada = tmp_path / "lote.jsonl"
+    entrada.write_text("\n".join(json.dumps({
+        "id": id, "objetivo": "Mercado de café en Madrid",
+        "dimensiones": [num], "resumen": False,
+    }) for id, num in (("a", 1), ("b", 2))), encoding="utf-8")
+
+    salida = tmp_path / "salida"
+    assert batch.main([str(entrada), "--salida", str(salida), "--procesos", "2"]) == 0
+
+    with open(salida / "estado.jsonl", encoding="utf-8") as f:
+        estados = {e["id"]: e for e in map(json.loads, f)}
+    rutas = {id: estados[id]["rutas"]["markdown"] for id in ("a", "b")}
+    assert rutas["a"] != rutas["b"]
+    with open(rutas["a"], encoding="utf-8") as f:
+        assert "LENGUAJE Y TERMINOLOGÍA" in f.read()
+    with open(rutas["b"], encoding="utf-8") as f:
+        assert "ECONOMÍA Y MERCADO" in f.read()
+    assert not list(salida.glob("*.parcial"))
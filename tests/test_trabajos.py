@@ -0,0 +1,45 @@
+"""Cola de trabajos con el backend simulado."""
+
+import time
+
+from checkpoint import Checkpoint
+from config import Ajustes, Config
+from trabajos import ACTIVOS, COMPLETADO, AlmacenTrabajos, ColaTrabajos
+
+
+def test_trabajos_con_el_mismo_objetivo_no_comparten_informe(simulado, monkeypatch):
+    monkeypatch.setattr(Config, "JOBS_PER_KEY", 2)
+    cola = ColaTrabajos(AlmacenTrabajos())
+    ids = [
+        cola.enviar(
+            Checkpoint.nuevo("Mercado de café en Madrid", [num], False),
+            Ajustes.desde_config(),
+        )
+        for num in (0, 1)
+    ]
+    limite = time.time() + 30
+    while any(cola.estado(id)["estado"] in ACTIVOS for id in ids):
+        assert time.time() < limite
+        time.sleep(0.05)
+
+    trabajos = [cola.estado(id) for id in ids]
+    assert [t["estado"] for t in trabajos] == [COMPLETADO, COMPLETADO]
+    rutas = [t["rutas"]["markdown"] for t in trabajos]
+    assert rutas[0] != rutas[1]
+    for id, ruta, nombre in zip(ids, rutas, ("LENGUAJE Y TERMINOLOGÍA", "ECONOMÍA Y MERCADO")):
+        assert ruta.endswith(f"_{id}.md")
+        with open(ruta, encoding="utf-8") as f:
+            assert nombre in f.read()
+
+
+def test_reanudar_reinicia_el_inicio_del_trabajo(simulado, monkeypatch):
+    reloj = iter([100.0, 150.0, 500.0])
+    monkeypatch.setattr("trabajos.time.time", lambda: next(reloj))
+    almacen = AlmacenTrabajos()
+    almacen.crear("run1", "Mercado de café en Madrid", "huella", "modelo")
+    almacen.actualizar("run1", estado="error")
+    almacen.crear("run1", "Mercado de café en Madrid", "huella", "modelo")
+
+    trabajo = almacen.obtener("run1")
+    assert trabajo["creado"] == 500.0
+    assert trabajo["estado"] != "error"
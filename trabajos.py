@@ -0,0 +1,331 @@
+"""
+Cola de trabajos en segundo plano para que las investigaciones sobrevivan
+a la sesión del navegador.
+
+Cada trabajo es un run del pipeline (su id es el run_id del checkpoint)
+que se ejecuta en un pool de hilos del proceso, no en el hilo del script
+de Streamlit. El estado y el progreso viven en SQLite (Config.JOBS_PATH),
+así que cualquier sesión puede consultar, reconectarse o cancelar. Las
+secciones ya terminadas se leen del checkpoint del run; el texto en
+curso (con streaming) solo se guarda en memoria del proceso.
+
+Cada trabajo lleva sus propios `Ajustes` (inmutables), así que runs con
+modelos o parámetros distintos conviven en el mismo proceso. Las API keys
+nunca se escriben en disco: solo se guarda su huella, que además sirve
+para limitar los trabajos simultáneos por key.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from cancelacion import TokenCancelacion
+from config import Ajustes, Config
+from checkpoint import Checkpoint
+from gemini_client import GeminiClient, huella_api_key
+from pipeline import investigar
+
+EN_COLA, EN_CURSO = "en_cola", "en_curso"
+COMPLETADO, ERROR, CANCELADO, INTERRUMPIDO = (
+    "completado", "error", "cancelado", "interrumpido",
+)
+ACTIVOS = (EN_COLA, EN_CURSO)
+
+
+class AlmacenTrabajos:
+    """
+    Tabla de trabajos en SQLite. Como la caché de respuestas, cada
+    operación abre su propia conexión (WAL): segura entre hilos y sesiones.
+    """
+
+    def __init__(self, ruta: str | None = None):
+        self.ruta = ruta or Config.JOBS_PATH
+        os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+        with self._conectar() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS trabajos (
+                    id TEXT PRIMARY KEY,
+                    objetivo TEXT NOT NULL,
+                    huella TEXT NOT NULL,
+                    modelo TEXT NOT NULL,
+                    estado TEXT NOT NULL,
+                    completadas INTEGER NOT NULL DEFAULT 0,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    mensaje TEXT NOT NULL DEFAULT '',
+                    error TEXT,
+                    rutas TEXT,
+                    creado REAL NOT NULL,
+                    actualizado REAL NOT NULL
+                )
+            """)
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS idx_estado ON trabajos(estado, creado)"
+            )
+
+    @contextmanager
+    def _conectar(self):
+        con = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+        con.row_factory = sqlite3.Row
+        try:
+            yield con
+        finally:
+            con.close()
+
+    @staticmethod
+    def _fila(fila: sqlite3.Row | None) -> dict | None:
+        if fila is None:
+            return None
+        trabajo = dict(fila)
+        trabajo["rutas"] = json.loads(trabajo["rutas"]) if trabajo["rutas"] else None
+        return trabajo
+
+    def crear(self, id: str, objetivo: str, huella: str, modelo: str):
+        ahora = time.time()
+        with self._conectar() as con:
+            # Reanudar un run ya conocido reutiliza su fila; `creado` pasa a
+            # ser el del intento nuevo, así la duración no incluye el fallido
+            con.execute(
+                "INSERT INTO trabajos (id, objetivo, huella, modelo, estado, creado, actualizado) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET estado = excluded.estado, "
+                "huella = excluded.huella, modelo = excluded.modelo, error = NULL, "
+                "completadas = 0, total = 0, mensaje = '', rutas = NULL, "
+                "creado = excluded.creado, actualizado = excluded.actualizado",
+                (id, objetivo, huella, modelo, EN_COLA, ahora, ahora),
+            )
+
+    def actualizar(self, id: str, **campos):
+        if "rutas" in campos:
+            campos["rutas"] = json.dumps(campos["rutas"], ensure_ascii=False)
+        campos["actualizado"] = time.time()
+        asignaciones = ", ".join(f"{nombre} = ?" for nombre in campos)
+        with self._conectar() as con:
+            con.execute(
+                f"UPDATE trabajos SET {asignaciones} WHERE id = ?",
+                (*campos.values(), id),
+            )
+
+    def obtener(self, id: str) -> dict | None:
+        with self._conectar() as con:
+            return self._fila(con.execute(
+                "SELECT * FROM trabajos WHERE id = ?", (id.strip(),)
+            ).fetchone())
+
+    def listar(self, estados: tuple[str, ...] | None = None, limite: int = 20) -> list[dict]:
+        consulta, parametros = "SELECT * FROM trabajos", []
+        if estados:
+            consulta += f" WHERE estado IN ({', '.join('?' * len(estados))})"
+            parametros.extend(estados)
+        with self._conectar() as con:
+            filas = con.execute(
+                consulta + " ORDER BY creado DESC LIMIT ?", (*parametros, limite)
+            ).fetchall()
+        return [self._fila(f) for f in filas]
+
+    def marcar_interrumpidos(self) -> int:
+        """Los activos de un proceso anterior ya no tienen quien los ejecute."""
+        with self._conectar() as con:
+            return con.execute(
+                f"UPDATE trabajos SET estado = ?, mensaje = ?, actualizado = ? "
+                f"WHERE estado IN ({', '.join('?' * len(ACTIVOS))})",
+                (INTERRUMPIDO, "Proceso reiniciado: reanúdalo con su Run ID",
+                 time.time(), *ACTIVOS),
+            ).rowcount
+
+
+class ColaTrabajos:
+    """
+    Ejecuta trabajos en `Config.JOB_WORKERS` hilos, con como mucho
+    `Config.JOBS_PER_KEY` a la vez por API key. Lo que no cabe espera en
+    orden de llegada.
+    """
+
+    def __init__(self, almacen: AlmacenTrabajos | None = None):
+        self.almacen = almacen or AlmacenTrabajos()
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, Config.JOB_WORKERS), thread_name_prefix="trabajo"
+        )
+        self._lock = threading.Lock()
+        self._cola: deque[str] = deque()
+        self._pendientes: dict[str, tuple] = {}  # id → (checkpoint, ajustes)
+        self._en_curso: dict[str, int] = {}  # huella → trabajos ejecutándose
+        self._tokens: dict[str, TokenCancelacion] = {}  # id → token del run en curso
+        self._parciales: dict[str, dict[int, str]] = {}  # id → {num dimensión: texto}
+        self._informes: dict[str, dict] = {}  # id → renders de los últimos terminados
+        if n := self.almacen.marcar_interrumpidos():
+            print(f"   ⚠️ {n} trabajos de una ejecución anterior quedaron interrumpidos")
+
+    # ── Operaciones ──
+    def enviar(self, checkpoint: Checkpoint, ajustes: Ajustes) -> str:
+        """
+        Encola el run de `checkpoint` (nuevo o a reanudar) con `ajustes` y
+        devuelve su id.
+        """
+        id = checkpoint.run_id
+        actual = self.almacen.obtener(id)
+        if actual and actual["estado"] in ACTIVOS:
+            return id  # ya en marcha: la sesión solo se reconecta
+        self.almacen.crear(
+            id, checkpoint.datos["objetivo"], huella_api_key(ajustes.api_key), ajustes.modelo
+        )
+        with self._lock:
+            self._pendientes[id] = (checkpoint, ajustes)
+            self._cola.append(id)
+        self._despachar()
+        return id
+
+    def estado(self, id: str) -> dict | None:
+        """Fila del trabajo con estado, progreso (0-1), mensaje y rutas."""
+        trabajo = self.almacen.obtener(id)
+        if trabajo:
+            trabajo["progreso"] = (
+                1.0 if trabajo["estado"] == COMPLETADO
+                else trabajo["completadas"] / trabajo["total"] if trabajo["total"]
+                else 0.0
+            )
+        return trabajo
+
+    def parciales(self, id: str) -> dict[int, str]:
+        """Texto recibido hasta ahora de las dimensiones en curso (por número)."""
+        return dict(self._parciales.get(id, {}))
+
+    def informes(self, id: str) -> dict | None:
+        """
+        Renders en memoria de un trabajo recién terminado (None si ya no
+        están o si el informe es incremental: entonces solo está en disco).
+        """
+        return self._informes.get(id)
+
+    def _guardar_informe(self, id: str, builder) -> dict:
+        """
+        Escribe el informe y conserva sus renders para la sesión que lo recoja.
+        Los ficheros llevan en el nombre el id del trabajo (el run_id del
+        builder), así que las rutas guardadas siguen siendo las suyas.
+        """
+        if builder.run_id != id:
+            raise RuntimeError(f"El informe es del run '{builder.run_id}', no de '{id}'")
+        rutas = builder.guardar_todo()
+        if not builder.incremental:
+            with self._lock:
+                self._informes.pop(id, None)
+                self._informes[id] = builder.renderizar()  # ya generados al guardar
+                while len(self._informes) > max(1, Config.JOB_WORKERS):
+                    self._informes.pop(next(iter(self._informes)))
+        return rutas
+
+    def cancelar(self, id: str) -> bool:
+        """
+        Cancela un trabajo activo. En cola se descarta al momento; en curso
+        se cancela su token: las llamadas en vuelo y las esperas se
+        abandonan sin consumir más cuota. Lo terminado queda en el
+        checkpoint (se puede reanudar) y en un informe parcial.
+        """
+        trabajo = self.almacen.obtener(id)
+        if not trabajo or trabajo["estado"] not in ACTIVOS:
+            return False
+        with self._lock:
+            en_cola = self._pendientes.pop(id, None) is not None
+            if en_cola:
+                self._cola.remove(id)
+            token = self._tokens.get(id)
+        if en_cola:
+            self.almacen.actualizar(id, estado=CANCELADO, mensaje="Cancelado en cola")
+        else:
+            self.almacen.actualizar(id, mensaje="Cancelando...")
+            if token:
+                token.cancelar("Cancelado por el usuario")
+        return True
+
+    # ── Planificación ──
+    def _despachar(self):
+        """Arranca los trabajos en cola cuya key tiene hueco."""
+        with self._lock:
+            for id in list(self._cola):
+                checkpoint, ajustes = self._pendientes[id]
+                huella = huella_api_key(ajustes.api_key)
+                if self._en_curso.get(huella, 0) >= Config.JOBS_PER_KEY:
+                    continue
+                self._cola.remove(id)
+                del self._pendientes[id]
+                self._en_curso[huella] = self._en_curso.get(huella, 0) + 1
+                # El token existe desde ya: cancelar no depende de cuándo arranque el hilo
+                token = self._tokens[id] = TokenCancelacion()
+                self._pool.submit(self._ejecutar, id, checkpoint, ajustes, token)
+
+    def _ejecutar(self, id: str, checkpoint: Checkpoint, ajustes: Ajustes,
+                  token: TokenCancelacion):
+        self.almacen.actualizar(id, estado=EN_CURSO, mensaje="Generando mega-prompt...")
+        eventos = None
+        try:
+            client = GeminiClient(ajustes, cancelacion=token)
+            eventos = investigar(client, checkpoint, stream=ajustes.streaming)
+            parciales = self._parciales[id] = {}
+            completadas = 0
+            dims = []
+            for tipo, idx, dato in eventos:
+                if tipo == "dimensiones":
+                    dims = dato
+                    total = len(dato) + (1 if checkpoint.datos["incluir_resumen"] else 0)
+                    self.almacen.actualizar(
+                        id, total=total, mensaje=f"Investigando {len(dato)} dimensiones..."
+                    )
+                elif tipo == "fragmento":
+                    num = dims[idx]["num"]
+                    parciales[num] = parciales.get(num, "") + dato
+                elif tipo in ("restaurada", "fin", "error"):
+                    parciales.pop(dims[idx]["num"], None)
+                    completadas += 1
+                    self.almacen.actualizar(id, completadas=completadas)
+                elif tipo == "resumen_inicio":
+                    self.almacen.actualizar(id, mensaje="Generando resumen ejecutivo...")
+                elif tipo in ("resumen", "resumen_restaurado", "resumen_error"):
+                    completadas += 1
+                    self.almacen.actualizar(id, completadas=completadas)
+                elif tipo == "completado":
+                    # El trabajo sobrevive a la sesión: el informe queda en disco
+                    rutas = self._guardar_informe(id, dato)
+                    stats = dato.stats
+                    self.almacen.actualizar(
+                        id, estado=COMPLETADO, rutas=rutas,
+                        mensaje=f"{stats['exitosas']}/{stats['total']} secciones "
+                                f"· {stats['caracteres']:,} caracteres",
+                    )
+                elif tipo == "cancelado":
+                    # Lo ya terminado queda como informe parcial
+                    campos = {"rutas": self._guardar_informe(id, dato)} if dato.secciones else {}
+                    self.almacen.actualizar(
+                        id, estado=CANCELADO, **campos,
+                        mensaje=f"Cancelado · {dato.stats['exitosas']} secciones conservadas",
+                    )
+        except Exception as e:
+            if eventos is not None:
+                eventos.close()
+            self.almacen.actualizar(
+                id, estado=ERROR, error=f"{type(e).__name__}: {e}",
+                mensaje="Falló; reanúdalo con su Run ID",
+            )
+        finally:
+            huella = huella_api_key(ajustes.api_key)
+            with self._lock:
+                self._en_curso[huella] -= 1
+                self._tokens.pop(id, None)
+                self._parciales.pop(id, None)
+            self._despachar()
+
+
+_cola: ColaTrabajos | None = None
+_cola_lock = threading.Lock()
+
+
+def obtener_cola() -> ColaTrabajos:
+    """Cola compartida por todas las sesiones del proceso."""
+    global _cola
+    with _cola_lock:
+        if _cola is None:
+            _cola = ColaTrabajos()
+        return _cola